@@ -1,13 +1,10 @@
-from decimal import Decimal
 from django.shortcuts import render, redirect
 from django.contrib.auth import login
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.db.models import Sum
 from accounts.models import UserProfile
-from core.models import Investment
+from core.services.portfolio import get_portfolio_summary
 from core.utils.currency import convert_from_usd, get_user_currency
-from wallet.models import Wallet
 from .forms import PasswordChangeForm, ProfileUpdateForm, RegisterForm, UserUpdateForm
 from django.http import JsonResponse
 from django.views.decorators.csrf import csrf_exempt
@@ -41,28 +38,14 @@ def profile(request):
     currency = get_user_currency(request)
     
     # Get user's wallet
-    try:
-        wallet = Wallet.objects.get(user=request.user)
-        wallet_balance = convert_from_usd(wallet.available_balance, currency)
-        wallet_equity = convert_from_usd(wallet.locked_balance, currency)
-    except Wallet.DoesNotExist:
-        wallet_balance = Decimal('0')
-        wallet_equity = Decimal('0')
+    wallet = request.user_context.wallet
+    wallet_balance = convert_from_usd(wallet.available_balance, currency)
+    wallet_equity = convert_from_usd(wallet.locked_balance, currency)
     
-    # Get investment stats
-    investments = Investment.objects.filter(user=request.user)
-    
-    # Calculate total invested
-    total_invested_usd = investments.aggregate(
-        total=Sum('invested_amount')
-    )['total'] or Decimal('0')
-    total_invested = convert_from_usd(total_invested_usd, currency)
-    
-    # Calculate total profit/loss
-    total_profit_loss_usd = investments.aggregate(
-        total=Sum('profit_loss')
-    )['total'] or Decimal('0')
-    total_profit_loss = convert_from_usd(total_profit_loss_usd, currency)
+    # Get investment stats (maintained per user, no history scan)
+    portfolio = get_portfolio_summary(request.user)
+    total_invested = convert_from_usd(portfolio.total_invested, currency)
+    total_profit_loss = convert_from_usd(portfolio.total_profit_loss, currency)
     
     # Handle form submissions
     if request.method == 'POST':
@@ -81,7 +64,7 @@ def profile(request):
     context = {
         'user_form': user_form,
         'profile_form': profile_form,
-        'wallet': wallet if 'wallet' in locals() else None,
+        'wallet': wallet,
         'wallet_balance': wallet_balance,
         'wallet_equity': wallet_equity,
         'total_invested': total_invested,
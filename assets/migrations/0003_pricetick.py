@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:39
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('assets', '0002_asset_allowed_durations_asset_return_rate_12h_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PriceTick',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('price', models.FloatField()),
+                ('timestamp', models.DateTimeField(default=django.utils.timezone.now)),
+                ('asset', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='price_ticks', to='assets.asset')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['asset', 'timestamp'], name='assets_tick_asset_ts_idx')],
+            },
+        ),
+    ]
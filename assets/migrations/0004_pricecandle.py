@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('assets', '0003_pricetick'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PriceCandle',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('interval', models.CharField(choices=[('1m', '1 minute'), ('5m', '5 minutes'), ('1h', '1 hour'), ('1d', '1 day')], max_length=2)),
+                ('bucket_start', models.DateTimeField()),
+                ('open', models.FloatField()),
+                ('high', models.FloatField()),
+                ('low', models.FloatField()),
+                ('close', models.FloatField()),
+                ('tick_count', models.PositiveIntegerField(default=0)),
+                ('asset', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='candles', to='assets.asset')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['interval', 'bucket_start'], name='assets_candle_bucket_idx')],
+                'constraints': [models.UniqueConstraint(fields=('asset', 'interval', 'bucket_start'), name='assets_candle_asset_interval_bucket_uniq')],
+            },
+        ),
+    ]
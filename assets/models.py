@@ -1,7 +1,9 @@
-from datetime import datetime,timedelta
+from datetime import timedelta
 from decimal import Decimal
 import uuid
+from django.conf import settings
 from django.db import models
+from django.utils import timezone
 
 
 class Asset(models.Model):
@@ -87,12 +89,16 @@ class Asset(models.Model):
             self.current_price = new_price
         self.save()
     
+    @staticmethod
+    def stale_cutoff():
+        """Prices last updated before this are stale (PRICE_STALE_AFTER_SECONDS, default 5 minutes)"""
+        return timezone.now() - timedelta(seconds=getattr(settings, 'PRICE_STALE_AFTER_SECONDS', 300))
+    
     def needs_update(self):
-        """Check if price needs update (older than 5 minutes)"""
+        """Check if price needs update (older than the stale cutoff)"""
         if not self.last_updated:
             return True
-        update_threshold = datetime.now() - timedelta(minutes=5)  # FIXED: Use timedelta
-        return self.last_updated < update_threshold
+        return self.last_updated < self.stale_cutoff()
     
     def get_icon_url(self):
         """Get icon URL or default"""
@@ -106,4 +112,60 @@ class Asset(models.Model):
             'stock': '/static/assets/stock.png',
         }
         return defaults.get(self.category, '/static/assets/default.png')
-    
\ No newline at end of file
+
+
+class PriceTick(models.Model):
+    """
+    Append-only price history, one row per asset per tick.
+    Kept narrow (float price, no extra columns) so the table stays compact
+    as it grows; old rows are removed by prune_price_ticks.
+    """
+    asset = models.ForeignKey(Asset, on_delete=models.CASCADE, related_name='price_ticks', db_index=False)
+    price = models.FloatField()
+    timestamp = models.DateTimeField(default=timezone.now)
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['asset', 'timestamp'], name='assets_tick_asset_ts_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.asset_id} @ {self.timestamp}: {self.price}"
+
+
+class PriceCandle(models.Model):
+    """
+    Pre-aggregated OHLC bar per asset and interval, updated on every tick.
+    There is no traded volume in this system, so tick_count stands in for it.
+    """
+    INTERVAL_CHOICES = [
+        ('1m', '1 minute'),
+        ('5m', '5 minutes'),
+        ('1h', '1 hour'),
+        ('1d', '1 day'),
+    ]
+    
+    asset = models.ForeignKey(Asset, on_delete=models.CASCADE, related_name='candles', db_index=False)
+    interval = models.CharField(max_length=2, choices=INTERVAL_CHOICES)
+    bucket_start = models.DateTimeField()
+    
+    open = models.FloatField()
+    high = models.FloatField()
+    low = models.FloatField()
+    close = models.FloatField()
+    tick_count = models.PositiveIntegerField(default=0)
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['asset', 'interval', 'bucket_start'],
+                name='assets_candle_asset_interval_bucket_uniq',
+            ),
+        ]
+        indexes = [
+            # Whole-universe reads and the per-tick upsert scan one bucket
+            models.Index(fields=['interval', 'bucket_start'], name='assets_candle_bucket_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.asset_id} {self.interval} @ {self.bucket_start}"
@@ -0,0 +1,98 @@
+# management/commands/bench_index_render.py
+import cProfile
+import pstats
+import time
+import uuid
+from decimal import Decimal
+
+import numpy as np
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test import Client
+from django.urls import reverse
+
+from assets.models import Asset
+from core.models import Currency
+from core.services import currencies
+from core.utils import currency as currency_utils
+from wallet.models import Transaction, Wallet
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = 'Measure core.views.index render time and the share of it spent converting money'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--renders', type=int, default=50, help='Number of renders to time')
+        parser.add_argument('--currency', default='KES', help='Display currency of the benchmark user')
+        parser.add_argument('--transactions', type=int, default=5, help='Transactions on the benchmark user')
+
+    def handle(self, *args, **options):
+        # The user, wallet and any missing rows live in a transaction that is rolled back
+        try:
+            with transaction.atomic():
+                self.run(options)
+                raise Rollback
+        except Rollback:
+            pass
+        finally:
+            currencies.bump_version()
+
+    def run(self, options):
+        code = options['currency']
+        if not Currency.objects.filter(code=code).exists():
+            Currency.objects.create(code=code, name=code, symbol=code, exchange_rate=Decimal('160'))
+        for i in range(8 - Asset.objects.filter(is_active=True).count()):
+            Asset.objects.create(name=f"Bench {i}", symbol=f"BENCH{i}", category='stock', current_price=Decimal('100'))
+        currencies.bump_version()
+
+        user = get_user_model().objects.create_user(
+            username=f"bench-{uuid.uuid4().hex[:8]}", email=f"{uuid.uuid4().hex}@example.com",
+            phone=uuid.uuid4().hex[:15], password=None,
+        )
+        wallet = Wallet.objects.create(user=user, currency=code, available_balance=Decimal('1000.00'))
+        for _ in range(options['transactions']):
+            Transaction.objects.create(
+                user=user, wallet=wallet, transaction_type='deposit', payment_method='wallet',
+                amount=Decimal('12.34'), status='completed',
+            )
+
+        client = Client()
+        client.force_login(user)
+        url = reverse('core:home')
+        # Warm templates and the currency table
+        client.get(url)
+
+        durations = []
+        profiler = cProfile.Profile()
+        for _ in range(options['renders']):
+            started = time.perf_counter()
+            profiler.enable()
+            client.get(url)
+            profiler.disable()
+            durations.append(time.perf_counter() - started)
+
+        # Time in convert_many and convert_from_usd (which |money uses), counted
+        # where they are entered from outside core.utils.currency
+        calls, converting = 0, 0.0
+        for (filename, _, name), (*_, callers) in pstats.Stats(profiler).stats.items():
+            if filename != currency_utils.__file__ or name not in ('convert_many', 'convert_from_usd'):
+                continue
+            for caller, (_, ncalls, _, cumulative) in callers.items():
+                if caller[0] != currency_utils.__file__:
+                    calls += ncalls
+                    converting += cumulative
+
+        renders = options['renders']
+        durations = np.array(durations)
+        self.stdout.write(
+            f"{renders} renders of {url} in {code} (profiled)\n"
+            f"  per render: p50={np.percentile(durations, 50) * 1000:.1f}ms "
+            f"p95={np.percentile(durations, 95) * 1000:.1f}ms\n"
+            f"  converting: {converting / renders * 1000:.2f}ms in {calls / renders:.0f} calls per render "
+            f"({converting / durations.sum():.1%} of render time)"
+        )
@@ -0,0 +1,58 @@
+# management/commands/bench_market_data.py
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand
+from core.services.market_data import HttpJsonProvider, start_stub_server
+
+
+class Command(BaseCommand):
+    help = 'Measure HttpJsonProvider fetch throughput (against a local stub by default)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--symbols', type=int, default=5000, help='Symbols per tick')
+        parser.add_argument('--ticks', type=int, default=10, help='Number of fetches to time')
+        parser.add_argument('--batch-size', type=int, default=200)
+        parser.add_argument('--workers', type=int, default=8)
+        parser.add_argument('--timeout', type=float, default=2.0)
+        parser.add_argument('--url', default=None, help='Provider URL (default: start a local stub server)')
+
+    def handle(self, *args, **options):
+        server = None
+        url = options['url']
+        if url is None:
+            server = start_stub_server()
+            host, port = server.server_address
+            url = f"http://{host}:{port}/"
+
+        provider = HttpJsonProvider(
+            url,
+            batch_size=options['batch_size'],
+            max_workers=options['workers'],
+            timeout=options['timeout'],
+        )
+        symbols = [f"SYM{i}" for i in range(options['symbols'])]
+        categories = ['stock'] * len(symbols)
+        current = np.ones(len(symbols))
+
+        durations = []
+        missing = 0
+        try:
+            for _ in range(options['ticks']):
+                started = time.perf_counter()
+                prices = provider.fetch_prices(symbols, categories, current)
+                durations.append(time.perf_counter() - started)
+                missing += int(np.isnan(prices).sum())
+        finally:
+            provider.close()
+            if server:
+                server.shutdown()
+
+        durations = np.array(durations)
+        total = len(symbols) * options['ticks']
+        self.stdout.write(
+            f"{options['ticks']} ticks x {len(symbols)} symbols from {url}\n"
+            f"  per tick: p50={np.percentile(durations, 50) * 1000:.1f}ms "
+            f"p95={np.percentile(durations, 95) * 1000:.1f}ms max={durations.max() * 1000:.1f}ms\n"
+            f"  throughput: {total / durations.sum():,.0f} symbols/s, fallbacks: {missing}"
+        )
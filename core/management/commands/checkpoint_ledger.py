@@ -0,0 +1,41 @@
+# management/commands/checkpoint_ledger.py
+import time
+
+from django.core.management.base import BaseCommand
+from core.services.ledger import DEFAULT_BATCH_SIZE, checkpoint_wallets
+
+
+class Command(BaseCommand):
+    help = 'Verify wallet balances against the ledger and checkpoint them'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=DEFAULT_BATCH_SIZE,
+            help='Wallets locked and checkpointed per transaction',
+        )
+        parser.add_argument(
+            '--wallet',
+            type=int,
+            action='append',
+            dest='wallets',
+            help='Only this wallet id (repeatable)',
+        )
+        parser.add_argument(
+            '--repair',
+            action='store_true',
+            help='Reset mismatched wallet balances to their ledger balances',
+        )
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        result = checkpoint_wallets(options['wallets'], options['batch_size'], repair=options['repair'])
+        elapsed = time.monotonic() - started
+
+        for wallet_id, projected, ledger in result.mismatches:
+            self.stdout.write(self.style.WARNING(f"Wallet {wallet_id}: balances {projected} != ledger {ledger}"))
+        self.stdout.write(self.style.SUCCESS(
+            f"Checked {result.wallets} wallets in {elapsed:.1f}s: {result.checkpointed} checkpointed, "
+            f"{len(result.mismatches)} mismatched{' (repaired)' if options['repair'] and result.mismatches else ''}"
+        ))
@@ -0,0 +1,24 @@
+# management/commands/market_data_stub.py
+from http.server import ThreadingHTTPServer
+
+from django.core.management.base import BaseCommand
+from core.services.market_data import StubMarketDataHandler
+
+
+class Command(BaseCommand):
+    help = 'Run a local stub market data HTTP server for HttpJsonProvider'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=8765)
+
+    def handle(self, *args, **options):
+        server = ThreadingHTTPServer((options['host'], options['port']), StubMarketDataHandler)
+        server.daemon_threads = True
+        self.stdout.write(self.style.SUCCESS(f"Stub market data server on http://{options['host']}:{options['port']}/"))
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            self.stdout.write("Stopped")
+        finally:
+            server.server_close()
@@ -0,0 +1,11 @@
+# management/commands/prune_idempotency_keys.py
+from django.core.management.base import BaseCommand
+from core.services.idempotency import prune_idempotency_keys
+
+
+class Command(BaseCommand):
+    help = 'Delete idempotency keys whose replay window has expired'
+
+    def handle(self, *args, **options):
+        deleted = prune_idempotency_keys()
+        self.stdout.write(self.style.SUCCESS(f"Pruned {deleted} idempotency keys"))
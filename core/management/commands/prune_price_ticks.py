@@ -0,0 +1,23 @@
+# management/commands/prune_price_ticks.py
+from django.core.management.base import BaseCommand
+from core.services.candles import prune_candles
+from core.services.price_history import prune_ticks
+
+
+class Command(BaseCommand):
+    help = 'Delete price ticks and candles older than their retention window'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=None,
+            help='Retention in days (defaults to PRICE_TICK_RETENTION_DAYS)',
+        )
+
+    def handle(self, *args, **options):
+        deleted = prune_ticks(options['days'])
+        self.stdout.write(self.style.SUCCESS(f"Pruned {deleted} price ticks"))
+        
+        deleted = prune_candles()
+        self.stdout.write(self.style.SUCCESS(f"Pruned {deleted} candles"))
@@ -0,0 +1,21 @@
+# management/commands/rebuild_portfolio_summaries.py
+from django.core.management.base import BaseCommand
+from core.services.portfolio import rebuild_portfolio_summaries
+
+
+class Command(BaseCommand):
+    help = 'Recompute per-user portfolio summaries from investments and fix any drift'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user',
+            type=int,
+            action='append',
+            dest='user_ids',
+            default=None,
+            help='Only rebuild this user id (repeatable)',
+        )
+
+    def handle(self, *args, **options):
+        written = rebuild_portfolio_summaries(options['user_ids'])
+        self.stdout.write(self.style.SUCCESS(f"Rewrote {written} portfolio summaries"))
@@ -0,0 +1,53 @@
+# management/commands/refresh_fx_rates.py
+from django.core.management.base import BaseCommand, CommandError
+from core.services.fx_rates import HttpJsonRateProvider, get_providers, refresh_rates, start_stub_server
+
+
+class Command(BaseCommand):
+    help = 'Fetch exchange rates for all active currencies from the configured providers and apply them'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--timeout', type=float, default=None,
+                            help='Seconds to wait for providers (default: settings.FX_RATE_TIMEOUT_SECONDS)')
+        parser.add_argument('--dry-run', action='store_true', help='Fetch and report without saving')
+        parser.add_argument('--stub', action='store_true',
+                            help='Fetch from a local stub server instead of settings.FX_RATE_PROVIDERS')
+        parser.add_argument('--stub-delay', type=float, default=0.0,
+                            help='Seconds the stub server waits before answering')
+
+    def handle(self, *args, **options):
+        server = None
+        if options['stub']:
+            server = start_stub_server(delay=options['stub_delay'])
+            host, port = server.server_address
+            # One request per currency, all in flight at once
+            providers = [HttpJsonRateProvider(f"http://{host}:{port}/", name='stub', batch_size=1)]
+        else:
+            providers = get_providers()
+        if not providers:
+            raise CommandError("No providers: configure settings.FX_RATE_PROVIDERS or pass --stub")
+
+        try:
+            result = refresh_rates(providers, timeout=options['timeout'], dry_run=options['dry_run'])
+        finally:
+            for provider in providers:
+                provider.close()
+            if server:
+                server.shutdown()
+
+        for provider in result.providers:
+            latency = f"{provider.seconds * 1000:.1f}ms" if provider.seconds is not None else '-'
+            status = f"{len(provider.rates)} rates"
+            if provider.error:
+                status += f", error: {provider.error}"
+            self.stdout.write(f"  {provider.name}: {latency}, {status}")
+        for code, (old, new) in result.updated.items():
+            self.stdout.write(f"  {code}: {old} -> {new}")
+        if result.missing:
+            self.stdout.write(self.style.WARNING(f"  No rate for: {', '.join(result.missing)}"))
+
+        verb = 'Would update' if options['dry_run'] else 'Updated'
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} {len(result.updated)} currencies, {len(result.unchanged)} unchanged, "
+            f"{len(result.missing)} missing"
+        ))
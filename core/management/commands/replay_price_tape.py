@@ -0,0 +1,52 @@
+# management/commands/replay_price_tape.py
+from django.core.management.base import BaseCommand, CommandError
+from core.services.price_tape import PriceTape, replay
+
+
+class Command(BaseCommand):
+    help = 'Replay a recorded price tape through PriceFetcher at N x speed'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Tape file written by run_price_ticker --record')
+        parser.add_argument(
+            '--speed',
+            type=float,
+            default=1.0,
+            help='Multiplier on recorded time; 0 replays as fast as possible',
+        )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=None,
+            help='Seed for simulated fallbacks (defaults to the seed stored on the tape)',
+        )
+        parser.add_argument(
+            '--stats-every',
+            type=int,
+            default=100,
+            help='Print tick stats every N ticks',
+        )
+
+    def handle(self, *args, **options):
+        try:
+            tape = PriceTape(options['path'])
+        except (OSError, ValueError) as e:
+            raise CommandError(str(e))
+
+        if not len(tape):
+            raise CommandError(f"{options['path']} has no ticks")
+
+        span = tape.timestamps[-1] - tape.timestamps[0]
+        self.stdout.write(self.style.HTTP_INFO(
+            f"Replaying {len(tape)} ticks x {len(tape.symbols)} symbols "
+            f"({span:.0f}s recorded) at {options['speed'] or 'max'}x"
+        ))
+
+        stats_every = max(1, options['stats_every'])
+
+        def report(stats):
+            if stats.ticks % stats_every == 0:
+                self.stdout.write(str(stats))
+
+        stats = replay(options['path'], speed=options['speed'], seed=options['seed'], on_tick=report)
+        self.stdout.write(self.style.SUCCESS(f"Replay finished: {stats}"))
@@ -0,0 +1,136 @@
+# management/commands/run_price_ticker.py
+import signal
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from assets.models import Asset
+from core.services.mark_to_market import MarkToMarket
+from core.services.price_fetcher import PriceFetcher
+from core.services.price_snapshot import PriceSnapshotWriter
+from core.services.price_tape import TapeRecorder
+from core.services.ticker import PriceTicker
+
+
+class Command(BaseCommand):
+    help = 'Run the background price ticker on a fixed cadence'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=getattr(settings, 'PRICE_TICK_INTERVAL_SECONDS', 5),
+            help='Seconds between ticks',
+        )
+        parser.add_argument(
+            '--jitter',
+            type=float,
+            default=0.0,
+            help='Random extra delay (seconds) added before each tick',
+        )
+        parser.add_argument(
+            '--max-backoff',
+            type=float,
+            default=60.0,
+            help='Upper bound (seconds) for the retry delay after failed ticks',
+        )
+        parser.add_argument(
+            '--only-stale',
+            action='store_true',
+            help='Only update assets not priced for PRICE_STALE_AFTER_SECONDS (default: every active asset each tick)',
+        )
+        parser.add_argument(
+            '--max-ticks',
+            type=int,
+            default=None,
+            help='Stop after this many ticks (default: run forever)',
+        )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=None,
+            help='Seed the price simulator for a reproducible run',
+        )
+        parser.add_argument(
+            '--record',
+            metavar='PATH',
+            default=None,
+            help='Record every tick to a price tape file for later replay',
+        )
+        parser.add_argument(
+            '--no-snapshot',
+            action='store_true',
+            help='Do not publish prices to the shared-memory snapshot',
+        )
+        parser.add_argument(
+            '--no-pnl',
+            action='store_true',
+            help='Do not mark open positions to market after each tick',
+        )
+        parser.add_argument(
+            '--stats-every',
+            type=int,
+            default=60,
+            help='Print tick lag/duration stats every N ticks',
+        )
+
+    def handle(self, *args, **options):
+        ticker = PriceTicker(
+            interval=options['interval'],
+            jitter=options['jitter'],
+            max_backoff=options['max_backoff'],
+            only_stale=options['only_stale'],
+        )
+
+        if options['seed'] is not None:
+            PriceFetcher.seed(options['seed'])
+        
+        recorder = None
+        if options['record']:
+            symbols = Asset.objects.filter(is_active=True).values_list('symbol', flat=True)
+            recorder = TapeRecorder(options['record'], symbols, seed=options['seed'])
+            PriceFetcher.recorder = recorder
+            self.stdout.write(f"Recording {len(recorder.symbols)} symbols to {options['record']}")
+        
+        snapshot = None
+        if not options['no_snapshot']:
+            snapshot = PriceSnapshotWriter()
+            snapshot.publish(Asset.objects.filter(is_active=True))
+            PriceFetcher.tick_listeners.append(snapshot)
+            self.stdout.write(f"Publishing prices to shared memory segment '{snapshot.name}'")
+        
+        mark_to_market = None
+        if not options['no_pnl']:
+            mark_to_market = MarkToMarket()
+            PriceFetcher.tick_listeners.append(mark_to_market)
+        
+        # Finish the current tick, then exit cleanly
+        def shutdown(signum, frame):
+            self.stdout.write(self.style.WARNING("Stopping price ticker..."))
+            ticker.stop()
+
+        signal.signal(signal.SIGINT, shutdown)
+        signal.signal(signal.SIGTERM, shutdown)
+
+        stats_every = max(1, options['stats_every'])
+
+        def report(stats):
+            if stats.ticks % stats_every == 0:
+                self.stdout.write(str(stats))
+
+        self.stdout.write(self.style.HTTP_INFO(
+            f"Price ticker running every {options['interval']}s "
+            f"({'stale assets only' if options['only_stale'] else 'all assets'})"
+        ))
+        try:
+            stats = ticker.run(max_ticks=options['max_ticks'], on_tick=report)
+        finally:
+            if mark_to_market:
+                PriceFetcher.tick_listeners.remove(mark_to_market)
+            if snapshot:
+                PriceFetcher.tick_listeners.remove(snapshot)
+                snapshot.close()
+            if recorder:
+                PriceFetcher.recorder = None
+                recorder.close()
+                self.stdout.write(f"Recorded {recorder.ticks} ticks")
+        self.stdout.write(self.style.SUCCESS(f"Price ticker stopped: {stats}"))
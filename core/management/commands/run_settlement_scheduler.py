@@ -0,0 +1,66 @@
+# management/commands/run_settlement_scheduler.py
+import signal
+
+from django.core.management.base import BaseCommand
+from core.services.maturity import MaturityScheduler
+
+
+class Command(BaseCommand):
+    help = 'Settle investments as they mature, woken by their end_time'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--horizon',
+            type=float,
+            default=None,
+            help='Seconds of upcoming maturities to keep loaded (defaults to SETTLEMENT_HORIZON_SECONDS)',
+        )
+        parser.add_argument(
+            '--reload-interval',
+            type=float,
+            default=None,
+            help='Seconds between reloads from the database (defaults to SETTLEMENT_RELOAD_SECONDS)',
+        )
+        parser.add_argument(
+            '--max-batches',
+            type=int,
+            default=None,
+            help='Stop after this many settlement batches (default: run forever)',
+        )
+        parser.add_argument(
+            '--stats-every',
+            type=int,
+            default=10,
+            help='Print settlement lag stats every N batches',
+        )
+
+    def handle(self, *args, **options):
+        scheduler = MaturityScheduler(
+            horizon=options['horizon'],
+            reload_interval=options['reload_interval'],
+        )
+
+        # Finish the current batch, then exit cleanly
+        def shutdown(signum, frame):
+            self.stdout.write(self.style.WARNING("Stopping settlement scheduler..."))
+            scheduler.stop()
+
+        signal.signal(signal.SIGINT, shutdown)
+        signal.signal(signal.SIGTERM, shutdown)
+
+        stats_every = max(1, options['stats_every'])
+
+        def report(stats):
+            if stats.batches % stats_every == 0:
+                self.stdout.write(str(stats))
+
+        host, port = scheduler.address
+        self.stdout.write(self.style.HTTP_INFO(
+            f"Settlement scheduler listening on {host}:{port} "
+            f"(horizon {scheduler.horizon:.0f}s, reload every {scheduler.reload_interval:.0f}s)"
+        ))
+        try:
+            stats = scheduler.run(max_batches=options['max_batches'], on_batch=report)
+        finally:
+            scheduler.close()
+        self.stdout.write(self.style.SUCCESS(f"Settlement scheduler stopped: {stats}"))
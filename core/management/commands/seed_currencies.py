@@ -5,7 +5,10 @@ from django.core.management.base import BaseCommand
 from django.db import transaction
 from django.contrib.auth import get_user_model
 from core.models import Currency
-from wallet.models import Wallet
+from core.services import balances
+from core.services.currencies import bump_version
+from core.services.ledger import BALANCE_FIELDS
+from wallet.models import LedgerEntry, Wallet
 
 User = get_user_model()
 
@@ -32,6 +35,8 @@ class Command(BaseCommand):
             self.reset_currencies()
         
         self.seed_currencies()
+        # Workers reload their currency tables on their next version check
+        bump_version()
         
         if options['fix_wallets']:
             self.fix_wallet_balances()
@@ -165,43 +170,46 @@ class Command(BaseCommand):
         wallets_fixed = 0
         wallets_skipped = 0
         
-        for wallet in Wallet.objects.all():
-            try:
-                if wallet.currency and wallet.currency != 'USD':
-                    # Get the currency object
-                    currency_obj = Currency.objects.get(code=wallet.currency)
-                    
-                    # Check if balance looks like it's in local currency (too large for USD)
-                    # Example: 100,000 would be suspicious for USD but normal for KES
-                    if wallet.balance > 1000:  # Threshold for suspicion
-                        self.stdout.write(f"  ⚠️  Suspicious balance for {wallet.user.username}: {wallet.balance} {wallet.currency}")
-                        
-                        # Convert from local currency to USD
-                        old_balance = wallet.balance
-                        wallet.balance = wallet.balance / currency_obj.exchange_rate
-                        wallet.equity = wallet.equity / currency_obj.exchange_rate if wallet.equity else Decimal('0')
-                        wallet.bonus_balance = wallet.bonus_balance / currency_obj.exchange_rate if wallet.bonus_balance else Decimal('0')
-                        
-                        # Round to 2 decimal places
-                        wallet.balance = wallet.balance.quantize(Decimal('0.01'))
-                        wallet.equity = wallet.equity.quantize(Decimal('0.01'))
-                        wallet.bonus_balance = wallet.bonus_balance.quantize(Decimal('0.01'))
-                        
-                        wallet.save()
-                        wallets_fixed += 1
-                        
-                        self.stdout.write(f"    🔄 Converted: {old_balance} {wallet.currency} → {wallet.balance} USD")
-                    else:
-                        wallets_skipped += 1
-                else:
-                    wallets_skipped += 1
-                    
-            except Currency.DoesNotExist:
+        for wallet in Wallet.objects.select_related('user'):
+            if not wallet.currency or wallet.currency == 'USD':
+                wallets_skipped += 1
+                continue
+            
+            currency_obj = Currency.objects.filter(code=wallet.currency).first()
+            if currency_obj is None:
                 self.stdout.write(self.style.ERROR(f"  ❌ Currency {wallet.currency} not found for user {wallet.user.username}"))
-                # Set to USD as fallback
-                wallet.currency = 'USD'
-                wallet.save()
+                # Set to USD as fallback; only the preference, never the balances
+                Wallet.objects.filter(pk=wallet.pk).update(currency='USD')
                 wallets_fixed += 1
+                continue
+            
+            # Check if balance looks like it's in local currency (too large for USD)
+            # Example: 100,000 would be suspicious for USD but normal for KES
+            reference = balances.currency_fix_reference(wallet.pk)
+            if wallet.available_balance <= 1000 or LedgerEntry.objects.filter(reference=reference).exists():
+                # Below the threshold, or already converted by an earlier run
+                wallets_skipped += 1
+                continue
+            
+            self.stdout.write(f"  ⚠️  Suspicious balance for {wallet.user.username}: {wallet.available_balance} {wallet.currency}")
+            
+            # Convert from local currency to USD, rounded to 2 decimal places;
+            # applied as deltas through the ledger like any other balance change
+            deltas = {
+                field: (getattr(wallet, field) / currency_obj.exchange_rate).quantize(Decimal('0.01')) - getattr(wallet, field)
+                for field in BALANCE_FIELDS
+            }
+            try:
+                balances.adjust(wallet, reference=reference, **deltas)
+            except balances.InsufficientFunds:
+                # The wallet moved since it was read; the next run picks it up again
+                self.stdout.write(self.style.ERROR(f"    ❌ Balance of {wallet.user.username} changed, not converted"))
+                wallets_skipped += 1
+                continue
+            wallets_fixed += 1
+            
+            converted = wallet.available_balance + deltas['available_balance']
+            self.stdout.write(f"    🔄 Converted: {wallet.available_balance} {wallet.currency} → {converted} USD")
         
         self.stdout.write(self.style.SUCCESS(f"💳 Wallets: {wallets_fixed} fixed, {wallets_skipped} skipped"))
 
@@ -230,8 +238,8 @@ class Command(BaseCommand):
         if sample_wallet:
             self.stdout.write(f"  🧪 Sample wallet ({sample_wallet.user.username}):")
             self.stdout.write(f"    • Currency: {sample_wallet.currency}")
-            self.stdout.write(f"    • Balance: {sample_wallet.balance}")
-            self.stdout.write(f"    • Equity: {sample_wallet.equity}")
+            self.stdout.write(f"    • Available: {sample_wallet.available_balance}")
+            self.stdout.write(f"    • Locked: {sample_wallet.locked_balance}")
         
         # Verify conversion
         usd = Currency.objects.get(code='USD')
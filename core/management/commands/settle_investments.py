@@ -0,0 +1,42 @@
+# management/commands/settle_investments.py
+import time
+
+from django.core.management.base import BaseCommand
+from core.services.settlement import seed, settle_investments
+
+
+class Command(BaseCommand):
+    help = 'Settle matured investments in chunked batches (safe to rerun)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=None,
+            help='Investments per transaction (defaults to SETTLEMENT_CHUNK_SIZE)',
+        )
+        parser.add_argument(
+            '--limit',
+            type=int,
+            default=None,
+            help='Stop after settling this many investments',
+        )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=None,
+            help='Seed the market factor for a reproducible run',
+        )
+
+    def handle(self, *args, **options):
+        if options['seed'] is not None:
+            seed(options['seed'])
+        
+        started = time.monotonic()
+        settled = settle_investments(chunk_size=options['chunk_size'], limit=options['limit'])
+        elapsed = time.monotonic() - started
+        
+        rate = settled / elapsed * 60 if elapsed else 0
+        self.stdout.write(self.style.SUCCESS(
+            f"Settled {settled} investments in {elapsed:.2f}s ({rate:,.0f}/min)"
+        ))
@@ -0,0 +1,92 @@
+# core/middleware.py
+"""
+Per-request user context.
+
+UserContextMiddleware puts a UserContext on every request as
+`request.user_context`. Its wallet, currency and active currency list are
+resolved lazily, at most once per request, so the view, get_user_currency
+and the currency context processor all share one wallet query instead of
+each running their own. Currencies come from the process-wide table in
+core.services.currencies.
+"""
+from decimal import Decimal
+
+from django.utils.functional import cached_property
+
+from core.services import currencies
+from core.utils.currency import BASE_CURRENCY
+
+
+class UserContext:
+
+    def __init__(self, request):
+        self.request = request
+        self.wallet_created = False
+
+    @cached_property
+    def wallet(self):
+        """The user's wallet (created on first use), or None for anonymous users"""
+        from wallet.models import Wallet
+
+        user = self.request.user
+        if not user.is_authenticated:
+            return None
+        wallet, self.wallet_created = Wallet.objects.get_or_create(
+            user=user,
+            defaults={
+                'available_balance': Decimal('0.00'),
+                'locked_balance': Decimal('0.00'),
+                'bonus_balance': Decimal('0.00'),
+                'bonus_claimed': Decimal('0.00'),
+                # A new wallet keeps the currency picked before signing in
+                'currency': self._cookie_currency(),
+            }
+        )
+        return wallet
+
+    @cached_property
+    def available_currencies(self):
+        return currencies.active_currencies()
+
+    @cached_property
+    def currency(self):
+        """
+        The user's display currency.
+        Priority: Wallet → Cookie → USD
+        """
+        from core.models import Currency
+
+        code = self.wallet.currency if self.wallet else self._cookie_currency()
+        code = code or BASE_CURRENCY
+        for currency in self.available_currencies:
+            if currency.code == code:
+                return currency
+        # Inactive or unknown: fall back to USD
+        currency = currencies.get_currency(BASE_CURRENCY, active_only=False)
+        if currency is None:
+            raise Currency.DoesNotExist(f"{BASE_CURRENCY} is missing")
+        return currency
+
+    def _cookie_currency(self):
+        code = self.request.COOKIES.get('currency', BASE_CURRENCY)
+        if any(currency.code == code for currency in self.available_currencies):
+            return code
+        return BASE_CURRENCY
+
+
+def get_user_context(request):
+    """request.user_context, created on demand when the middleware did not run"""
+    context = getattr(request, 'user_context', None)
+    if context is None:
+        context = request.user_context = UserContext(request)
+    return context
+
+
+class UserContextMiddleware:
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.user_context = UserContext(request)
+        return self.get_response(request)
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:58
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UnrealizedPnL',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('unrealized_pnl', models.DecimalField(decimal_places=2, default=0, max_digits=20)),
+                ('market_value', models.DecimalField(decimal_places=2, default=0, max_digits=20)),
+                ('open_positions', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='unrealizedpnl',
+            name='user',
+            field=models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='unrealized_pnl', to=settings.AUTH_USER_MODEL),
+        ),
+    ]
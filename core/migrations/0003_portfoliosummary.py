@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:00
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_unrealizedpnl'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PortfolioSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('active_count', models.PositiveIntegerField(default=0)),
+                ('active_invested', models.DecimalField(decimal_places=2, default=0, max_digits=20)),
+                ('closed_invested', models.DecimalField(decimal_places=2, default=0, max_digits=20)),
+                ('total_profit', models.DecimalField(decimal_places=2, default=0, max_digits=20)),
+                ('total_loss', models.DecimalField(decimal_places=2, default=0, max_digits=20)),
+                ('total_invested', models.DecimalField(decimal_places=2, default=0, max_digits=20)),
+                ('total_profit_loss', models.DecimalField(decimal_places=2, default=0, max_digits=20)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='portfolio_summary', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:18
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def opening_rates(apps, schema_editor):
+    """Current rates start the history (and stand in for everything before it)"""
+    Currency = apps.get_model('core', 'Currency')
+    ExchangeRate = apps.get_model('core', 'ExchangeRate')
+
+    now = timezone.now()
+    ExchangeRate.objects.bulk_create(
+        ExchangeRate(currency_id=currency_id, rate=rate, effective_at=now)
+        for currency_id, rate in Currency.objects.values_list('id', 'exchange_rate')
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_idempotencykey'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExchangeRate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('rate', models.DecimalField(decimal_places=4, max_digits=10)),
+                ('effective_at', models.DateTimeField()),
+                ('currency', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='rates', to='core.currency')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['currency', 'effective_at'], name='core_fx_rate_at_idx')],
+            },
+        ),
+        migrations.RunPython(opening_rates, migrations.RunPython.noop),
+    ]
@@ -86,6 +86,83 @@ class Investment(models.Model):
         return self.status == 'active'
 
 
+# -------------------------
+# Portfolio summary (maintained on every Investment write)
+# -------------------------
+class PortfolioSummary(models.Model):
+    """Per-user investments.Investment totals so dashboards never aggregate history"""
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        related_name='portfolio_summary'
+    )
+    active_count = models.PositiveIntegerField(default=0)
+    active_invested = models.DecimalField(max_digits=20, decimal_places=2, default=0)
+    # Investments no longer active (completed, cancelled)
+    closed_invested = models.DecimalField(max_digits=20, decimal_places=2, default=0)
+    total_profit = models.DecimalField(max_digits=20, decimal_places=2, default=0)
+    total_loss = models.DecimalField(max_digits=20, decimal_places=2, default=0)
+    # Over every investment, active ones included
+    total_invested = models.DecimalField(max_digits=20, decimal_places=2, default=0)
+    total_profit_loss = models.DecimalField(max_digits=20, decimal_places=2, default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.user} portfolio"
+
+
+# -------------------------
+# Unrealized PnL (written by the price ticker)
+# -------------------------
+class UnrealizedPnL(models.Model):
+    """Mark-to-market totals of a user's open positions, refreshed every price tick"""
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        related_name='unrealized_pnl'
+    )
+    unrealized_pnl = models.DecimalField(max_digits=20, decimal_places=2, default=0)
+    market_value = models.DecimalField(max_digits=20, decimal_places=2, default=0)
+    open_positions = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"{self.user} - {self.unrealized_pnl}"
+
+
+# -------------------------
+# Idempotency keys (replayed responses for retried POSTs)
+# -------------------------
+class IdempotencyKey(models.Model):
+    """The response a keyed POST produced, replayed when the client retries it"""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='idempotency_keys'
+    )
+    key = models.CharField(max_length=64)
+    endpoint = models.CharField(max_length=100)
+    # sha256 of the request parameters, so a reused key with a different body is rejected
+    fingerprint = models.CharField(max_length=64)
+    # Null while the first request is still running
+    status_code = models.PositiveSmallIntegerField(null=True, blank=True)
+    location = models.CharField(max_length=500, blank=True)
+    content_type = models.CharField(max_length=100, blank=True)
+    content = models.BinaryField(blank=True, default=b'')
+    created_at = models.DateTimeField(auto_now_add=True)
+    # An unfinished claim older than IDEMPOTENCY_CLAIM_TIMEOUT_SECONDS can be taken over
+    claimed_at = models.DateTimeField(default=timezone.now)
+    expires_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'key'], name='core_idempotency_key_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.user} {self.endpoint} {self.key}"
+
+
 class Currency(models.Model):
     code = models.CharField(max_length=10, unique=True)
     name = models.CharField(max_length=50)
@@ -96,7 +173,26 @@ class Currency(models.Model):
     
     def __str__(self):
         return f"{self.code} - {self.name}"
-    
+
+
+class ExchangeRate(models.Model):
+    """Rate history: 1 USD = rate units of the currency from effective_at until the next row"""
+    currency = models.ForeignKey(
+        Currency,
+        on_delete=models.CASCADE,
+        related_name='rates'
+    )
+    rate = models.DecimalField(max_digits=10, decimal_places=4)
+    effective_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['currency', 'effective_at'], name='core_fx_rate_at_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.currency.code} {self.rate} from {self.effective_at}"
+
 class ContactMessage(models.Model):
     name = models.CharField(max_length=100)
     email = models.EmailField()
@@ -0,0 +1,163 @@
+# core/services/balances.py
+"""
+Atomic wallet balance changes.
+
+Every change is a single conditional UPDATE with F() expressions, e.g.
+    UPDATE wallet SET available_balance = available_balance - 10
+    WHERE id = 1 AND available_balance >= 10
+so concurrent requests for one wallet cannot lose each other's updates or
+overdraw it, and only the balance columns that change are written. Each
+applied change appends its journal to the ledger (core.services.ledger)
+in the same transaction. The
+row lock is taken by the UPDATE itself and held until the surrounding
+transaction commits, so callers should make the wallet change the last
+statement of their transaction.
+
+The time spent in each UPDATE (under contention, mostly waiting for the
+row lock) is recorded in `lock_stats` and logged when it is slow.
+"""
+from collections import deque
+from decimal import Decimal
+import logging
+import time
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+
+from core.services import ledger
+from core.services.ledger import BALANCE_FIELDS
+from core.services.stats import format_percentiles, percentiles
+
+logger = logging.getLogger(__name__)
+
+CENT = Decimal('0.01')
+WELCOME_BONUS = Decimal('500.00')
+# Lock waits above this are logged as warnings
+DEFAULT_LOCK_WARN_SECONDS = 0.25
+
+
+class InsufficientFunds(Exception):
+    """The wallet does not hold enough to cover a debit"""
+
+
+class LockStats:
+    """Wallet UPDATE wait-time percentiles over a rolling window"""
+
+    def __init__(self, window=10000):
+        self.updates = 0
+        self.conflicts = 0
+        self.waits = deque(maxlen=window)
+
+    def record(self, seconds, applied=True):
+        self.updates += 1
+        if not applied:
+            self.conflicts += 1
+        self.waits.append(seconds)
+
+    def summary(self):
+        return {
+            'updates': self.updates,
+            'conflicts': self.conflicts,
+            'wait': percentiles(self.waits),
+        }
+
+    def __str__(self):
+        s = self.summary()
+        return (
+            f"updates={s['updates']} conflicts={s['conflicts']} {format_percentiles('wait', s['wait'])}"
+        )
+
+
+lock_stats = LockStats()
+
+
+def _cents(amount):
+    return Decimal(amount).quantize(CENT)
+
+
+def adjust(wallet, *, allow_negative=False, reference='', **deltas):
+    """
+    Add `deltas` ({balance field: signed amount}) to the wallet in one
+    UPDATE and post them to the ledger under `reference`. Unless
+    allow_negative, every debited balance must cover its debit, otherwise
+    nothing changes and InsufficientFunds is raised.
+    """
+    from wallet.models import Wallet
+
+    deltas = {field: _cents(amount) for field, amount in deltas.items() if amount}
+    unknown = deltas.keys() - set(BALANCE_FIELDS)
+    if unknown:
+        raise ValueError(f"Not a wallet balance: {', '.join(sorted(unknown))}")
+    if not deltas:
+        return
+
+    conditions = {}
+    if not allow_negative:
+        conditions = {f"{field}__gte": -amount for field, amount in deltas.items() if amount < 0}
+
+    wallet_id = getattr(wallet, 'pk', wallet)
+    with transaction.atomic():
+        started = time.perf_counter()
+        updated = Wallet.objects.filter(pk=wallet_id, **conditions).update(
+            **{field: F(field) + amount for field, amount in deltas.items()}
+        )
+        waited = time.perf_counter() - started
+        if updated:
+            ledger.record(wallet_id, deltas, reference)
+
+    lock_stats.record(waited, applied=bool(updated))
+    if waited >= getattr(settings, 'WALLET_LOCK_WARN_SECONDS', DEFAULT_LOCK_WARN_SECONDS):
+        logger.warning(f"Wallet {wallet_id} update waited {waited * 1000:.0f}ms for its row lock")
+
+    if not updated:
+        raise InsufficientFunds(f"Wallet {wallet_id} cannot cover {deltas}")
+
+
+def credit(wallet, amount, reference=''):
+    """Add to the available balance"""
+    adjust(wallet, reference=reference, available_balance=amount)
+
+
+def debit(wallet, amount, reference=''):
+    """Take from the available balance; raises InsufficientFunds if it is short"""
+    adjust(wallet, reference=reference, available_balance=-_cents(amount))
+
+
+def lock(wallet, amount, reference=''):
+    """Move funds from available to locked (opening an investment)"""
+    amount = _cents(amount)
+    adjust(wallet, reference=reference, available_balance=-amount, locked_balance=amount)
+
+
+def release(wallet, principal, payout, reference=''):
+    """Unlock an investment's principal and pay out principal + profit"""
+    # Same as batch settlement: the principal was locked when investing
+    adjust(
+        wallet, allow_negative=True, reference=reference,
+        locked_balance=-_cents(principal), available_balance=payout,
+    )
+
+
+def welcome_bonus_reference(wallet_id):
+    return f"WLC{wallet_id}"
+
+
+def currency_fix_reference(wallet_id):
+    """Ledger reference of `seed_currencies --fix-wallets` converting a wallet to USD"""
+    return f"CCY{wallet_id}"
+
+
+def claim_welcome_bonus(wallet):
+    """Credit the one-off welcome bonus; returns False if it was already claimed"""
+    from wallet.models import Wallet
+
+    wallet_id = getattr(wallet, 'pk', wallet)
+    with transaction.atomic():
+        claimed = bool(Wallet.objects.filter(pk=wallet_id, bonus_claimed=0).update(
+            bonus_balance=F('bonus_balance') + WELCOME_BONUS,
+            bonus_claimed=True,
+        ))
+        if claimed:
+            ledger.record(wallet_id, {'bonus_balance': WELCOME_BONUS}, welcome_bonus_reference(wallet_id))
+    return claimed
@@ -0,0 +1,172 @@
+# core/services/candles.py
+from datetime import datetime, timedelta
+from datetime import timezone as dt_timezone
+import logging
+
+from django.db import connection
+from django.db.models import F, FloatField
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Greatest, Least
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+# Candle intervals maintained on every tick
+INTERVALS = {
+    '1m': timedelta(minutes=1),
+    '5m': timedelta(minutes=5),
+    '1h': timedelta(hours=1),
+    '1d': timedelta(days=1),
+}
+
+# How long each interval is kept (None = forever)
+RETENTION = {
+    '1m': timedelta(days=2),
+    '5m': timedelta(days=7),
+    '1h': timedelta(days=90),
+    '1d': None,
+}
+
+# Above this many assets, load the whole bucket instead of an IN (...) list
+IN_QUERY_LIMIT = 500
+# Assets per merge UPDATE ... CASE statement
+UPDATE_BATCH_SIZE = 500
+
+
+def bucket_start(timestamp, interval):
+    """Floor a timestamp to the start of its candle bucket (UTC aligned)"""
+    seconds = int(INTERVALS[interval].total_seconds())
+    epoch = int(timestamp.timestamp())
+    return datetime.fromtimestamp(epoch - epoch % seconds, tz=dt_timezone.utc)
+
+
+def _price_by_asset(prices):
+    """`CASE asset_id WHEN ... THEN price END` as one RawSQL expression (see settlement._case_by_pk)"""
+    from assets.models import PriceCandle
+
+    field = PriceCandle._meta.get_field('asset')
+    sql = f"CASE {connection.ops.quote_name(field.column)} {'WHEN %s THEN %s ' * len(prices)}END"
+    params = []
+    for asset_id, price in prices.items():
+        params += [field.get_db_prep_value(asset_id, connection), price]
+    return RawSQL(sql, params, output_field=FloatField())
+
+
+def update_candles(assets, timestamp=None):
+    """
+    Fold the current price of each asset into its open candle for every
+    interval. Per interval: one read of the bucket, an insert of the
+    candles it lacks, and one merge UPDATE per UPDATE_BATCH_SIZE assets.
+
+    Missing candles are inserted empty (tick_count 0) ignoring conflicts,
+    and every price is merged in SQL (high = max(high, price), ...), so a
+    concurrent tick opening the same bucket neither fails on the unique
+    constraint nor loses either tick.
+    """
+    from assets.models import PriceCandle
+
+    timestamp = timestamp or timezone.now()
+    prices = {asset.id: float(asset.current_price) for asset in assets if asset.current_price}
+    if not prices:
+        return
+
+    asset_ids = list(prices)
+    for interval in INTERVALS:
+        start = bucket_start(timestamp, interval)
+        candles = PriceCandle.objects.filter(interval=interval, bucket_start=start)
+        if len(prices) <= IN_QUERY_LIMIT:
+            candles = candles.filter(asset_id__in=asset_ids)
+        existing = set(candles.values_list('asset_id', flat=True))
+
+        created = [
+            PriceCandle(
+                asset_id=asset_id, interval=interval, bucket_start=start,
+                open=price, high=price, low=price, close=price, tick_count=0,
+            )
+            for asset_id, price in prices.items() if asset_id not in existing
+        ]
+        if created:
+            PriceCandle.objects.bulk_create(created, batch_size=1000, ignore_conflicts=True)
+
+        for i in range(0, len(asset_ids), UPDATE_BATCH_SIZE):
+            batch = {asset_id: prices[asset_id] for asset_id in asset_ids[i:i + UPDATE_BATCH_SIZE]}
+            price = _price_by_asset(batch)
+            PriceCandle.objects.filter(interval=interval, bucket_start=start, asset_id__in=list(batch)).update(
+                high=Greatest('high', price),
+                low=Least('low', price),
+                close=price,
+                tick_count=F('tick_count') + 1,
+            )
+
+
+def get_24h_stats(asset_ids=None, now=None):
+    """
+    24h change, high/low and an hourly sparkline per asset, built from one
+    indexed read of 1h candles. Returns {asset_id: stats}.
+    """
+    from assets.models import PriceCandle
+
+    now = now or timezone.now()
+    candles = PriceCandle.objects.filter(
+        interval='1h',
+        bucket_start__gte=bucket_start(now - timedelta(hours=24), '1h'),
+    )
+    if asset_ids is not None:
+        candles = candles.filter(asset_id__in=list(asset_ids))
+    candles = candles.order_by('asset_id', 'bucket_start').values_list(
+        'asset_id', 'open', 'high', 'low', 'close'
+    )
+
+    stats = {}
+    for asset_id, open_, high, low, close in candles:
+        entry = stats.get(asset_id)
+        if entry is None:
+            stats[asset_id] = {
+                'open_24h': open_,
+                'high_24h': high,
+                'low_24h': low,
+                'close': close,
+                'sparkline': [close],
+            }
+        else:
+            entry['high_24h'] = max(entry['high_24h'], high)
+            entry['low_24h'] = min(entry['low_24h'], low)
+            entry['close'] = close
+            entry['sparkline'].append(close)
+
+    for entry in stats.values():
+        open_ = entry['open_24h']
+        entry['change_24h'] = ((entry['close'] - open_) / open_ * 100) if open_ else 0.0
+
+    return stats
+
+
+def prune_candles(now=None):
+    """Delete candles past their interval's retention window"""
+    from assets.models import PriceCandle
+
+    now = now or timezone.now()
+    deleted = 0
+    for interval, retention in RETENTION.items():
+        if retention is None:
+            continue
+        count, _ = PriceCandle.objects.filter(
+            interval=interval,
+            bucket_start__lt=now - retention,
+        ).delete()
+        deleted += count
+    logger.info(f"Pruned {deleted} candles")
+    return deleted
+
+
+def sparkline_points(values, width=100, height=24):
+    """Scale a series into an SVG polyline `points` string"""
+    if len(values) < 2:
+        return ''
+    low, high = min(values), max(values)
+    span = (high - low) or 1.0
+    step = width / (len(values) - 1)
+    return ' '.join(
+        f"{i * step:.1f},{height - (value - low) / span * height:.1f}"
+        for i, value in enumerate(values)
+    )
@@ -0,0 +1,223 @@
+# core/services/currencies.py
+"""
+Process-wide currency table (code -> Currency with rate and symbol).
+
+Currency rows change rarely, so every worker keeps them in memory instead
+of querying them on each request. A version number in the shared Django
+cache tells workers when their copy is stale: saving or deleting a Currency
+(core.signals) and `seed_currencies` bump it, and each worker compares its
+copy's version with the shared one at most every
+CURRENCY_CACHE_CHECK_SECONDS, so new rates reach all workers within seconds.
+
+The version is only seen by other workers when CACHES is shared between
+them (Redis, Memcached, database cache); with the per-process default a
+bump only reloads the worker that made it.
+
+The table holds current rates only, never the whole ExchangeRate history.
+rate_at ("the rate in effect at time T") loads the history one UTC day at
+a time: the rate in effect when the day starts plus the changes during it,
+from the (currency, effective_at) index. Loaded days are kept on the table
+(the RATE_DAYS_CACHED most recently used), so converting many rows from
+the same days costs a bisect in memory rather than a query per row, and a
+version bump drops them with the rest of the table. Rates before a
+currency's first recorded one fall back to that first rate.
+
+The Currency instances are shared by every request in the process; treat
+them as read-only.
+"""
+from bisect import bisect_right
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from datetime import time as dt_time
+from datetime import timezone as dt_timezone
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import OuterRef, Subquery
+from django.utils import timezone
+
+VERSION_KEY = 'currencies:version'
+DEFAULT_CHECK_SECONDS = 5
+# (currency, day) rate windows kept per table
+RATE_DAYS_CACHED = 4096
+ONE_DAY = timedelta(days=1)
+
+_lock = threading.Lock()
+_table = None
+_checked_at = 0.0
+
+
+class CurrencyTable:
+
+    def __init__(self, version, currencies):
+        self.version = version
+        self.by_code = {currency.code: currency for currency in currencies}
+        self.active = [currency for currency in self.by_code.values() if currency.is_active]
+        # (code, day) -> (rate at the start of the day, [effective_at timestamps], [rates])
+        self.days = OrderedDict()
+        self.days_lock = threading.Lock()
+
+    def day_windows(self, currency, days):
+        """{day: window} for each of days (UTC midnights), loading the missing ones"""
+        windows = {}
+        missing = []
+        with self.days_lock:
+            for day in days:
+                window = self.days.get((currency.code, day))
+                if window is None:
+                    missing.append(day)
+                else:
+                    self.days.move_to_end((currency.code, day))
+                    windows[day] = window
+        if not missing:
+            return windows
+
+        loaded = _load_days(currency, sorted(missing))
+        windows.update(loaded)
+        with self.days_lock:
+            for day, window in loaded.items():
+                self.days[(currency.code, day)] = window
+            while len(self.days) > RATE_DAYS_CACHED:
+                self.days.popitem(last=False)
+        return windows
+
+
+def _load_days(currency, days):
+    """Rate windows of the sorted days: one range query over their span plus the opening rate"""
+    from core.models import ExchangeRate
+
+    history = ExchangeRate.objects.filter(currency_id=currency.pk)
+    rows = list(
+        history.filter(effective_at__gte=days[0], effective_at__lt=days[-1] + ONE_DAY)
+        .order_by('effective_at', 'pk').values_list('effective_at', 'rate')
+    )
+    opening = (
+        history.filter(effective_at__lt=days[0]).order_by('-effective_at', '-pk')
+        .values_list('rate', flat=True).first()
+    )
+    if opening is None:
+        # Before the first recorded rate: that first rate, or the current one without history
+        first = rows[0][1] if rows else history.order_by('effective_at', 'pk').values_list('rate', flat=True).first()
+        opening = currency.exchange_rate if first is None else first
+
+    windows = {}
+    i = 0
+    for day in days:
+        while i < len(rows) and rows[i][0] < day:
+            opening = rows[i][1]
+            i += 1
+        stamps, values = [], []
+        while i < len(rows) and rows[i][0] < day + ONE_DAY:
+            stamps.append(rows[i][0].timestamp())
+            values.append(rows[i][1])
+            i += 1
+        windows[day] = (opening, stamps, values)
+        if values:
+            opening = values[-1]
+    return windows
+
+
+def _day(when):
+    return datetime.combine(when.astimezone(dt_timezone.utc).date(), dt_time.min, tzinfo=dt_timezone.utc)
+
+
+def _new_version():
+    # Unique, so a version lost from the cache never matches a worker's old copy
+    return time.time_ns()
+
+
+def current_version():
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        cache.add(VERSION_KEY, _new_version(), timeout=None)
+        version = cache.get(VERSION_KEY)
+    return version
+
+
+def bump_version():
+    """Mark every worker's table stale; this process reloads on its next read"""
+    global _checked_at
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.add(VERSION_KEY, _new_version(), timeout=None)
+    _checked_at = 0.0
+
+
+def get_table():
+    global _table, _checked_at
+    check_seconds = getattr(settings, 'CURRENCY_CACHE_CHECK_SECONDS', DEFAULT_CHECK_SECONDS)
+    table = _table
+    if table is not None and time.monotonic() - _checked_at < check_seconds:
+        return table
+
+    from core.models import Currency
+
+    with _lock:
+        # Version first: a change committed while loading leaves the table marked stale
+        version = current_version()
+        if _table is None or _table.version != version:
+            _table = CurrencyTable(version, Currency.objects.order_by('pk'))
+        _checked_at = time.monotonic()
+        return _table
+
+
+def active_currencies():
+    return list(get_table().active)
+
+
+def get_currency(code, active_only=True):
+    """The Currency for code, or None"""
+    currency = get_table().by_code.get(code)
+    if currency is None or (active_only and not currency.is_active):
+        return None
+    return currency
+
+
+def rates_at(currency, times):
+    """The rate in effect for currency at each of times (the current rate for None)"""
+    times = list(times)
+    windows = get_table().day_windows(currency, {_day(when) for when in times if when is not None})
+    result = []
+    for when in times:
+        if when is None:
+            result.append(currency.exchange_rate)
+            continue
+        opening, stamps, values = windows[_day(when)]
+        i = bisect_right(stamps, when.timestamp()) - 1
+        result.append(values[i] if i >= 0 else opening)
+    return result
+
+
+def rate_at(currency, when):
+    return rates_at(currency, [when])[0]
+
+
+def record_rates(currencies, effective_at=None):
+    """
+    Append a history row for each currency whose exchange_rate differs from
+    its latest recorded rate; returns the rows written
+    """
+    from core.models import ExchangeRate
+
+    effective_at = effective_at or timezone.now()
+    latest = dict(
+        ExchangeRate.objects.filter(
+            currency__in=currencies,
+            pk=Subquery(
+                ExchangeRate.objects.filter(currency=OuterRef('currency'))
+                .order_by('-effective_at', '-pk').values('pk')[:1]
+            ),
+        ).values_list('currency_id', 'rate')
+    )
+    rows = ExchangeRate.objects.bulk_create([
+        ExchangeRate(currency=currency, rate=currency.exchange_rate, effective_at=effective_at)
+        for currency in currencies
+        if latest.get(currency.pk) != currency.exchange_rate
+    ])
+    if rows:
+        transaction.on_commit(bump_version)
+    return rows
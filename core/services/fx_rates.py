@@ -0,0 +1,265 @@
+# core/services/fx_rates.py
+"""
+Exchange-rate providers used by `refresh_fx_rates`.
+
+Every provider implements fetch_rates(codes) and returns {code: rate} with
+rate = units of the currency per 1 USD, leaving out codes it cannot price.
+A provider with a batch_size is asked for at most that many codes per
+call. Every batch of every provider configured in settings.FX_RATE_PROVIDERS
+is fetched concurrently; for each code the first provider in the list that
+priced it wins. The merged rates are written with one bulk_update, appended
+to the rate history and the currency table version is bumped so workers
+reload.
+"""
+from concurrent.futures import ThreadPoolExecutor, wait
+from decimal import Decimal, InvalidOperation
+import json
+import logging
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from core.services.currencies import bump_version, record_rates
+from core.utils.currency import BASE_CURRENCY
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TIMEOUT = 5.0
+# Concurrent fetches across all providers and batches
+MAX_WORKERS = 8
+RATE_PLACES = Decimal('0.0001')
+# Currency.exchange_rate is max_digits=10, decimal_places=4
+MAX_RATE = Decimal('999999.9999')
+
+
+class FxRateProvider:
+    """Base class for exchange-rate sources"""
+    name = 'base'
+    # Codes per fetch_rates call; None asks for all of them at once
+    batch_size = None
+
+    def fetch_rates(self, codes):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class StaticRateProvider(FxRateProvider):
+    """Fixed rates from OPTIONS, e.g. to pin a currency the other providers lack"""
+    name = 'static'
+
+    def __init__(self, rates, name=None):
+        self.rates = rates
+        self.name = name or self.name
+
+    def fetch_rates(self, codes):
+        return {code: self.rates[code] for code in codes if code in self.rates}
+
+
+class HttpJsonRateProvider(FxRateProvider):
+    """
+    Fetch rates from a JSON HTTP endpoint, `batch_size` codes per request
+    over one pooled requests.Session:
+        GET <url>?base=USD&symbols=KES,EUR  ->  {"rates": {"KES": 160.1, "EUR": 0.92}}
+    """
+    name = 'http'
+
+    def __init__(self, url, timeout=2.0, symbols_param='symbols', headers=None, name=None, batch_size=20):
+        self.url = url
+        self.timeout = timeout
+        self.symbols_param = symbols_param
+        self.name = name or self.name
+        self.batch_size = batch_size
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=MAX_WORKERS)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        if headers:
+            self.session.headers.update(headers)
+
+    def fetch_rates(self, codes):
+        response = self.session.get(
+            self.url,
+            params={'base': BASE_CURRENCY, self.symbols_param: ','.join(codes)},
+            timeout=self.timeout,
+        )
+        response.raise_for_status()
+        return response.json().get('rates', {})
+
+    def close(self):
+        self.session.close()
+
+
+def get_providers():
+    """Providers configured by settings.FX_RATE_PROVIDERS, in priority order"""
+    return [
+        import_string(config['BACKEND'])(**config.get('OPTIONS', {}))
+        for config in getattr(settings, 'FX_RATE_PROVIDERS', [])
+    ]
+
+
+class ProviderResult:
+
+    def __init__(self, name):
+        self.name = name
+        self.rates = {}
+        # Wall time of the fetch; None when it did not finish within the timeout
+        self.seconds = None
+        self.error = None
+
+
+class RefreshResult:
+
+    def __init__(self, providers):
+        self.providers = providers
+        # code -> (old rate, new rate) for currencies whose rate changed
+        self.updated = {}
+        self.unchanged = []
+        # Active codes no provider priced
+        self.missing = []
+
+
+def _clean_rate(value):
+    try:
+        rate = Decimal(str(value)).quantize(RATE_PLACES)
+    except (TypeError, ValueError, InvalidOperation):
+        return None
+    if not rate.is_finite() or rate <= 0 or rate > MAX_RATE:
+        return None
+    return rate
+
+
+def _timed_fetch(provider, codes):
+    result = ProviderResult(provider.name)
+    started = time.perf_counter()
+    try:
+        fetched = provider.fetch_rates(codes)
+    except Exception as e:
+        logger.warning(f"FX rate provider {provider.name} failed: {e}")
+        result.error = str(e) or e.__class__.__name__
+        fetched = {}
+    result.seconds = time.perf_counter() - started
+    for code in codes:
+        rate = _clean_rate(fetched.get(code))
+        if rate is not None:
+            result.rates[code] = rate
+    return result
+
+
+def _batches(provider, codes):
+    size = provider.batch_size or len(codes) or 1
+    return [codes[i:i + size] for i in range(0, len(codes), size)] or [codes]
+
+
+def fetch_rates(providers, codes, timeout=None):
+    """
+    Ask every provider for codes, all batches at once; [ProviderResult] in
+    provider order. Batches still running after `timeout` seconds are
+    reported as timed out and their rates are ignored; a provider's seconds
+    is its slowest finished batch.
+    """
+    timeout = timeout or getattr(settings, 'FX_RATE_TIMEOUT_SECONDS', DEFAULT_TIMEOUT)
+    if not providers:
+        return []
+    tasks = [(provider, batch) for provider in providers for batch in _batches(provider, codes)]
+    executor = ThreadPoolExecutor(max_workers=min(len(tasks), MAX_WORKERS), thread_name_prefix='fx-rates')
+    try:
+        futures = [executor.submit(_timed_fetch, provider, batch) for provider, batch in tasks]
+        wait(futures, timeout=timeout)
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    results = {id(provider): ProviderResult(provider.name) for provider in providers}
+    for (provider, _), future in zip(tasks, futures):
+        result = results[id(provider)]
+        if not future.done():
+            result.error = result.error or f"timed out after {timeout:g}s"
+            continue
+        batch = future.result()
+        result.rates.update(batch.rates)
+        result.seconds = max(result.seconds or 0.0, batch.seconds)
+        result.error = result.error or batch.error
+    return [results[id(provider)] for provider in providers]
+
+
+def refresh_rates(providers, timeout=None, dry_run=False):
+    """Fetch rates for every active currency and apply the changed ones"""
+    from core.models import Currency
+
+    currencies = list(Currency.objects.filter(is_active=True).exclude(code=BASE_CURRENCY).order_by('code'))
+    codes = [currency.code for currency in currencies]
+    result = RefreshResult(fetch_rates(providers, codes, timeout))
+
+    merged = {}
+    for provider_result in result.providers:
+        for code, rate in provider_result.rates.items():
+            merged.setdefault(code, rate)
+
+    changed = []
+    for currency in currencies:
+        rate = merged.get(currency.code)
+        if rate is None:
+            result.missing.append(currency.code)
+        elif rate == currency.exchange_rate:
+            result.unchanged.append(currency.code)
+        else:
+            result.updated[currency.code] = (currency.exchange_rate, rate)
+            currency.exchange_rate = rate
+            changed.append(currency)
+
+    if changed and not dry_run:
+        with transaction.atomic():
+            Currency.objects.bulk_update(changed, ['exchange_rate'])
+            record_rates(changed, effective_at=timezone.now())
+            # bulk_update sends no signals; reload every worker's table
+            transaction.on_commit(bump_version)
+    return result
+
+
+# Local stand-in for a rate API, for tests and development
+STUB_RATES = {
+    'KES': 160.0, 'EUR': 0.92, 'GBP': 0.79, 'UGX': 3700.0, 'TZS': 2500.0,
+    'RWF': 1300.0, 'INR': 83.0, 'CNY': 7.2, 'AED': 3.67,
+}
+
+
+class StubFxRateHandler(BaseHTTPRequestHandler):
+    """Serves STUB_RATES with up to 1% jitter; waits server.delay seconds first"""
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        time.sleep(getattr(self.server, 'delay', 0.0))
+        query = parse_qs(urlparse(self.path).query)
+        codes = [c for c in query.get('symbols', [''])[0].split(',') if c]
+        rates = {
+            code: round(STUB_RATES[code] * random.uniform(0.99, 1.01), 4)
+            for code in codes if code in STUB_RATES
+        }
+        body = json.dumps({'base': BASE_CURRENCY, 'rates': rates}).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_stub_server(host='127.0.0.1', port=0, delay=0.0):
+    """Serve StubFxRateHandler in a background thread; returns the server"""
+    server = ThreadingHTTPServer((host, port), StubFxRateHandler)
+    server.daemon_threads = True
+    server.delay = delay
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
@@ -0,0 +1,154 @@
+# core/services/idempotency.py
+"""
+Idempotency keys for money-moving POSTs.
+
+A client sends a key (Idempotency-Key header, or an `idempotency_key` form
+field rendered by {% idempotency_key_field %}) with the POST. The first
+request claims the key by inserting a row (unique per user) before the view
+runs, and the response is stored on it. A retry with the same key gets the
+stored response back without running the view again; a retry that arrives
+while the first request is still running gets 409 and can try again.
+
+Responses are kept for IDEMPOTENCY_KEY_TTL_SECONDS. Server errors and
+exceptions release the key, so the client can retry them. A claim is a
+lease: if its request died without releasing it (worker killed, timeout),
+the key can be claimed again once IDEMPOTENCY_CLAIM_TIMEOUT_SECONDS have
+passed since claimed_at.
+"""
+from datetime import timedelta
+from functools import wraps
+import hashlib
+import json
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.http import HttpResponse, HttpResponseBadRequest
+from django.utils import timezone
+
+HEADER = 'HTTP_IDEMPOTENCY_KEY'
+FORM_FIELD = 'idempotency_key'
+MAX_KEY_LENGTH = 64
+DEFAULT_TTL_SECONDS = 24 * 60 * 60
+DEFAULT_CLAIM_TIMEOUT_SECONDS = 5 * 60
+REPLAYED_HEADER = 'Idempotent-Replayed'
+
+# Not part of what the request asks for
+IGNORED_FIELDS = {'csrfmiddlewaretoken', FORM_FIELD}
+
+
+def _ttl():
+    return timedelta(seconds=getattr(settings, 'IDEMPOTENCY_KEY_TTL_SECONDS', DEFAULT_TTL_SECONDS))
+
+
+def _claim_timeout():
+    return timedelta(seconds=getattr(settings, 'IDEMPOTENCY_CLAIM_TIMEOUT_SECONDS', DEFAULT_CLAIM_TIMEOUT_SECONDS))
+
+
+def request_key(request):
+    return (request.META.get(HEADER) or request.POST.get(FORM_FIELD) or '').strip()
+
+
+def fingerprint(request):
+    params = sorted(
+        (name, request.POST.getlist(name)) for name in request.POST if name not in IGNORED_FIELDS
+    )
+    return hashlib.sha256(json.dumps([request.path, params]).encode()).hexdigest()
+
+
+def _claim(user, key, endpoint, request_fingerprint):
+    """(record, created): a new in-progress record, or the one already holding the key"""
+    from core.models import IdempotencyKey
+
+    now = timezone.now()
+    # Expired responses and abandoned claims free the key
+    IdempotencyKey.objects.filter(user=user, key=key).filter(
+        Q(expires_at__lte=now) | Q(status_code__isnull=True, claimed_at__lte=now - _claim_timeout())
+    ).delete()
+    try:
+        with transaction.atomic():
+            record = IdempotencyKey.objects.create(
+                user=user,
+                key=key,
+                endpoint=endpoint,
+                fingerprint=request_fingerprint,
+                claimed_at=now,
+                expires_at=now + _ttl(),
+            )
+        return record, True
+    except IntegrityError:
+        return IdempotencyKey.objects.filter(user=user, key=key).first(), False
+
+
+def _store(record, response):
+    from core.models import IdempotencyKey
+
+    # No row left means the claim outlived its lease and was taken over
+    IdempotencyKey.objects.filter(pk=record.pk, status_code__isnull=True).update(
+        status_code=response.status_code,
+        location=response.get('Location', ''),
+        content_type=response.get('Content-Type', ''),
+        content=response.content,
+    )
+
+
+def _replay(record):
+    response = HttpResponse(bytes(record.content), status=record.status_code, content_type=record.content_type or None)
+    if record.location:
+        response['Location'] = record.location
+    response[REPLAYED_HEADER] = 'true'
+    return response
+
+
+def _in_progress():
+    response = HttpResponse("A request with this idempotency key is still being processed", status=409)
+    response['Retry-After'] = '1'
+    return response
+
+
+def idempotent(view):
+    """
+    Run a POST view at most once per (user, idempotency key). Requests
+    without a key, and non-POST requests, go straight to the view.
+    """
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if request.method != 'POST' or not request.user.is_authenticated:
+            return view(request, *args, **kwargs)
+        key = request_key(request)
+        if not key:
+            return view(request, *args, **kwargs)
+        if len(key) > MAX_KEY_LENGTH:
+            return HttpResponseBadRequest(f"Idempotency key longer than {MAX_KEY_LENGTH} characters")
+
+        endpoint = request.resolver_match.view_name if request.resolver_match else request.path
+        request_fingerprint = fingerprint(request)
+        record, created = _claim(request.user, key, endpoint, request_fingerprint)
+
+        if not created:
+            if record is None or record.status_code is None:
+                return _in_progress()
+            if record.endpoint != endpoint or record.fingerprint != request_fingerprint:
+                return HttpResponse("Idempotency key was already used for a different request", status=422)
+            return _replay(record)
+
+        try:
+            response = view(request, *args, **kwargs)
+        except Exception:
+            record.delete()
+            raise
+        if response.status_code >= 500 or response.streaming:
+            record.delete()
+        else:
+            _store(record, response)
+        return response
+
+    return wrapper
+
+
+def prune_idempotency_keys(now=None):
+    """Delete expired keys; returns how many"""
+    from core.models import IdempotencyKey
+
+    deleted, _ = IdempotencyKey.objects.filter(expires_at__lte=now or timezone.now()).delete()
+    return deleted
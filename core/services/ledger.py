@@ -0,0 +1,159 @@
+# core/services/ledger.py
+"""
+Append-only double-entry ledger behind wallet balances.
+
+Every balance change appends a journal of LedgerEntry postings that sums to
+zero: the wallet accounts that moved (available, locked, bonus) plus, for
+money entering or leaving the platform, a counter-posting on the wallet's
+external account. Wallet balance columns are a cached projection of the
+postings, updated in the same transaction.
+
+Postings must be written after the wallet row's UPDATE in the same
+transaction (core.services.balances and settlement do this), so holding
+the wallet row lock guarantees every posting for it has committed.
+checkpoint_wallets relies on that: it locks a batch of wallets, replays
+the postings after each wallet's last BalanceCheckpoint, compares the
+result with the projection and writes new checkpoints. Recomputing a
+balance therefore only reads postings since the last checkpoint, however
+long the ledger grows.
+"""
+from decimal import Decimal
+import uuid
+
+from django.db import transaction
+from django.db.models import Max, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+DEFAULT_BATCH_SIZE = 500
+ZERO = Decimal('0.00')
+CENT = Decimal('0.01')
+
+BALANCE_FIELDS = ('available_balance', 'locked_balance', 'bonus_balance')
+
+
+def _accounts():
+    from wallet.models import LedgerEntry
+
+    return {
+        'available_balance': LedgerEntry.AVAILABLE,
+        'locked_balance': LedgerEntry.LOCKED,
+        'bonus_balance': LedgerEntry.BONUS,
+    }
+
+
+def postings(wallet_id, deltas, reference='', journal=None):
+    """Unsaved entries of one balanced journal for {balance field: signed amount}"""
+    from wallet.models import LedgerEntry
+
+    accounts = _accounts()
+    journal = journal or uuid.uuid4()
+    entries = [
+        LedgerEntry(wallet_id=wallet_id, account=accounts[name], amount=amount, journal=journal, reference=reference)
+        for name, amount in deltas.items() if amount
+    ]
+    external = -sum(entry.amount for entry in entries)
+    if external:
+        entries.append(LedgerEntry(
+            wallet_id=wallet_id, account=LedgerEntry.EXTERNAL, amount=external, journal=journal, reference=reference,
+        ))
+    return entries
+
+
+def record(wallet_id, deltas, reference=''):
+    """Append the journal for one wallet change"""
+    from wallet.models import LedgerEntry
+
+    LedgerEntry.objects.bulk_create(postings(wallet_id, deltas, reference))
+
+
+def _latest_checkpoint_id():
+    from wallet.models import BalanceCheckpoint
+
+    return (
+        BalanceCheckpoint.objects.filter(wallet=OuterRef('wallet'))
+        .order_by('-last_entry_id').values('last_entry_id')[:1]
+    )
+
+
+def ledger_balances(wallet_ids):
+    """
+    {wallet_id: ({balance field: amount}, checkpoint entry id, last entry id)}
+    from each wallet's latest checkpoint plus the postings after it
+    """
+    from wallet.models import BalanceCheckpoint, LedgerEntry
+
+    result = {
+        wallet_id: ({name: ZERO for name in BALANCE_FIELDS}, 0, 0)
+        for wallet_id in wallet_ids
+    }
+    checkpoints = BalanceCheckpoint.objects.filter(
+        wallet_id__in=wallet_ids, last_entry_id=Subquery(_latest_checkpoint_id()),
+    ).values_list('wallet_id', 'last_entry_id', *BALANCE_FIELDS)
+    for wallet_id, last_entry_id, *values in checkpoints:
+        result[wallet_id] = (dict(zip(BALANCE_FIELDS, values)), last_entry_id, last_entry_id)
+
+    fields = {account: name for name, account in _accounts().items()}
+    replayed = (
+        LedgerEntry.objects.filter(
+            wallet_id__in=wallet_ids,
+            id__gt=Coalesce(Subquery(_latest_checkpoint_id()), Value(0)),
+        )
+        .order_by().values('wallet_id', 'account')
+        .annotate(total=Sum('amount'), last=Max('id'))
+    )
+    for row in replayed:
+        balances, checkpoint_id, last_entry_id = result[row['wallet_id']]
+        if row['account'] in fields:
+            # SQLite sums decimals as floats
+            balances[fields[row['account']]] += Decimal(row['total']).quantize(CENT)
+        result[row['wallet_id']] = (balances, checkpoint_id, max(last_entry_id, row['last']))
+    return result
+
+
+class CheckpointResult:
+
+    def __init__(self):
+        self.wallets = 0
+        self.checkpointed = 0
+        # (wallet_id, projected balances, ledger balances)
+        self.mismatches = []
+
+
+def checkpoint_wallets(wallet_ids=None, batch_size=None, repair=False):
+    """
+    Verify wallet balances against the ledger and checkpoint every wallet
+    with postings since its last checkpoint. With repair, mismatched
+    wallets are reset to their ledger balances.
+    """
+    from wallet.models import BalanceCheckpoint, Wallet
+
+    batch_size = batch_size or DEFAULT_BATCH_SIZE
+    wallets = Wallet.objects.order_by('pk')
+    if wallet_ids is not None:
+        wallets = wallets.filter(pk__in=wallet_ids)
+
+    result = CheckpointResult()
+    last_pk = 0
+    while True:
+        with transaction.atomic():
+            projected = {
+                wallet_id: dict(zip(BALANCE_FIELDS, values))
+                for wallet_id, *values in wallets.filter(pk__gt=last_pk)
+                .select_for_update().values_list('pk', *BALANCE_FIELDS)[:batch_size]
+            }
+            if not projected:
+                break
+            last_pk = max(projected)
+            result.wallets += len(projected)
+
+            checkpoints = []
+            for wallet_id, (balances, checkpoint_id, last_entry_id) in ledger_balances(list(projected)).items():
+                if projected[wallet_id] != balances:
+                    result.mismatches.append((wallet_id, projected[wallet_id], balances))
+                    if repair:
+                        Wallet.objects.filter(pk=wallet_id).update(**balances)
+                if last_entry_id > checkpoint_id:
+                    checkpoints.append(BalanceCheckpoint(wallet_id=wallet_id, last_entry_id=last_entry_id, **balances))
+            BalanceCheckpoint.objects.bulk_create(checkpoints)
+            result.checkpointed += len(checkpoints)
+    return result
@@ -0,0 +1,165 @@
+# core/services/mark_to_market.py
+"""
+Mark-to-market of open positions (investments.Investment) after every price tick.
+
+Active positions are held in flat NumPy arrays (user index, asset index,
+units, entry price), reloaded only when the investment table changes.
+Each tick re-prices them in one vectorized pass, sums per user with
+np.bincount and upserts the users whose totals moved into UnrealizedPnL
+with a single bulk write.
+"""
+from decimal import Decimal
+import logging
+import time
+
+import numpy as np
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+# Reload positions at least this often, to catch deletes and raw updates
+FULL_RELOAD_SECONDS = 300
+CENT = Decimal('0.01')
+
+
+class PositionBook:
+    """Open positions as parallel arrays"""
+
+    def __init__(self):
+        self.version = None
+        self.loaded_at = 0.0
+        self.user_ids = np.empty(0, dtype=np.int64)
+        self.asset_ids = []
+        self.asset_index = {}
+        self.position_user = np.empty(0, dtype=np.int64)
+        self.position_asset = np.empty(0, dtype=np.int64)
+        self.units = np.empty(0)
+        self.entry_price = np.empty(0)
+        self.prices = np.empty(0)
+
+    def __len__(self):
+        return len(self.units)
+
+    @staticmethod
+    def current_version():
+        from investments.models import Investment
+
+        return Investment.objects.aggregate(version=Max('updated_at'))['version']
+
+    def refresh(self, clock=time.monotonic):
+        """Reload if any investment changed since the last load; returns True if reloaded"""
+        version = self.current_version()
+        if version == self.version and clock() - self.loaded_at < FULL_RELOAD_SECONDS:
+            return False
+        self.load()
+        self.version = version
+        self.loaded_at = clock()
+        return True
+
+    def load(self):
+        from assets.models import Asset
+        from investments.models import Investment
+
+        rows = list(
+            # Positions opened before entry prices were recorded cannot be marked
+            Investment.objects.filter(status='active', units__isnull=False, entry_price__isnull=False)
+            .values_list('user_id', 'asset_id', 'units', 'entry_price')
+            .iterator(chunk_size=10000)
+        )
+
+        count = len(rows)
+        users = np.fromiter((row[0] for row in rows), dtype=np.int64, count=count)
+        self.user_ids, self.position_user = np.unique(users, return_inverse=True)
+
+        self.asset_index = {}
+        self.position_asset = np.fromiter(
+            (self.asset_index.setdefault(row[1], len(self.asset_index)) for row in rows),
+            dtype=np.int64, count=count,
+        )
+        self.asset_ids = list(self.asset_index)
+
+        self.units = np.fromiter((row[2] for row in rows), dtype=np.float64, count=count)
+        self.entry_price = np.fromiter((row[3] for row in rows), dtype=np.float64, count=count)
+
+        self.prices = np.zeros(len(self.asset_ids))
+        self.set_prices(Asset.objects.filter(id__in=self.asset_ids).only('id', 'current_price'))
+
+    def set_prices(self, assets):
+        for asset in assets:
+            i = self.asset_index.get(asset.id)
+            if i is not None:
+                self.prices[i] = float(asset.current_price)
+
+    def totals(self):
+        """(user_ids, unrealized_pnl, market_value, open_positions) per user"""
+        price = self.prices[self.position_asset]
+        n = len(self.user_ids)
+        pnl = np.bincount(self.position_user, weights=self.units * (price - self.entry_price), minlength=n)
+        value = np.bincount(self.position_user, weights=self.units * price, minlength=n)
+        positions = np.bincount(self.position_user, minlength=n)
+        return self.user_ids, pnl, value, positions
+
+
+class MarkToMarket:
+    """PriceFetcher tick listener that keeps UnrealizedPnL current"""
+
+    def __init__(self):
+        self.book = PositionBook()
+        # user_id -> (pnl cents, value cents, positions) last written
+        self.written = None
+
+    def __call__(self, assets, timestamp=None):
+        if not self.book.refresh():
+            self.book.set_prices(assets)
+        return self.persist(timestamp or timezone.now())
+
+    def persist(self, timestamp):
+        """Upsert the users whose rounded totals changed; returns how many"""
+        from core.models import UnrealizedPnL
+
+        if self.written is None:
+            # Rows left by a previous run must be zeroed if their positions closed
+            self.written = {
+                user_id: (int(p / CENT), int(v / CENT), c)
+                for user_id, p, v, c in UnrealizedPnL.objects.exclude(open_positions=0).values_list(
+                    'user_id', 'unrealized_pnl', 'market_value', 'open_positions'
+                )
+            }
+
+        user_ids, pnl, value, positions = self.book.totals()
+        current = {
+            user_id: (p, v, c)
+            for user_id, p, v, c in zip(
+                user_ids.tolist(),
+                np.round(pnl * 100).astype(np.int64).tolist(),
+                np.round(value * 100).astype(np.int64).tolist(),
+                positions.tolist(),
+            )
+        }
+        # Users whose last position closed go back to zero
+        for user_id in self.written.keys() - current.keys():
+            current[user_id] = (0, 0, 0)
+
+        changed = [
+            UnrealizedPnL(
+                user_id=user_id,
+                unrealized_pnl=Decimal(p) * CENT,
+                market_value=Decimal(v) * CENT,
+                open_positions=c,
+                updated_at=timestamp,
+            )
+            for user_id, (p, v, c) in current.items()
+            if self.written.get(user_id) != (p, v, c)
+        ]
+        if changed:
+            with transaction.atomic():
+                UnrealizedPnL.objects.bulk_create(
+                    changed,
+                    update_conflicts=True,
+                    unique_fields=['user'],
+                    update_fields=['unrealized_pnl', 'market_value', 'open_positions', 'updated_at'],
+                )
+        self.written = {user_id: totals for user_id, totals in current.items() if totals != (0, 0, 0)}
+        return len(changed)
@@ -0,0 +1,252 @@
+# core/services/market_data.py
+"""
+Market data providers used by PriceFetcher.
+
+Every provider implements fetch_prices(symbols, categories, current_prices)
+and returns a float64 array aligned with `symbols`. Symbols it could not
+price are NaN; PriceFetcher fills those from the simulator.
+"""
+from concurrent.futures import ThreadPoolExecutor
+import csv
+import json
+import logging
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+import requests
+from django.conf import settings
+from django.utils.module_loading import import_string
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PROVIDER = {
+    'BACKEND': 'core.services.market_data.SimulatedProvider',
+    'OPTIONS': {},
+}
+
+
+class MarketDataProvider:
+    """Base class for price sources"""
+    name = 'base'
+
+    def fetch_prices(self, symbols, categories, current_prices):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class SimulatedProvider(MarketDataProvider):
+    """Random-walk prices from PriceFetcher's vectorized engine"""
+    name = 'simulated'
+
+    def fetch_prices(self, symbols, categories, current_prices):
+        from core.services.price_fetcher import PriceFetcher
+        return PriceFetcher.generate_prices(symbols, categories, current_prices)
+
+
+class CircuitBreaker:
+    """
+    Stops calling a failing upstream for `reset_timeout` seconds after
+    `failure_threshold` consecutive failures. Then exactly one trial call is
+    let through (half-open); everyone else is still refused until it reports
+    success (closes the breaker) or failure (opens it again).
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0, clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+        self._lock = threading.Lock()
+
+    def allow_request(self):
+        """Whether the caller may call upstream; a half-open trial must report back"""
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            if self.probing or self.clock() - self.opened_at < self.reset_timeout:
+                return False
+            self.probing = True
+            return True
+
+    @property
+    def is_open(self):
+        with self._lock:
+            return self.opened_at is not None
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self.probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.probing or self.failures >= self.failure_threshold:
+                self.opened_at = self.clock()
+            self.probing = False
+
+
+class HttpJsonProvider(MarketDataProvider):
+    """
+    Fetch prices from a JSON HTTP endpoint.
+
+    Symbols are split into batches and requested concurrently over one
+    pooled requests.Session:
+        GET <url>?symbols=BTC,ETH  ->  {"prices": {"BTC": 65000.0, "ETH": 3500.0}}
+    """
+    name = 'http'
+
+    def __init__(self, url, batch_size=200, max_workers=8, timeout=2.0,
+                 symbols_param='symbols', failure_threshold=5, reset_timeout=30.0,
+                 headers=None):
+        self.url = url
+        self.batch_size = batch_size
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.symbols_param = symbols_param
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_workers)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        if headers:
+            self.session.headers.update(headers)
+
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='market-data')
+
+    def _fetch_batch(self, batch):
+        if not self.breaker.allow_request():
+            return {}
+        try:
+            response = self.session.get(
+                self.url,
+                params={self.symbols_param: ','.join(batch)},
+                timeout=self.timeout,
+            )
+            response.raise_for_status()
+            prices = response.json()['prices']
+            if not isinstance(prices, dict):
+                raise ValueError(f"unexpected prices payload {type(prices).__name__}")
+        except (requests.RequestException, ValueError, KeyError, TypeError) as e:
+            # Always report back: a half-open trial that never did would keep the breaker shut
+            self.breaker.record_failure()
+            logger.warning(f"Market data batch of {len(batch)} failed: {e}")
+            return {}
+        self.breaker.record_success()
+        return prices
+
+    def fetch_prices(self, symbols, categories, current_prices):
+        symbols = list(symbols)
+        batches = [symbols[i:i + self.batch_size] for i in range(0, len(symbols), self.batch_size)]
+
+        fetched = {}
+        for prices in self._executor.map(self._fetch_batch, batches):
+            fetched.update(prices)
+
+        result = np.full(len(symbols), np.nan)
+        for i, symbol in enumerate(symbols):
+            price = fetched.get(symbol)
+            if price is not None:
+                try:
+                    price = float(price)
+                except (TypeError, ValueError):
+                    continue
+                if price > 0:
+                    result[i] = price
+        return result
+
+    def close(self):
+        self._executor.shutdown(wait=False)
+        self.session.close()
+
+
+class FileReplayProvider(MarketDataProvider):
+    """
+    Replay recorded prices from a CSV file with columns tick,symbol,price.
+    Each fetch returns the next tick; replay wraps around at the end.
+    """
+    name = 'file'
+
+    def __init__(self, path, loop=True):
+        self.path = path
+        self.loop = loop
+        self.ticks = []
+        current, prices = None, None
+        with open(path, newline='') as f:
+            for row in csv.DictReader(f):
+                if row['tick'] != current:
+                    current, prices = row['tick'], {}
+                    self.ticks.append(prices)
+                prices[row['symbol']] = float(row['price'])
+        self.position = 0
+
+    def fetch_prices(self, symbols, categories, current_prices):
+        result = np.full(len(symbols), np.nan)
+        if self.position >= len(self.ticks):
+            if not self.loop or not self.ticks:
+                return result
+            self.position = 0
+
+        prices = self.ticks[self.position]
+        self.position += 1
+        for i, symbol in enumerate(symbols):
+            price = prices.get(symbol)
+            if price is not None:
+                result[i] = price
+        return result
+
+
+_provider = None
+
+
+def get_provider():
+    """Provider configured by settings.MARKET_DATA_PROVIDER (cached per process)"""
+    global _provider
+    if _provider is None:
+        config = getattr(settings, 'MARKET_DATA_PROVIDER', DEFAULT_PROVIDER)
+        _provider = import_string(config['BACKEND'])(**config.get('OPTIONS', {}))
+    return _provider
+
+
+def set_provider(provider):
+    """Swap the process-wide provider; returns the previous one (caller closes it)"""
+    global _provider
+    previous, _provider = _provider, provider
+    return previous
+
+
+class StubMarketDataHandler(BaseHTTPRequestHandler):
+    """Local stand-in for a market data API, for tests and throughput runs"""
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        query = parse_qs(urlparse(self.path).query)
+        symbols = [s for s in query.get('symbols', [''])[0].split(',') if s]
+        prices = dict(zip(symbols, np.round(np.random.uniform(1, 1000, len(symbols)), 6).tolist()))
+        body = json.dumps({'prices': prices}).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_stub_server(host='127.0.0.1', port=0):
+    """Serve StubMarketDataHandler in a background thread; returns the server"""
+    server = ThreadingHTTPServer((host, port), StubMarketDataHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
@@ -0,0 +1,88 @@
+# core/services/market_summary.py
+"""
+Market overview for the assets page: per-category asset counts, average
+change and top gainers/losers.
+
+The summary is kept up to date by the price update path (the snapshot
+writer feeds it every tick) so pages read a few hundred bytes instead of
+counting and sorting the whole universe per request.
+"""
+import heapq
+
+DEFAULT_TOP_N = 5
+ALL = 'all'
+
+
+class MarketSummary:
+    """Running per-category aggregates over the latest change of each asset"""
+
+    def __init__(self, top_n=DEFAULT_TOP_N):
+        self.top_n = top_n
+        self.changes = {}  # symbol -> (category, change_percentage)
+        self.counts = {}
+        self.sums = {}
+
+    def _add(self, category, change, sign):
+        for key in (ALL, category):
+            self.counts[key] = self.counts.get(key, 0) + sign
+            self.sums[key] = self.sums.get(key, 0.0) + sign * change
+
+    def update(self, assets):
+        """Fold the current change_percentage of each asset into the totals"""
+        for asset in assets:
+            change = float(asset.change_percentage or 0)
+            previous = self.changes.get(asset.symbol)
+            if previous is not None:
+                self._add(*previous, -1)
+            self.changes[asset.symbol] = (asset.category, change)
+            self._add(asset.category, change, 1)
+
+    def remove(self, symbol):
+        previous = self.changes.pop(symbol, None)
+        if previous is not None:
+            self._add(*previous, -1)
+
+    def movers(self, category=ALL):
+        """(gainers, losers) as symbol lists, strongest first"""
+        items = self.changes.items()
+        if category != ALL:
+            items = [(symbol, value) for symbol, value in items if value[0] == category]
+        gainers = heapq.nlargest(self.top_n, items, key=lambda item: item[1][1])
+        losers = heapq.nsmallest(self.top_n, items, key=lambda item: item[1][1])
+        return [symbol for symbol, _ in gainers], [symbol for symbol, _ in losers]
+
+    def as_dict(self):
+        """
+        {category: {'count', 'avg_change', 'gainers', 'losers'}} including
+        an 'all' entry; categories without assets are omitted.
+        """
+        summary = {}
+        for category, count in self.counts.items():
+            if count <= 0:
+                continue
+            gainers, losers = self.movers(category)
+            summary[category] = {
+                'count': count,
+                'avg_change': round(self.sums[category] / count, 2),
+                'gainers': gainers,
+                'losers': losers,
+            }
+        return summary
+
+
+def get_market_summary():
+    """
+    Summary published by the price ticker, or one built from the Asset
+    table when no ticker is running.
+    """
+    from core.services.price_snapshot import get_reader
+
+    summary = get_reader().summary()
+    if summary is not None:
+        return summary
+
+    from assets.models import Asset
+
+    fallback = MarketSummary()
+    fallback.update(Asset.objects.filter(is_active=True).only('symbol', 'category', 'change_percentage'))
+    return fallback.as_dict()
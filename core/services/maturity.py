@@ -0,0 +1,197 @@
+# core/services/maturity.py
+"""
+In-process scheduler that settles investments the moment they mature.
+
+Upcoming maturities of active investments are kept in a heap keyed on
+end_time. The scheduler sleeps until the earliest one is due (or a
+notification arrives), then hands every due id to settlement in one batch.
+
+New investments are announced by invest_asset with a single UDP datagram
+(notify_maturity), so they do not wait for the next reload. Datagrams are
+fire-and-forget: if the scheduler is down or one is lost, the periodic
+reload still picks the investment up.
+"""
+from collections import deque
+from datetime import datetime
+from datetime import timezone as dt_timezone
+import heapq
+import logging
+import selectors
+import socket
+import struct
+import time
+import uuid
+
+from django.conf import settings
+from django.db import close_old_connections
+
+from core.services.settlement import settle_chunk
+from core.services.stats import format_percentiles, percentiles
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_NOTIFY_ADDRESS = ('127.0.0.1', 8799)
+# Maturities loaded ahead of time, and how often the heap is topped up
+DEFAULT_HORIZON_SECONDS = 3600.0
+DEFAULT_RELOAD_SECONDS = 60.0
+DEFAULT_BATCH_SIZE = 1000
+
+# investment id (16 bytes), end_time as epoch seconds
+NOTIFICATION = struct.Struct('<16sd')
+
+
+def _notify_address():
+    return tuple(getattr(settings, 'SETTLEMENT_NOTIFY_ADDRESS', DEFAULT_NOTIFY_ADDRESS))
+
+
+_notify_socket = None
+
+
+def notify_maturity(investment_id, end_time):
+    """Tell a running scheduler about a new investment; never raises"""
+    global _notify_socket
+    try:
+        if _notify_socket is None:
+            _notify_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            _notify_socket.setblocking(False)
+        _notify_socket.sendto(NOTIFICATION.pack(investment_id.bytes, end_time.timestamp()), _notify_address())
+    except OSError as e:
+        logger.debug(f"Maturity notification for {investment_id} not sent: {e}")
+
+
+class SettlementStats:
+    """Settlement lag (settled_at - end_time) percentiles over a rolling window"""
+
+    def __init__(self, window=10000):
+        self.batches = 0
+        self.failures = 0
+        self.settled = 0
+        self.lags = deque(maxlen=window)
+
+    def record(self, lags):
+        self.batches += 1
+        self.settled += len(lags)
+        self.lags.extend(lags)
+
+    def summary(self):
+        return {
+            'batches': self.batches,
+            'failures': self.failures,
+            'settled': self.settled,
+            'lag': percentiles(self.lags),
+        }
+
+    def __str__(self):
+        s = self.summary()
+        return (
+            f"batches={s['batches']} failures={s['failures']} settled={s['settled']} "
+            f"{format_percentiles('lag', s['lag'])}"
+        )
+
+
+class MaturityScheduler:
+
+    def __init__(self, horizon=None, reload_interval=None, batch_size=None, address=None,
+                 clock=time.time):
+        self.horizon = horizon or getattr(settings, 'SETTLEMENT_HORIZON_SECONDS', DEFAULT_HORIZON_SECONDS)
+        self.reload_interval = reload_interval or getattr(settings, 'SETTLEMENT_RELOAD_SECONDS', DEFAULT_RELOAD_SECONDS)
+        self.batch_size = batch_size or DEFAULT_BATCH_SIZE
+        self.address = address or _notify_address()
+        self.clock = clock
+        self.heap = []
+        self.scheduled = set()
+        self.stats = SettlementStats()
+        self._stopped = False
+
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.socket.bind(self.address)
+        self.socket.setblocking(False)
+        self.selector = selectors.DefaultSelector()
+        self.selector.register(self.socket, selectors.EVENT_READ)
+
+    def schedule(self, investment_id, end_ts):
+        if investment_id not in self.scheduled:
+            self.scheduled.add(investment_id)
+            heapq.heappush(self.heap, (end_ts, investment_id))
+
+    def load(self):
+        """Add active investments maturing within the horizon (and overdue ones)"""
+        from investments.models import Investment
+
+        until = datetime.fromtimestamp(self.clock() + self.horizon, tz=dt_timezone.utc)
+        upcoming = Investment.objects.filter(status='active', end_time__lte=until).values_list('id', 'end_time')
+        for investment_id, end_time in upcoming.iterator(chunk_size=self.batch_size):
+            self.schedule(investment_id, end_time.timestamp())
+
+    def _drain_notifications(self):
+        while True:
+            try:
+                data = self.socket.recv(NOTIFICATION.size)
+            except BlockingIOError:
+                return
+            if len(data) != NOTIFICATION.size:
+                continue
+            raw_id, end_ts = NOTIFICATION.unpack(data)
+            # Beyond the horizon: a later reload will load it
+            if end_ts <= self.clock() + self.horizon:
+                self.schedule(uuid.UUID(bytes=raw_id), end_ts)
+
+    def _pop_due(self, now):
+        due = {}
+        while self.heap and self.heap[0][0] <= now and len(due) < self.batch_size:
+            end_ts, investment_id = heapq.heappop(self.heap)
+            self.scheduled.discard(investment_id)
+            due[investment_id] = end_ts
+        return due
+
+    def settle(self, due):
+        now = datetime.fromtimestamp(self.clock(), tz=dt_timezone.utc)
+        settled = settle_chunk(now, len(due), ids=due)
+        settled_at = self.clock()
+        # Ids that were cancelled or settled elsewhere are simply dropped
+        self.stats.record([settled_at - due[investment_id] for investment_id in settled])
+        return settled
+
+    def stop(self):
+        self._stopped = True
+        # Wake the select() in run(); empty datagrams are ignored
+        try:
+            with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as waker:
+                waker.sendto(b'', self.socket.getsockname())
+        except OSError:
+            pass
+
+    def run(self, max_batches=None, on_batch=None):
+        next_reload = self.clock()
+        while not self._stopped and (max_batches is None or self.stats.batches + self.stats.failures < max_batches):
+            now = self.clock()
+            if now >= next_reload:
+                close_old_connections()
+                try:
+                    self.load()
+                except Exception:
+                    logger.exception("Loading maturities failed")
+                next_reload = now + self.reload_interval
+
+            due = self._pop_due(now)
+            if due:
+                try:
+                    self.settle(due)
+                except Exception:
+                    # The popped ids come back with the next reload
+                    logger.exception("Settlement batch failed")
+                    self.stats.failures += 1
+                if on_batch:
+                    on_batch(self.stats)
+                continue
+
+            wake = min(self.heap[0][0], next_reload) if self.heap else next_reload
+            # Sleep until the next maturity, a reload or a notification
+            if self.selector.select(timeout=max(0.0, wake - self.clock())):
+                self._drain_notifications()
+
+        return self.stats
+
+    def close(self):
+        self.selector.close()
+        self.socket.close()
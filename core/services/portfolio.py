@@ -0,0 +1,186 @@
+# core/services/portfolio.py
+"""
+PortfolioSummary maintenance.
+
+Summaries are kept over investments.Investment, the table trades are
+written to (invest_asset, settlement, withdrawals). Every write is folded
+into its owner's summary as a delta (new contribution minus old) with F()
+updates in the same transaction, so dashboard reads are one row regardless
+of history size. Saves reach record_change through core.signals; the
+queryset updates that settle and withdraw investments call record_changes
+themselves. Summaries are built from the investment table on first use, and
+rebuild_portfolio_summaries repairs drift left by other writes that bypass
+signals (bulk_create, raw SQL).
+"""
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, DecimalField, F, Q, Sum, Value
+from django.db.models.functions import Coalesce
+
+ZERO = Decimal('0')
+CENT = Decimal('0.01')
+
+SUMMARY_FIELDS = [
+    'active_count', 'active_invested', 'closed_invested',
+    'total_profit', 'total_loss', 'total_invested', 'total_profit_loss',
+]
+
+
+def contribution(status, invested_amount, profit_loss):
+    """What one investment adds to its owner's summary"""
+    invested_amount = invested_amount or ZERO
+    profit_loss = profit_loss or ZERO
+    values = {
+        'total_invested': invested_amount,
+        'total_profit_loss': profit_loss,
+    }
+    if status == 'active':
+        values['active_count'] = 1
+        values['active_invested'] = invested_amount
+    else:
+        values['closed_invested'] = invested_amount
+        if profit_loss > 0:
+            values['total_profit'] = profit_loss
+        elif profit_loss < 0:
+            values['total_loss'] = profit_loss
+    return values
+
+
+def _lock_summary(user_id):
+    """
+    Lock the user's summary row, creating it from the investment table if
+    it does not exist yet; returns True if it was created. Concurrent first
+    writes queue on the new row instead of each rebuilding it.
+    """
+    from core.models import PortfolioSummary
+
+    _, created = PortfolioSummary.objects.select_for_update().get_or_create(user_id=user_id)
+    if created:
+        rebuild_portfolio_summaries([user_id])
+    return created
+
+
+def apply_delta(user_id, delta):
+    """Add delta to the user's summary; builds the summary if it does not exist yet"""
+    from core.models import PortfolioSummary
+
+    delta = {field: value for field, value in delta.items() if value}
+    if not delta:
+        return
+    with transaction.atomic():
+        if _lock_summary(user_id):
+            # First write for this user: the table already includes the change
+            return
+        PortfolioSummary.objects.filter(user_id=user_id).update(
+            **{field: F(field) + value for field, value in delta.items()}
+        )
+
+
+def record_changes(changes):
+    """
+    Fold investment writes into the summaries, one UPDATE per user. Each
+    change is (previous, current), both (user_id, status, invested_amount,
+    profit_loss) or None for create/delete.
+    """
+    deltas = {}
+    for previous, current in changes:
+        for state, sign in ((previous, -1), (current, 1)):
+            if state is None:
+                continue
+            user_id, *fields = state
+            delta = deltas.setdefault(user_id, {})
+            for field, value in contribution(*fields).items():
+                delta[field] = delta.get(field, 0) + sign * value
+    # In user order, so concurrent batches lock summary rows in the same order
+    for user_id in sorted(deltas):
+        apply_delta(user_id, deltas[user_id])
+
+
+def record_change(previous, current):
+    """Fold one investment write into the summaries (see record_changes)"""
+    record_changes([(previous, current)])
+
+
+def _aggregates():
+    active = Q(status='active')
+    closed = ~active
+
+    def total(field, condition=None):
+        return Coalesce(
+            Sum(field, filter=condition), Value(ZERO),
+            output_field=DecimalField(max_digits=20, decimal_places=2),
+        )
+
+    return {
+        'active_count': Count('id', filter=active),
+        'active_invested': total('invested_amount', active),
+        'closed_invested': total('invested_amount', closed),
+        'total_profit': total('actual_profit_loss', closed & Q(actual_profit_loss__gt=0)),
+        'total_loss': total('actual_profit_loss', closed & Q(actual_profit_loss__lt=0)),
+        'total_invested': total('invested_amount'),
+        'total_profit_loss': total('actual_profit_loss'),
+    }
+
+
+def _normalize(row):
+    return {
+        field: value if field == 'active_count' else Decimal(value).quantize(CENT)
+        for field, value in row.items()
+    }
+
+
+def rebuild_portfolio_summaries(user_ids=None):
+    """
+    Recompute summaries from the investment table with one grouped query
+    and write the ones that differ. Returns the number of rows written.
+    """
+    from core.models import PortfolioSummary
+    from investments.models import Investment
+
+    investments = Investment.objects.all()
+    summaries = PortfolioSummary.objects.all()
+    if user_ids is not None:
+        investments = investments.filter(user_id__in=user_ids)
+        summaries = summaries.filter(user_id__in=user_ids)
+
+    expected = {
+        row.pop('user_id'): _normalize(row)
+        for row in investments.order_by().values('user_id').annotate(**_aggregates())
+    }
+    existing = {
+        row.pop('user_id'): _normalize(row)
+        for row in summaries.values('user_id', *SUMMARY_FIELDS)
+    }
+
+    # Requested users without investments, or whose investments are all
+    # gone, get a zeroed row
+    empty = _normalize({field: 0 for field in SUMMARY_FIELDS})
+    for user_id in (existing.keys() | set(user_ids or ())) - expected.keys():
+        expected[user_id] = empty
+
+    changed = [
+        PortfolioSummary(user_id=user_id, **values)
+        for user_id, values in expected.items()
+        if existing.get(user_id) != values
+    ]
+    if changed:
+        PortfolioSummary.objects.bulk_create(
+            changed,
+            update_conflicts=True,
+            unique_fields=['user'],
+            update_fields=SUMMARY_FIELDS + ['updated_at'],
+        )
+    return len(changed)
+
+
+def get_portfolio_summary(user):
+    """The user's PortfolioSummary, built on first access"""
+    from core.models import PortfolioSummary
+
+    try:
+        return PortfolioSummary.objects.get(user=user)
+    except PortfolioSummary.DoesNotExist:
+        with transaction.atomic():
+            _lock_summary(user.pk)
+        return PortfolioSummary.objects.get(user=user)
@@ -5,8 +5,19 @@ import random
 from datetime import datetime,timedelta
 import logging
 
+import numpy as np
+from django.db import transaction
+from django.utils import timezone
+
+from core.services.candles import update_candles
+from core.services.market_data import get_provider
+from core.services.price_history import record_ticks
+
 logger = logging.getLogger(__name__)
 
+# Largest value Asset.change_percentage can store
+MAX_CHANGE_PERCENTAGE = 99999999.99
+
 class PriceFetcher:
     """Fetch and simulate realistic market prices"""
     
@@ -39,6 +50,31 @@ class PriceFetcher:
         'stock': 0.015,  # 1.5% daily volatility
     }
     
+    # Fallback base price ranges for symbols missing from BASE_PRICES
+    FALLBACK_PRICE_RANGES = {
+        'crypto': (0.01, 50000),
+        'forex': (0.5, 200),
+        'futures': (10, 10000),
+        'stock': (10, 1000),
+    }
+    
+    # Rows per UPDATE statement when writing a batch tick back
+    BULK_UPDATE_BATCH_SIZE = 500
+    
+    # Shared generator for the vectorized engine (reseed with PriceFetcher.seed)
+    rng = np.random.default_rng()
+    
+    # Optional core.services.price_tape.TapeRecorder capturing every tick
+    recorder = None
+    
+    # Callables run as listener(assets, timestamp) after each committed tick
+    tick_listeners = []
+    
+    @classmethod
+    def seed(cls, seed=None):
+        """Reseed the vectorized engine for reproducible runs"""
+        cls.rng = np.random.default_rng(seed)
+    
     @classmethod
     def get_realistic_price(cls, symbol, category, current_price=None):
         """Generate realistic price movement"""
@@ -81,17 +117,37 @@ class PriceFetcher:
         
         return Decimal(str(round(new_price, 6)))
     
+    @classmethod
+    def notify(cls, assets, timestamp):
+        """Hand freshly written assets to the tick listeners"""
+        for listener in cls.tick_listeners:
+            try:
+                listener(assets, timestamp)
+            except Exception as e:
+                logger.error(f"Tick listener {listener!r} failed: {str(e)}")
+    
+    @classmethod
+    def record_history(cls, assets, timestamp):
+        """Append raw ticks and roll them into OHLC candles"""
+        record_ticks(assets, timestamp)
+        update_candles(assets, timestamp)
+    
     @classmethod
     def update_asset_price(cls, asset):
         """Update price for a single asset"""
         try:
-            new_price = cls.get_realistic_price(
-                asset.symbol, 
-                asset.category,
-                asset.current_price
+            quoted = cls.quote(
+                [asset.symbol],
+                [asset.category],
+                [float(asset.current_price or 0)],
             )
+            new_price = Decimal(f"{quoted[0]:.6f}")
+            if cls.recorder:
+                cls.recorder.record(timezone.now(), [asset.symbol], quoted)
             
             asset.update_price(new_price)
+            cls.record_history([asset], asset.last_updated)
+            cls.notify([asset], asset.last_updated)
             logger.info(f"Updated {asset.symbol} to ${new_price}")
             return True
             
@@ -100,16 +156,137 @@ class PriceFetcher:
             return False
     
     @classmethod
-    def update_all_prices(cls):
-        """Update prices for all active assets"""
+    def generate_prices(cls, symbols, categories, current_prices, now=None):
+        """
+        Vectorized version of get_realistic_price.
+        Takes parallel sequences for a batch of assets and returns a float64
+        array of new prices (rounded to 6 dp, floored at 0.000001).
+        """
+        now = now or datetime.now()
+        n = len(symbols)
+        categories = np.asarray(categories, dtype=object)
+        base = np.asarray(current_prices, dtype=np.float64).reshape(n)
+        
+        # Assets without a price start from BASE_PRICES or a category range
+        missing = ~(base > 0)
+        if missing.any():
+            for i in np.flatnonzero(missing):
+                known = cls.BASE_PRICES.get(symbols[i].upper())
+                if known is None:
+                    low, high = cls.FALLBACK_PRICE_RANGES.get(
+                        categories[i], cls.FALLBACK_PRICE_RANGES['stock']
+                    )
+                    known = cls.rng.uniform(low, high)
+                base[i] = known
+        
+        # One draw per category volatility band
+        movement = np.empty(n, dtype=np.float64)
+        market_hours = 9 <= now.hour <= 17
+        for category in set(categories.tolist()):
+            mask = categories == category
+            volatility = cls.VOLATILITY.get(category, 0.01)
+            if not market_hours:
+                volatility *= 0.3
+            movement[mask] = cls.rng.uniform(-volatility, volatility, int(mask.sum()))
+        
+        # Add some randomness
+        movement += cls.rng.uniform(-0.001, 0.001, n)
+        
+        new_prices = np.maximum(base * (1 + movement), 0.000001)
+        return np.round(new_prices, 6)
+    
+    @classmethod
+    def quote(cls, symbols, categories, current_prices):
+        """
+        New prices from the configured market data provider.
+        Any symbol the provider could not price falls back to the simulator.
+        """
+        n = len(symbols)
+        provider = get_provider()
+        try:
+            prices = np.asarray(
+                provider.fetch_prices(symbols, categories, current_prices),
+                dtype=np.float64,
+            ).reshape(n)
+        except Exception as e:
+            logger.error(f"Provider {provider.name} failed, simulating {n} prices: {str(e)}")
+            prices = np.full(n, np.nan)
+        
+        missing = np.flatnonzero(~(prices > 0))
+        if len(missing):
+            prices[missing] = cls.generate_prices(
+                [symbols[i] for i in missing],
+                np.asarray(categories, dtype=object)[missing],
+                np.asarray(current_prices, dtype=np.float64)[missing],
+            )
+        return np.round(prices, 6)
+    
+    @classmethod
+    def update_all_prices(cls, only_stale=True, symbols=None):
+        """
+        Update prices for all active assets (or only `symbols`) in one batch tick.
+        Loads the active universe, draws every movement with NumPy and
+        writes the results back with a single bulk_update.
+        
+        Quotes are fetched before any row is locked: a slow provider must not
+        hold the asset rows (or a transaction) open. The write then locks and
+        re-reads the rows and skips any that another writer moved meanwhile.
+        """
         from assets.models import Asset
         
+        fields = ('id', 'symbol', 'category', 'current_price', 'previous_price', 'change_percentage', 'last_updated')
         assets = Asset.objects.filter(is_active=True)
-        updated_count = 0
+        if only_stale:
+            # Same rule as Asset.needs_update, applied in SQL
+            assets = assets.filter(last_updated__lt=Asset.stale_cutoff())
+        if symbols is not None:
+            assets = assets.filter(symbol__in=symbols)
         
-        for asset in assets:
-            if asset.needs_update():
-                if cls.update_asset_price(asset):
-                    updated_count += 1
+        read = list(assets.only(*fields))
+        if not read:
+            return 0
+        quoted = cls.quote(
+            [a.symbol for a in read],
+            [a.category for a in read],
+            np.array([float(a.current_price or 0) for a in read], dtype=np.float64),
+        )
+        read_at = {a.pk: (a.last_updated, quoted[i]) for i, a in enumerate(read)}
+        
+        with transaction.atomic():
+            now = timezone.now()
+            locked = Asset.objects.filter(pk__in=read_at).select_for_update().only(*fields).order_by('pk')
+            # Rows updated since they were read already carry a newer price
+            assets = [a for a in locked if a.last_updated == read_at[a.pk][0]]
+            if not assets:
+                return 0
+            
+            current = np.array([float(a.current_price or 0) for a in assets], dtype=np.float64)
+            new_prices = np.array([read_at[a.pk][1] for a in assets], dtype=np.float64)
+            if cls.recorder:
+                cls.recorder.record(now, [a.symbol for a in assets], new_prices)
+            
+            # Same semantics as Asset.update_price, computed for the whole batch
+            has_previous = current > 0
+            change = np.zeros_like(new_prices)
+            np.divide(new_prices - current, current, out=change, where=has_previous)
+            # Keep within Asset.change_percentage (max_digits=10, decimal_places=2)
+            change = np.clip(np.round(change * 100, 2), -MAX_CHANGE_PERCENTAGE, MAX_CHANGE_PERCENTAGE)
+            
+            for i, asset in enumerate(assets):
+                if has_previous[i]:
+                    asset.previous_price = asset.current_price
+                    asset.change_percentage = Decimal(f"{change[i]:.2f}")
+                asset.current_price = Decimal(f"{new_prices[i]:.6f}")
+                # bulk_update bypasses auto_now
+                asset.last_updated = now
+            
+            Asset.objects.bulk_update(
+                assets,
+                ['current_price', 'previous_price', 'change_percentage', 'last_updated'],
+                batch_size=cls.BULK_UPDATE_BATCH_SIZE,
+            )
+            cls.record_history(assets, now)
         
-        return updated_count
\ No newline at end of file
+        cls.notify(assets, now)
+        logger.info(f"Batch tick updated {len(assets)} assets")
+        return len(assets)
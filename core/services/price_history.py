@@ -0,0 +1,116 @@
+# core/services/price_history.py
+"""
+Raw price ticks and the chart series built from them.
+
+A series is read from PriceTick when its range holds few enough ticks;
+longer ranges are read from the closes of the finest PriceCandle interval
+(core.services.candles) that covers them, so no series reads more than
+MAX_SOURCE_ROWS rows before LTTB downsamples it.
+"""
+from datetime import timedelta
+import logging
+
+import numpy as np
+from django.conf import settings
+from django.utils import timezone
+
+from core.services.candles import INTERVALS, RETENTION
+from core.utils.downsample import lttb
+
+logger = logging.getLogger(__name__)
+
+# Days of raw ticks to keep (override with PRICE_TICK_RETENTION_DAYS)
+DEFAULT_RETENTION_DAYS = 30
+
+# Chart payload limits
+DEFAULT_POINTS = 200
+MAX_POINTS = 1000
+# Most ticks or candles read for one series
+MAX_SOURCE_ROWS = 5000
+
+# Named ranges accepted by the history endpoint
+RANGES = {
+    '1h': timedelta(hours=1),
+    '24h': timedelta(hours=24),
+    '7d': timedelta(days=7),
+    '30d': timedelta(days=30),
+}
+
+
+def record_ticks(assets, timestamp=None):
+    """Append one PriceTick per asset at its current_price"""
+    from assets.models import PriceTick
+
+    timestamp = timestamp or timezone.now()
+    ticks = [
+        PriceTick(asset_id=asset.id, price=float(asset.current_price), timestamp=timestamp)
+        for asset in assets
+        if asset.current_price
+    ]
+    PriceTick.objects.bulk_create(ticks, batch_size=1000)
+    return len(ticks)
+
+
+def prune_ticks(retention_days=None):
+    """Delete ticks older than the retention window"""
+    from assets.models import PriceTick
+
+    if retention_days is None:
+        retention_days = getattr(settings, 'PRICE_TICK_RETENTION_DAYS', DEFAULT_RETENTION_DAYS)
+    cutoff = timezone.now() - timedelta(days=retention_days)
+    deleted, _ = PriceTick.objects.filter(timestamp__lt=cutoff).delete()
+    logger.info(f"Pruned {deleted} price ticks older than {cutoff}")
+    return deleted
+
+
+def _candle_interval(start, end):
+    """Finest candle interval still kept for [start, end] with at most MAX_SOURCE_ROWS buckets in it"""
+    span = end - start
+    for interval, length in INTERVALS.items():
+        retention = RETENTION[interval]
+        if span / length <= MAX_SOURCE_ROWS and (retention is None or span <= retention):
+            return interval
+    return '1d'
+
+
+def _latest_rows(queryset, order_field):
+    """The newest MAX_SOURCE_ROWS + 1 rows, oldest first"""
+    rows = list(queryset.order_by(f"-{order_field}")[:MAX_SOURCE_ROWS + 1])
+    rows.reverse()
+    return rows
+
+
+def get_price_series(asset, start, end=None, points=DEFAULT_POINTS):
+    """
+    Load ticks (or candle closes, for long ranges) for an asset in
+    [start, end] and downsample them with LTTB.
+    Returns (epoch_seconds, prices) as float64 arrays of at most `points` items.
+    """
+    from assets.models import PriceCandle, PriceTick
+
+    end = end or timezone.now()
+    points = max(3, min(int(points), MAX_POINTS))
+
+    rows = None
+    tick_seconds = getattr(settings, 'PRICE_TICK_INTERVAL_SECONDS', 5)
+    if (end - start).total_seconds() / tick_seconds <= MAX_SOURCE_ROWS:
+        rows = _latest_rows(
+            PriceTick.objects.filter(asset=asset, timestamp__gte=start, timestamp__lte=end)
+            .values_list('timestamp', 'price'),
+            'timestamp',
+        )
+    if rows is None or len(rows) > MAX_SOURCE_ROWS:
+        # More ticks than a series may read (long range or fast ticker): use candle closes
+        rows = _latest_rows(
+            PriceCandle.objects.filter(
+                asset=asset, interval=_candle_interval(start, end), bucket_start__gte=start, bucket_start__lte=end,
+            ).values_list('bucket_start', 'close'),
+            'bucket_start',
+        )
+    rows = rows[-MAX_SOURCE_ROWS:]
+    if not rows:
+        return np.empty(0), np.empty(0)
+
+    timestamps = np.fromiter((ts.timestamp() for ts, _ in rows), dtype=np.float64, count=len(rows))
+    prices = np.fromiter((price for _, price in rows), dtype=np.float64, count=len(rows))
+    return lttb(timestamps, prices, points)
@@ -0,0 +1,379 @@
+# core/services/price_snapshot.py
+"""
+Latest prices in a shared-memory segment, written by the price ticker and
+read zero-copy by every web worker on the host.
+
+Segment layout:
+    header   magic (8s), seq (uint64), count (uint64), layout (uint64),
+             summary length (uint64)
+    summary  SUMMARY_SIZE bytes of JSON from MarketSummary.as_dict()
+    records  `capacity` fixed-width rows of RECORD_DTYPE, one per asset
+
+seq is a seqlock: the writer makes it odd while writing and even when done,
+so readers retry instead of seeing a half-written tick. layout changes when
+slots are assigned to new symbols, telling readers to rebuild their index.
+Slots are never freed; a deactivated asset keeps its slot with `active`
+cleared, and readers skip inactive slots just as the database fallback
+filters on Asset.is_active.
+
+Pages that render Asset rows overlay the snapshot's price fields onto them
+(overlay_latest_prices), so the prices shown are the ticker's latest.
+"""
+from datetime import datetime
+from datetime import timezone as dt_timezone
+from decimal import Decimal
+import json
+import logging
+import struct
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+from django.conf import settings
+
+from core.services.market_summary import MarketSummary
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'PSNAP04\0'
+HEADER = struct.Struct('<8sQQQQ')
+SUMMARY_SIZE = 64 * 1024
+RECORDS_OFFSET = HEADER.size + SUMMARY_SIZE
+# Asset.symbol max_length; longer encoded symbols are not published
+SYMBOL_SIZE = 20
+SYMBOL_DTYPE = f'S{SYMBOL_SIZE}'
+RECORD_DTYPE = np.dtype([
+    ('symbol', SYMBOL_DTYPE),
+    ('asset_id', 'S16'),
+    ('price', '<f8'),
+    ('previous', '<f8'),
+    ('change', '<f8'),
+    ('updated', '<f8'),
+    ('active', '?'),
+])
+
+DEFAULT_NAME = 'pesaprime_prices'
+DEFAULT_CAPACITY = 10000
+
+# Reader retries before giving up on a segment that is being rewritten
+READ_RETRIES = 100
+
+PRICE_PLACES = Decimal('0.000001')
+CHANGE_PLACES = Decimal('0.01')
+
+
+def _segment_name():
+    return getattr(settings, 'PRICE_SNAPSHOT_NAME', DEFAULT_NAME)
+
+
+def _capacity():
+    return getattr(settings, 'PRICE_SNAPSHOT_CAPACITY', DEFAULT_CAPACITY)
+
+
+def _retire(shm):
+    """Clear the magic so attached readers drop this segment, then close it"""
+    shm.buf[:len(MAGIC)] = b'\0' * len(MAGIC)
+    shm.close()
+
+
+class PriceSnapshotWriter:
+    """Owns the segment; used by the single ticker process"""
+
+    def __init__(self, name=None, capacity=None):
+        self.name = name or _segment_name()
+        self.capacity = capacity or _capacity()
+        size = RECORDS_OFFSET + self.capacity * RECORD_DTYPE.itemsize
+        try:
+            self.shm = shared_memory.SharedMemory(name=self.name, create=True, size=size)
+        except FileExistsError:
+            # Left behind by a crashed ticker: retire it and rebuild
+            stale = shared_memory.SharedMemory(name=self.name)
+            _retire(stale)
+            stale.unlink()
+            self.shm = shared_memory.SharedMemory(name=self.name, create=True, size=size)
+
+        self.records = np.ndarray((self.capacity,), dtype=RECORD_DTYPE, buffer=self.shm.buf, offset=RECORDS_OFFSET)
+        self.slots = {}
+        self.seq = 0
+        self.layout = 0
+        self.summary = MarketSummary()
+        self.summary_length = 0
+        self._write_header()
+
+    def _write_header(self):
+        HEADER.pack_into(self.shm.buf, 0, MAGIC, self.seq, len(self.slots), self.layout, self.summary_length)
+
+    def _write_summary(self):
+        encoded = json.dumps(self.summary.as_dict(), separators=(',', ':')).encode()
+        if len(encoded) > SUMMARY_SIZE:
+            # Readers fall back to the database
+            logger.warning(f"Market summary of {len(encoded)} bytes does not fit the snapshot")
+            self.summary_length = 0
+            return
+        self.shm.buf[HEADER.size:HEADER.size + len(encoded)] = encoded
+        self.summary_length = len(encoded)
+
+    def publish(self, assets, active=None):
+        """
+        Write the current price fields of each asset into its slot. With
+        `active` (the symbols of every active asset), all other slots are
+        flagged inactive and dropped from the market summary in the same
+        write.
+        """
+        self.seq += 1  # odd: write in progress
+        self._write_header()
+        try:
+            for asset in assets:
+                slot = self.slots.get(asset.symbol)
+                if slot is None:
+                    if len(self.slots) >= self.capacity:
+                        logger.warning(f"Price snapshot full, {asset.symbol} not published")
+                        continue
+                    symbol = asset.symbol.encode()
+                    if len(symbol) > SYMBOL_SIZE:
+                        # numpy would truncate it and readers would never match it
+                        logger.warning(f"Symbol {asset.symbol} is over {SYMBOL_SIZE} bytes, not published")
+                        continue
+                    slot = self.slots[asset.symbol] = len(self.slots)
+                    self.records[slot]['symbol'] = symbol
+                    self.records[slot]['asset_id'] = asset.id.bytes
+                    self.records[slot]['active'] = True
+                    self.layout += 1
+                record = self.records[slot]
+                record['price'] = float(asset.current_price or 0)
+                record['previous'] = float(asset.previous_price or 0)
+                record['change'] = float(asset.change_percentage or 0)
+                record['updated'] = asset.last_updated.timestamp() if asset.last_updated else 0.0
+            self.summary.update(assets)
+            if active is not None:
+                active = set(active)
+                used = self.records[:len(self.slots)]
+                used['active'] = np.isin(used['symbol'], np.array([symbol.encode() for symbol in active], dtype=SYMBOL_DTYPE))
+                # Deactivated assets leave the counts, averages and movers too
+                for symbol in self.summary.changes.keys() - active:
+                    self.summary.remove(symbol)
+            self._write_summary()
+        finally:
+            self.seq += 1  # even: consistent
+            self._write_header()
+
+    def __call__(self, assets, timestamp=None):
+        """Tick listener interface for PriceFetcher; also picks up deactivated assets"""
+        from assets.models import Asset
+
+        self.publish(assets, active=Asset.objects.filter(is_active=True).values_list('symbol', flat=True))
+
+    def close(self):
+        _retire(self.shm)
+        self.shm.unlink()
+
+
+class PriceSnapshotReader:
+    """Attaches to the segment lazily; returns None when it is missing"""
+
+    def __init__(self, name=None):
+        self.name = name or _segment_name()
+        self.shm = None
+        self.records = None
+        self.layout = None
+        self.index = {}
+
+    def _attach(self):
+        try:
+            shm = shared_memory.SharedMemory(name=self.name)
+        except FileNotFoundError:
+            return False
+        # Readers must not unlink the writer's segment when they exit
+        resource_tracker.unregister(shm._name, 'shared_memory')
+        magic = HEADER.unpack_from(shm.buf, 0)[0]
+        if magic != MAGIC:
+            shm.close()
+            return False
+        capacity = (shm.size - RECORDS_OFFSET) // RECORD_DTYPE.itemsize
+        self.shm = shm
+        self.records = np.ndarray((capacity,), dtype=RECORD_DTYPE, buffer=shm.buf, offset=RECORDS_OFFSET)
+        return True
+
+    def _detach(self):
+        if self.shm is not None:
+            self.records = None
+            self.shm.close()
+            self.shm = None
+            self.layout = None
+
+    def _consistent(self, copy_out):
+        """
+        Run copy_out(count, layout, summary_length) between two equal, even
+        seq values and return its result; None if no ticker is publishing.
+        """
+        if self.shm is None and not self._attach():
+            return None
+        for _ in range(READ_RETRIES):
+            magic, seq_before, count, layout, summary_length = HEADER.unpack_from(self.shm.buf, 0)
+            if magic != MAGIC:
+                # Writer retired this segment; pick up its replacement if any
+                self._detach()
+                if not self._attach():
+                    return None
+                continue
+            if seq_before % 2:
+                continue
+            result = copy_out(count, layout, summary_length)
+            seq_after = HEADER.unpack_from(self.shm.buf, 0)[1]
+            if seq_before == seq_after:
+                return result
+        logger.warning("Price snapshot busy, falling back to database")
+        return None
+
+    def read(self):
+        """
+        Consistent copy of all published records, or None if no ticker
+        is publishing. Returns a structured array of RECORD_DTYPE; slots of
+        deactivated assets are included with `active` False.
+        """
+        def copy_records(count, layout, summary_length):
+            return layout, self.records[:count].copy()
+
+        result = self._consistent(copy_records)
+        if result is None:
+            return None
+        layout, records = result
+        if layout != self.layout:
+            self.index = {symbol.decode(): i for i, symbol in enumerate(records['symbol'])}
+            self.layout = layout
+        return records
+
+    def summary(self):
+        """Published MarketSummary.as_dict(), or None"""
+        def copy_summary(count, layout, summary_length):
+            return bytes(self.shm.buf[HEADER.size:HEADER.size + summary_length])
+
+        encoded = self._consistent(copy_summary)
+        if not encoded:
+            return None
+        return json.loads(encoded)
+
+    def prices(self, since=None):
+        """
+        {symbol: {'price', 'previous', 'change', 'updated'}} or None.
+        With `since`, only symbols updated after that datetime.
+        """
+        records = self.read()
+        if records is None:
+            return None
+        wanted = records['active']
+        if since is not None:
+            wanted = wanted & (records['updated'] > since.timestamp())
+        return {
+            symbol: {
+                'price': float(records[i]['price']),
+                'previous': float(records[i]['previous']),
+                'change': float(records[i]['change']),
+                'updated': datetime.fromtimestamp(records[i]['updated'], tz=dt_timezone.utc),
+            }
+            for symbol, i in self.index.items()
+            if i < len(records) and wanted[i]
+        }
+
+
+_reader = None
+
+
+def get_reader():
+    global _reader
+    if _reader is None:
+        _reader = PriceSnapshotReader()
+    return _reader
+
+
+def get_latest_prices(symbols=None, since=None):
+    """
+    Latest prices keyed by symbol, from shared memory when the ticker is
+    publishing, otherwise from the Asset table. `since` (a datetime) limits
+    the result to prices updated after it.
+    """
+    prices = get_reader().prices(since)
+    if prices is not None:
+        if symbols is None:
+            return prices
+        return {symbol: prices[symbol] for symbol in symbols if symbol in prices}
+
+    from assets.models import Asset
+
+    assets = Asset.objects.filter(is_active=True)
+    if symbols is not None:
+        assets = assets.filter(symbol__in=list(symbols))
+    if since is not None:
+        assets = assets.filter(last_updated__gt=since)
+    return {
+        symbol: {
+            'price': float(price),
+            'previous': float(previous),
+            'change': float(change),
+            'updated': updated,
+        }
+        for symbol, price, previous, change, updated in assets.values_list(
+            'symbol', 'current_price', 'previous_price', 'change_percentage', 'last_updated'
+        )
+    }
+
+
+def overlay_latest_prices(assets):
+    """
+    Set current_price, previous_price, change_percentage and last_updated
+    of Asset rows loaded for display from the snapshot, without querying
+    them again. Rows keep their database values when no ticker is
+    publishing, the snapshot lacks their symbol or holds an older price
+    than the row. Returns the assets as a list.
+    """
+    assets = list(assets)
+    prices = get_reader().prices()
+    if not prices:
+        return assets
+    for asset in assets:
+        latest = prices.get(asset.symbol)
+        if latest is None or (asset.last_updated and latest['updated'] < asset.last_updated):
+            continue
+        asset.current_price = Decimal(repr(latest['price'])).quantize(PRICE_PLACES)
+        asset.previous_price = Decimal(repr(latest['previous'])).quantize(PRICE_PLACES)
+        asset.change_percentage = Decimal(repr(latest['change'])).quantize(CHANGE_PLACES)
+        asset.last_updated = latest['updated']
+    return assets
+
+
+def to_seq(timestamp):
+    """Epoch seconds (float) -> integer microseconds used as a price sequence"""
+    return int(round(timestamp * 1_000_000))
+
+
+def from_seq(seq):
+    return datetime.fromtimestamp(seq / 1_000_000, tz=dt_timezone.utc)
+
+
+def price_version():
+    """
+    (seq, count) identifying the current set of prices: seq is the newest
+    update time in epoch microseconds (every tick advances it), count the
+    number of priced assets. Read from shared memory when available,
+    otherwise one aggregate query.
+    """
+    records = get_reader().read()
+    if records is not None:
+        records = records[records['active']]
+        if not len(records):
+            return 0, 0
+        return to_seq(float(records['updated'].max())), len(records)
+
+    from django.db.models import Count, Max
+    from assets.models import Asset
+
+    result = Asset.objects.filter(is_active=True).aggregate(newest=Max('last_updated'), count=Count('id'))
+    newest = result['newest']
+    return (to_seq(newest.timestamp()) if newest else 0), result['count']
+
+
+def count_stale(cutoff):
+    """Number of published prices older than cutoff, or None without a snapshot"""
+    records = get_reader().read()
+    if records is None:
+        return None
+    return int((records['active'] & (records['updated'] < cutoff.timestamp())).sum())
@@ -0,0 +1,129 @@
+# core/services/price_stream.py
+"""
+Server-Sent Events fan-out of price changes, one broadcaster per worker.
+
+A single task per worker polls get_latest_prices (shared memory when the
+ticker is running) and pushes only the symbols that changed to every
+connected client. Each client holds at most one pending value per symbol:
+a slow client gets the newest prices merged together rather than an
+ever-growing queue.
+"""
+import asyncio
+import json
+import logging
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+from core.services.price_snapshot import get_latest_prices
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_CONNECTIONS = 500
+DEFAULT_POLL_SECONDS = 1.0
+DEFAULT_HEARTBEAT_SECONDS = 15.0
+# Django 4.2 keeps iterating a stream after the client leaves; cap each
+# connection's lifetime and let EventSource reconnect
+DEFAULT_MAX_SECONDS = 300.0
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+class Subscriber:
+    """Pending deltas for one connection, coalesced per symbol"""
+
+    def __init__(self):
+        self.pending = {}
+        self.ready = asyncio.Event()
+
+    def push(self, delta):
+        self.pending.update(delta)
+        self.ready.set()
+
+    def take(self):
+        delta, self.pending = self.pending, {}
+        self.ready.clear()
+        return delta
+
+
+class PriceBroadcaster:
+
+    def __init__(self):
+        self.subscribers = set()
+        self.latest = {}
+        self._task = None
+
+    @property
+    def max_connections(self):
+        return _setting('PRICE_STREAM_MAX_CONNECTIONS', DEFAULT_MAX_CONNECTIONS)
+
+    def subscribe(self):
+        """Register a connection, or return None when the worker is at its cap"""
+        if len(self.subscribers) >= self.max_connections:
+            return None
+        subscriber = Subscriber()
+        if self.latest:
+            subscriber.push(dict(self.latest))
+        self.subscribers.add(subscriber)
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        self.subscribers.discard(subscriber)
+
+    async def _poll(self):
+        prices = await sync_to_async(get_latest_prices)()
+        delta = {}
+        for symbol, latest in prices.items():
+            row = [
+                round(latest['price'], 6),
+                round(latest['change'], 2),
+                int(latest['updated'].timestamp()) if latest['updated'] else 0,
+            ]
+            if self.latest.get(symbol) != row:
+                delta[symbol] = row
+        self.latest.update(delta)
+        return delta
+
+    async def _run(self):
+        poll_seconds = _setting('PRICE_STREAM_POLL_SECONDS', DEFAULT_POLL_SECONDS)
+        # Stops by itself once the last client disconnects
+        while self.subscribers:
+            try:
+                delta = await self._poll()
+            except Exception:
+                logger.exception("Price stream poll failed")
+                delta = {}
+            if delta:
+                for subscriber in list(self.subscribers):
+                    subscriber.push(delta)
+            await asyncio.sleep(poll_seconds)
+
+
+broadcaster = PriceBroadcaster()
+
+
+def format_event(delta):
+    """SSE frame: {"SYMBOL": [price_usd, change_pct, updated_epoch], ...}"""
+    return f"event: prices\ndata: {json.dumps(delta, separators=(',', ':'))}\n\n"
+
+
+async def event_stream(subscriber):
+    heartbeat = _setting('PRICE_STREAM_HEARTBEAT_SECONDS', DEFAULT_HEARTBEAT_SECONDS)
+    max_seconds = _setting('PRICE_STREAM_MAX_SECONDS', DEFAULT_MAX_SECONDS)
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + max_seconds
+    try:
+        yield "retry: 5000\n\n"
+        while loop.time() < deadline:
+            try:
+                await asyncio.wait_for(subscriber.ready.wait(), timeout=min(heartbeat, deadline - loop.time()))
+            except asyncio.TimeoutError:
+                yield ": ping\n\n"
+                continue
+            yield format_event(subscriber.take())
+    finally:
+        broadcaster.unsubscribe(subscriber)
@@ -0,0 +1,182 @@
+# core/services/price_tape.py
+"""
+Binary price tape for recording ticks and replaying them deterministically.
+
+File layout (little endian):
+    8 bytes   magic b'PTAPE01\\0'
+    4 bytes   header length (uint32)
+    N bytes   JSON header {"symbols": [...], "created_at": ..., "seed": ...},
+              padded with spaces to an 8-byte boundary
+    rest      float64 matrix, one row per tick: [timestamp, price_0, ..., price_n-1]
+
+Rows are fixed width, so the tape can be appended to while recording and
+memory-mapped for replay without parsing. Symbols absent from a tick are NaN.
+"""
+import json
+import os
+import struct
+import time
+
+import numpy as np
+from django.utils import timezone
+
+from core.services.market_data import MarketDataProvider
+
+MAGIC = b'PTAPE01\0'
+
+
+class TapeRecorder:
+    """Append PriceFetcher ticks to a tape file"""
+
+    def __init__(self, path, symbols, seed=None):
+        self.path = path
+        self.symbols = list(symbols)
+        self.columns = {symbol: i + 1 for i, symbol in enumerate(self.symbols)}
+        self.ticks = 0
+
+        header = json.dumps({
+            'symbols': self.symbols,
+            'created_at': timezone.now().isoformat(),
+            'seed': seed,
+        }).encode()
+        header += b' ' * (-(len(MAGIC) + 4 + len(header)) % 8)
+
+        self._file = open(path, 'wb')
+        self._file.write(MAGIC)
+        self._file.write(struct.pack('<I', len(header)))
+        self._file.write(header)
+        self._file.flush()
+
+    def record(self, timestamp, symbols, prices):
+        """Write one tick; symbols outside the tape's universe are dropped"""
+        row = np.full(len(self.symbols) + 1, np.nan, dtype='<f8')
+        row[0] = timestamp.timestamp()
+        for symbol, price in zip(symbols, prices):
+            column = self.columns.get(symbol)
+            if column is not None:
+                row[column] = price
+        self._file.write(row.tobytes())
+        self.ticks += 1
+
+    def close(self):
+        if not self._file.closed:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._file.close()
+
+
+class PriceTape:
+    """Read-only, memory-mapped view of a tape file"""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"{path} is not a price tape")
+            (header_length,) = struct.unpack('<I', f.read(4))
+            self.header = json.loads(f.read(header_length))
+
+        self.symbols = self.header['symbols']
+        offset = len(MAGIC) + 4 + header_length
+        width = len(self.symbols) + 1
+        # Ignore a partially written trailing row
+        rows = (os.path.getsize(path) - offset) // (width * 8)
+
+        if rows:
+            self.matrix = np.memmap(path, dtype='<f8', mode='r', offset=offset, shape=(rows, width))
+        else:
+            self.matrix = np.empty((0, width), dtype='<f8')
+
+    def __len__(self):
+        return self.matrix.shape[0]
+
+    @property
+    def timestamps(self):
+        return self.matrix[:, 0]
+
+    @property
+    def seed(self):
+        return self.header.get('seed')
+
+    def symbols_at(self, row):
+        """Symbols recorded in a row (the rest were not updated in that tick)"""
+        recorded = ~np.isnan(self.matrix[row, 1:])
+        return [symbol for symbol, present in zip(self.symbols, recorded) if present]
+
+
+class TapeReplayProvider(MarketDataProvider):
+    """
+    Feed recorded ticks back into PriceFetcher, one tape row per fetch.
+    Symbols not on the tape come back NaN and are simulated by PriceFetcher.
+    """
+    name = 'tape'
+
+    def __init__(self, path, loop=False):
+        self.tape = PriceTape(path)
+        self.loop = loop
+        self.position = 0
+        self.columns = {symbol: i + 1 for i, symbol in enumerate(self.tape.symbols)}
+
+    @property
+    def exhausted(self):
+        return not self.loop and self.position >= len(self.tape)
+
+    def fetch_prices(self, symbols, categories, current_prices):
+        result = np.full(len(symbols), np.nan)
+        if not len(self.tape):
+            return result
+        if self.position >= len(self.tape):
+            if not self.loop:
+                return result
+            self.position = 0
+
+        row = self.tape.matrix[self.position]
+        self.position += 1
+        columns = np.fromiter((self.columns.get(s, 0) for s in symbols), dtype=np.int64, count=len(symbols))
+        known = columns > 0
+        result[known] = row[columns[known]]
+        return result
+
+
+def replay(path, speed=1.0, seed=None, on_tick=None, sleep=time.sleep, clock=time.monotonic):
+    """
+    Push every tick on the tape through PriceFetcher.update_all_prices.
+    Each tick only updates the symbols recorded in its row, so assets the
+    recorded tick left alone keep their price instead of being simulated.
+    speed is a multiplier on recorded time (e.g. 60 = one minute per second);
+    0 replays as fast as possible. Returns TickStats.
+    """
+    from core.services.market_data import set_provider
+    from core.services.price_fetcher import PriceFetcher
+    from core.services.ticker import TickStats
+
+    provider = TapeReplayProvider(path)
+    tape = provider.tape
+    # Simulated fallbacks replay identically when seeded
+    PriceFetcher.seed(seed if seed is not None else tape.seed)
+
+    previous_provider = set_provider(provider)
+    stats = TickStats()
+    started = clock()
+    try:
+        timestamps = tape.timestamps
+        for i in range(len(tape)):
+            if speed and i:
+                due = started + (timestamps[i] - timestamps[0]) / speed
+                delay = due - clock()
+                if delay > 0:
+                    sleep(delay)
+                lag = max(0.0, clock() - due)
+            else:
+                lag = 0.0
+
+            tick_started = clock()
+            # A tick that finds none of its symbols never fetches; stay on the row
+            provider.position = i
+            updated = PriceFetcher.update_all_prices(only_stale=False, symbols=tape.symbols_at(i))
+            stats.record(lag, clock() - tick_started, updated)
+            if on_tick:
+                on_tick(stats)
+    finally:
+        set_provider(previous_provider)
+    return stats
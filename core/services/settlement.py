@@ -0,0 +1,180 @@
+# core/services/settlement.py
+"""
+Batch settlement of matured investments (investments.Investment).
+
+Each chunk runs in its own transaction:
+    1. lock up to `chunk_size` due investments (status active, end_time <= now)
+    2. draw the ±20% market factor for the whole chunk at once
+    3. flip them to completed with one UPDATE
+    4. move principal + profit from locked to available with one set-based
+       UPDATE per wallet batch (F() expressions, no read-modify-write)
+    5. bulk_create the profit transactions and their ledger postings
+    6. fold the completions into the owners' PortfolioSummary rows
+
+Completed rows are never selected again and every profit transaction has a
+deterministic reference, so an interrupted run can simply be started again.
+"""
+from collections import defaultdict
+from decimal import Decimal
+import logging
+
+import numpy as np
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import DecimalField, F
+from django.db.models.expressions import RawSQL
+from django.utils import timezone
+
+from core.services import ledger, portfolio
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHUNK_SIZE = 1000
+# Wallets per UPDATE ... CASE statement
+WALLET_UPDATE_BATCH_SIZE = 500
+CENT = Decimal('0.01')
+
+# Same spread as Investment.complete_investment
+FACTOR_LOW, FACTOR_HIGH = 0.8, 1.2
+
+rng = np.random.default_rng()
+
+
+def seed(value):
+    """Reseed the market factor generator (for reproducible runs)"""
+    global rng
+    rng = np.random.default_rng(value)
+
+
+def settlement_reference(investment_id):
+    return f"PRF{investment_id.hex.upper()}"
+
+
+def _case_by_pk(model, values):
+    """
+    `CASE pk WHEN ... THEN ... END` as a single RawSQL expression. Case/When
+    (and bulk_update) resolve every branch separately, which costs more
+    than the UPDATE itself at a thousand rows per chunk.
+    """
+    pk = model._meta.pk
+    sql = f"CASE {connection.ops.quote_name(pk.column)} {'WHEN %s THEN %s ' * len(values)}END"
+    params = []
+    for key, value in values.items():
+        params += [pk.get_db_prep_value(key, connection), value]
+    return RawSQL(sql, params, output_field=DecimalField(max_digits=20, decimal_places=2))
+
+
+def _apply_wallet_deltas(locked, available):
+    from wallet.models import Wallet
+
+    wallet_ids = list(locked)
+    for i in range(0, len(wallet_ids), WALLET_UPDATE_BATCH_SIZE):
+        batch = wallet_ids[i:i + WALLET_UPDATE_BATCH_SIZE]
+        Wallet.objects.filter(id__in=batch).update(
+            locked_balance=F('locked_balance') + _case_by_pk(Wallet, {w: locked[w] for w in batch}),
+            available_balance=F('available_balance') + _case_by_pk(Wallet, {w: available[w] for w in batch}),
+        )
+
+
+def _wallets_for(user_ids):
+    """{user_id: wallet_id}, creating empty wallets for users without one"""
+    from wallet.models import Wallet
+
+    wallets = dict(Wallet.objects.filter(user_id__in=user_ids).values_list('user_id', 'id'))
+    missing = set(user_ids) - set(wallets)
+    if missing:
+        Wallet.objects.bulk_create([Wallet(user_id=user_id) for user_id in missing], ignore_conflicts=True)
+        wallets.update(Wallet.objects.filter(user_id__in=missing).values_list('user_id', 'id'))
+    return wallets
+
+
+def settle_chunk(now, chunk_size, ids=None):
+    """
+    Settle one chunk of due investments, optionally only among `ids`.
+    Returns the ids that were settled.
+    """
+    from investments.models import Investment
+    from wallet.models import LedgerEntry, Transaction
+
+    due = Investment.objects.filter(status='active', end_time__lte=now)
+    if ids is not None:
+        due = due.filter(id__in=list(ids))
+
+    with transaction.atomic():
+        due = list(
+            due.order_by('end_time')
+            .select_for_update(skip_locked=True, of=('self',))
+            .values_list(
+                'id', 'user_id', 'invested_amount', 'expected_return_rate', 'actual_profit_loss', 'asset__name',
+            )[:chunk_size]
+        )
+        if not due:
+            return []
+
+        factors = rng.uniform(FACTOR_LOW, FACTOR_HIGH, len(due))
+        wallets = _wallets_for({row[1] for row in due})
+
+        profits = {}
+        changes = []
+        transactions = []
+        postings = []
+        locked = defaultdict(Decimal)
+        available = defaultdict(Decimal)
+        for (investment_id, user_id, amount, rate, previous, asset_name), factor in zip(due, factors.tolist()):
+            profit = (amount * rate / 100 * Decimal(str(factor))).quantize(CENT)
+            wallet_id = wallets[user_id]
+
+            profits[investment_id] = profit
+            changes.append(((user_id, 'active', amount, previous), (user_id, 'completed', amount, profit)))
+            locked[wallet_id] -= amount
+            available[wallet_id] += amount + profit
+            postings += ledger.postings(
+                wallet_id,
+                {'locked_balance': -amount, 'available_balance': amount + profit},
+                settlement_reference(investment_id),
+            )
+            transactions.append(Transaction(
+                user_id=user_id,
+                wallet_id=wallet_id,
+                transaction_type=Transaction.PROFIT,
+                payment_method='system',
+                amount=profit,
+                status=Transaction.COMPLETED,
+                reference=settlement_reference(investment_id),
+                description=f"Profit from {asset_name} investment",
+            ))
+
+        Investment.objects.filter(id__in=list(profits)).update(
+            status='completed',
+            actual_profit_loss=_case_by_pk(Investment, profits),
+            completed_at=now,
+            updated_at=now,
+        )
+        _apply_wallet_deltas(locked, available)
+        Transaction.objects.bulk_create(transactions, batch_size=chunk_size)
+        LedgerEntry.objects.bulk_create(postings, batch_size=chunk_size)
+        # The UPDATE above sends no signals
+        portfolio.record_changes(changes)
+
+    return list(profits)
+
+
+def settle_investments(now=None, chunk_size=None, limit=None):
+    """
+    Settle every investment that has matured by `now` (default: the time
+    of the call), chunk by chunk. Returns the number settled.
+    """
+    now = now or timezone.now()
+    chunk_size = chunk_size or getattr(settings, 'SETTLEMENT_CHUNK_SIZE', DEFAULT_CHUNK_SIZE)
+
+    total = 0
+    while limit is None or total < limit:
+        size = chunk_size if limit is None else min(chunk_size, limit - total)
+        settled = len(settle_chunk(now, size))
+        total += settled
+        if settled < size:
+            break
+
+    if total:
+        logger.info(f"Settled {total} investments")
+    return total
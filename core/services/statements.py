@@ -0,0 +1,175 @@
+# core/services/statements.py
+"""
+Account statements (transactions or investments over a date range) as
+streamed CSV or Parquet.
+
+Rows come from a server-side cursor (`iterator(chunk_size=...)`) and are
+encoded one chunk at a time: a block of CSV lines, or one Parquet row
+group. Nothing holds more than a chunk, so memory stays flat however
+long the statement is. Amounts are given in USD (`<name>_usd`) and in
+the statement currency (`<name>`, named by the `currency` column), at the
+rate in effect on the row's date so old statements do not drift.
+
+Parquet needs pyarrow, which is optional; statement_parquet raises
+ImportError without it.
+"""
+import csv
+from decimal import Decimal
+import io
+
+DEFAULT_CHUNK_SIZE = 5000
+CENT = Decimal('0.01')
+
+FORMATS = ('csv', 'parquet')
+
+# kind -> (model, date field, [(column, source field, type)])
+# type is 'text', 'int', 'time' or 'money' (money gets a converted column as well)
+STATEMENTS = {
+    'transactions': ('wallet.Transaction', 'created_at', [
+        ('date', 'created_at', 'time'),
+        ('reference', 'reference', 'text'),
+        ('type', 'transaction_type', 'text'),
+        ('payment_method', 'payment_method', 'text'),
+        ('status', 'status', 'text'),
+        ('amount', 'amount', 'money'),
+        ('description', 'description', 'text'),
+    ]),
+    'investments': ('investments.Investment', 'start_time', [
+        ('date', 'start_time', 'time'),
+        ('investment_id', 'id', 'text'),
+        ('asset', 'asset__symbol', 'text'),
+        ('duration_hours', 'duration_hours', 'int'),
+        ('status', 'status', 'text'),
+        ('invested', 'invested_amount', 'money'),
+        ('profit_loss', 'actual_profit_loss', 'money'),
+        ('end_time', 'end_time', 'time'),
+        ('completed_at', 'completed_at', 'time'),
+    ]),
+}
+
+
+def layout(kind):
+    """[(column name, type)] of a statement's rows"""
+    result = []
+    for name, _, kind_of in STATEMENTS[kind][2]:
+        if kind_of == 'money':
+            result += [(f"{name}_usd", kind_of), (name, kind_of)]
+        else:
+            result.append((name, kind_of))
+    return result + [('currency', 'text')]
+
+
+def statement_rows(kind, user, start, end, currency, chunk_size=None):
+    """Rows of the statement (matching `layout`), oldest first, streamed from the database"""
+    from django.apps import apps
+
+    from core.services.currencies import rate_at
+
+    model_label, date_field, spec = STATEMENTS[kind]
+    model = apps.get_model(model_label)
+    money = {i for i, (_, _, kind_of) in enumerate(spec) if kind_of == 'money'}
+    date_index = [source for _, source, _ in spec].index(date_field)
+
+    rows = (
+        model.objects.filter(user=user, **{f"{date_field}__gte": start, f"{date_field}__lt": end})
+        .order_by(date_field, 'pk')
+        .values_list(*(source for _, source, _ in spec))
+        .iterator(chunk_size=chunk_size or DEFAULT_CHUNK_SIZE)
+    )
+    for row in rows:
+        rate = rate_at(currency, row[date_index])
+        out = []
+        for i, value in enumerate(row):
+            if i in money:
+                value = value or Decimal('0')
+                out += [value, (value * rate).quantize(CENT)]
+            else:
+                out.append(value)
+        out.append(currency.code)
+        yield out
+
+
+def _chunks(rows, size):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def statement_csv(kind, user, start, end, currency, chunk_size=None):
+    """The statement as CSV, one block of text per chunk of rows"""
+    chunk_size = chunk_size or DEFAULT_CHUNK_SIZE
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow([name for name, _ in layout(kind)])
+    for chunk in _chunks(statement_rows(kind, user, start, end, currency, chunk_size), chunk_size):
+        writer.writerows(
+            [value.isoformat() if hasattr(value, 'isoformat') else value for value in row]
+            for row in chunk
+        )
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+class _ByteSink(io.RawIOBase):
+    """Write-only file that hands written bytes back to the generator"""
+
+    def __init__(self):
+        self.parts = []
+        self.position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.parts.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def drain(self):
+        data = b''.join(self.parts)
+        self.parts = []
+        return data
+
+
+def statement_parquet(kind, user, start, end, currency, chunk_size=None):
+    """The statement as Parquet, one row group per chunk of rows"""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    chunk_size = chunk_size or DEFAULT_CHUNK_SIZE
+    types = {
+        'text': pa.string(),
+        'int': pa.int64(),
+        'time': pa.timestamp('us', tz='UTC'),
+        'money': pa.decimal128(20, 2),
+    }
+    columns = layout(kind)
+    schema = pa.schema([pa.field(name, types[kind_of]) for name, kind_of in columns])
+    # UUIDs and the like go out as their string form
+    text_columns = {i for i, (_, kind_of) in enumerate(columns) if kind_of == 'text'}
+
+    def text(value):
+        return None if value is None else str(value)
+
+    sink = _ByteSink()
+    with pq.ParquetWriter(sink, schema) as writer:
+        for chunk in _chunks(statement_rows(kind, user, start, end, currency, chunk_size), chunk_size):
+            data = list(zip(*chunk))
+            arrays = [
+                pa.array([text(v) for v in values] if i in text_columns else values, type=schema.field(i).type)
+                for i, values in enumerate(data)
+            ]
+            writer.write_batch(pa.RecordBatch.from_arrays(arrays, schema=schema))
+            yield sink.drain()
+    yield sink.drain()
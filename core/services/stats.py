@@ -0,0 +1,19 @@
+# core/services/stats.py
+"""Rolling-window percentile helpers shared by the ticker, balances and settlement stats"""
+import numpy as np
+
+
+def percentiles(values):
+    """{'p50', 'p95', 'max'} of values (seconds); zeros when empty"""
+    if not values:
+        return {'p50': 0.0, 'p95': 0.0, 'max': 0.0}
+    p50, p95 = np.percentile(np.fromiter(values, dtype=np.float64), [50, 95])
+    return {'p50': float(p50), 'p95': float(p95), 'max': float(max(values))}
+
+
+def format_percentiles(label, p):
+    """e.g. 'lag p50=1.2ms p95=3.4ms max=5.6ms' for a percentiles() dict"""
+    return (
+        f"{label} p50={p['p50'] * 1000:.1f}ms p95={p['p95'] * 1000:.1f}ms "
+        f"max={p['max'] * 1000:.1f}ms"
+    )
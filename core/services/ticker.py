@@ -0,0 +1,127 @@
+# core/services/ticker.py
+from collections import deque
+import logging
+import random
+import time
+
+from django.db import close_old_connections
+
+from core.services.price_fetcher import PriceFetcher
+from core.services.stats import format_percentiles, percentiles
+
+logger = logging.getLogger(__name__)
+
+
+class TickStats:
+    """Rolling tick lag / duration statistics for the price ticker"""
+
+    def __init__(self, window=1000):
+        self.ticks = 0
+        self.failures = 0
+        self.skipped = 0
+        self.assets_updated = 0
+        self.lags = deque(maxlen=window)
+        self.durations = deque(maxlen=window)
+
+    def record(self, lag, duration, updated=0, failed=False):
+        self.ticks += 1
+        self.assets_updated += updated
+        if failed:
+            self.failures += 1
+        self.lags.append(lag)
+        self.durations.append(duration)
+
+    def summary(self):
+        return {
+            'ticks': self.ticks,
+            'failures': self.failures,
+            'skipped': self.skipped,
+            'assets_updated': self.assets_updated,
+            'lag': percentiles(self.lags),
+            'duration': percentiles(self.durations),
+        }
+
+    def __str__(self):
+        s = self.summary()
+        return (
+            f"ticks={s['ticks']} failures={s['failures']} skipped={s['skipped']} "
+            f"updated={s['assets_updated']} "
+            f"{format_percentiles('lag', s['lag'])} {format_percentiles('duration', s['duration'])}"
+        )
+
+
+class PriceTicker:
+    """
+    Fixed-cadence scheduler that drives PriceFetcher outside the request cycle.
+    Ticks are scheduled on a fixed grid (no drift); a tick that overruns skips
+    the slots it missed instead of bursting. Failures back off exponentially.
+    """
+
+    def __init__(self, interval=5.0, jitter=0.0, max_backoff=60.0, only_stale=False,
+                 tick=None, clock=time.monotonic, sleep=time.sleep):
+        self.interval = interval
+        self.jitter = jitter
+        self.max_backoff = max_backoff
+        self.only_stale = only_stale
+        self.tick = tick or self.default_tick
+        self.clock = clock
+        self.sleep = sleep
+        self.stats = TickStats()
+        self._stopped = False
+
+    def default_tick(self):
+        """
+        Move every active asset (or, with only_stale, only those whose price
+        is older than PRICE_STALE_AFTER_SECONDS, see Asset.needs_update)
+        """
+        return PriceFetcher.update_all_prices(only_stale=self.only_stale)
+
+    def stop(self):
+        self._stopped = True
+
+    def run(self, max_ticks=None, on_tick=None):
+        consecutive_failures = 0
+        next_run = self.clock()
+
+        while not self._stopped and (max_ticks is None or self.stats.ticks < max_ticks):
+            delay = next_run - self.clock()
+            if self.jitter:
+                delay += random.uniform(0, self.jitter)
+            if delay > 0:
+                self.sleep(delay)
+            if self._stopped:
+                break
+
+            started = self.clock()
+            lag = max(0.0, started - next_run)
+            updated = 0
+            failed = False
+
+            # Long-running process: drop connections the DB may have closed
+            close_old_connections()
+            try:
+                updated = self.tick() or 0
+                consecutive_failures = 0
+            except Exception:
+                failed = True
+                consecutive_failures += 1
+                logger.exception("Price tick failed")
+
+            duration = self.clock() - started
+            self.stats.record(lag, duration, updated, failed)
+            if on_tick:
+                on_tick(self.stats)
+
+            if failed:
+                backoff = min(self.interval * 2 ** consecutive_failures, self.max_backoff)
+                next_run = self.clock() + backoff
+                continue
+
+            next_run += self.interval
+            now = self.clock()
+            if next_run < now:
+                missed = int((now - next_run) // self.interval) + 1
+                self.stats.skipped += missed
+                next_run += missed * self.interval
+
+        return self.stats
@@ -0,0 +1,50 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from core.models import Currency, ExchangeRate
+from core.services.currencies import bump_version, record_rates
+from core.services.portfolio import record_change
+from investments.models import Investment
+
+
+def _state(investment):
+    return (investment.user_id, investment.status, investment.invested_amount, investment.actual_profit_loss)
+
+
+@receiver(pre_save, sender=Investment)
+def remember_investment_state(sender, instance, **kwargs):
+    # Loaded from the database so stale or partially loaded instances still give the right delta
+    previous = None
+    if not instance._state.adding:
+        previous = (
+            Investment.objects.filter(pk=instance.pk)
+            .values_list('user_id', 'status', 'invested_amount', 'actual_profit_loss')
+            .first()
+        )
+    instance._portfolio_previous = previous
+
+
+@receiver(post_save, sender=Investment)
+def update_portfolio_on_save(sender, instance, **kwargs):
+    record_change(getattr(instance, '_portfolio_previous', None), _state(instance))
+
+
+@receiver(post_delete, sender=Investment)
+def update_portfolio_on_delete(sender, instance, **kwargs):
+    record_change(_state(instance), None)
+
+
+@receiver(post_save, sender=Currency)
+def record_currency_rate(sender, instance, **kwargs):
+    # Every saved rate change starts a new period in the rate history
+    record_rates([instance])
+
+
+@receiver(post_save, sender=Currency)
+@receiver(post_delete, sender=Currency)
+@receiver(post_save, sender=ExchangeRate)
+@receiver(post_delete, sender=ExchangeRate)
+def invalidate_currency_table(sender, instance, **kwargs):
+    # After commit, so workers reloading on the new version see the change
+    transaction.on_commit(bump_version)
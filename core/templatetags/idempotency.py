@@ -0,0 +1,14 @@
+# core/templatetags/idempotency.py
+import uuid
+
+from django import template
+from django.utils.html import format_html
+
+from core.services.idempotency import FORM_FIELD
+
+register = template.Library()
+
+@register.simple_tag
+def idempotency_key_field():
+    """Hidden input with a fresh key; a resubmit of the same rendered form reuses it"""
+    return format_html('<input type="hidden" name="{}" value="{}">', FORM_FIELD, uuid.uuid4().hex)
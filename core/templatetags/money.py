@@ -0,0 +1,15 @@
+# core/templatetags/money.py
+from django import template
+
+from core.utils.currency import convert_from_usd
+
+register = template.Library()
+
+@register.filter
+def money(amount, currency):
+    """
+    USD amount in the display currency, to the cent: {{ asset.current_price|money:current_currency }}
+    Renders at the current rate; amounts that convert at the rate of their
+    day (see convert_many's `at`) are converted in the view instead.
+    """
+    return convert_from_usd(amount, currency)
@@ -1,3 +1,1623 @@
-from django.test import TestCase
+import asyncio
+from datetime import datetime, timedelta
+from datetime import timezone as dt_timezone
+from decimal import Decimal
+from io import StringIO
+import json
+import os
+import socket
+import tempfile
+import threading
+import time
+import uuid
+from types import SimpleNamespace
+from unittest import mock
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
 
-# Create your tests here.
+import numpy as np
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import IntegrityError, connection
+from django.db.models import Sum
+from django.http import HttpResponse
+from django.template import Context, Template
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from assets.models import Asset, PriceCandle, PriceTick
+from core.models import Currency, ExchangeRate, IdempotencyKey, PortfolioSummary, UnrealizedPnL
+from core.services import balances, candles, currencies, fx_rates, ledger, price_history, price_snapshot
+from core.services.idempotency import REPLAYED_HEADER, idempotent
+from core.services.mark_to_market import MarkToMarket
+from core.services.maturity import MaturityScheduler, notify_maturity
+from core.services.market_summary import MarketSummary
+from core.services.market_data import CircuitBreaker, HttpJsonProvider, MarketDataProvider, set_provider
+from core.services.portfolio import get_portfolio_summary, rebuild_portfolio_summaries
+from core.services.price_fetcher import PriceFetcher
+from core.services.price_snapshot import PriceSnapshotReader, PriceSnapshotWriter
+from core.services.price_stream import PriceBroadcaster, Subscriber, broadcaster, event_stream
+from core.services.price_tape import TapeRecorder, replay
+from core.services.settlement import settle_chunk, settle_investments, settlement_reference
+from core.services.ticker import PriceTicker
+from core.utils.currency import convert_from_usd, convert_many
+from investments.models import Investment
+from wallet.models import BalanceCheckpoint, LedgerEntry, Transaction, Wallet
+
+
+def make_user(username, **kwargs):
+    return get_user_model().objects.create_user(
+        username=username, email=f"{username}@example.com", phone=username, password='x', **kwargs
+    )
+
+
+def make_investment(user, asset, amount='100.00', hours=1, **kwargs):
+    amount = Decimal(amount)
+    return Investment.objects.create(
+        user=user, asset=asset, invested_amount=amount, duration_hours=hours,
+        end_time=timezone.now() + timedelta(hours=hours), expected_return_rate=Decimal('10.00'),
+        entry_price=asset.current_price, units=amount / asset.current_price, **kwargs
+    )
+
+
+def make_asset(symbol, price='100.000000', category='stock', **kwargs):
+    return Asset.objects.create(
+        name=symbol, symbol=symbol, category=category, current_price=Decimal(price), **kwargs
+    )
+
+
+class FixedProvider(MarketDataProvider):
+    """Quotes fixed prices; on_fetch runs while the quote is being fetched"""
+    name = 'fixed'
+
+    def __init__(self, prices, on_fetch=None):
+        self.prices = prices
+        self.on_fetch = on_fetch
+        self.calls = 0
+
+    def fetch_prices(self, symbols, categories, current_prices):
+        self.calls += 1
+        if self.on_fetch:
+            self.on_fetch()
+        return np.array([self.prices.get(symbol, np.nan) for symbol in symbols], dtype=np.float64)
+
+
+class ProviderTestMixin:
+
+    def use_provider(self, provider):
+        previous = set_provider(provider)
+        self.addCleanup(set_provider, previous)
+        return provider
+
+
+class UpdateAllPricesTests(ProviderTestMixin, TestCase):
+
+    def test_writes_quoted_prices(self):
+        asset = make_asset('AAA')
+        self.use_provider(FixedProvider({'AAA': 110.0}))
+
+        self.assertEqual(PriceFetcher.update_all_prices(only_stale=False), 1)
+
+        asset.refresh_from_db()
+        self.assertEqual(asset.current_price, Decimal('110.000000'))
+        self.assertEqual(asset.previous_price, Decimal('100.000000'))
+        self.assertEqual(asset.change_percentage, Decimal('10.00'))
+
+    def test_skips_assets_written_while_quoting(self):
+        moved = make_asset('AAA')
+        untouched = make_asset('BBB')
+
+        def concurrent_write():
+            # Another writer (e.g. update_asset_price) prices AAA during the fetch
+            moved.update_price(Decimal('105.000000'))
+
+        self.use_provider(FixedProvider({'AAA': 110.0, 'BBB': 120.0}, on_fetch=concurrent_write))
+
+        self.assertEqual(PriceFetcher.update_all_prices(only_stale=False), 1)
+
+        moved.refresh_from_db()
+        untouched.refresh_from_db()
+        self.assertEqual(moved.current_price, Decimal('105.000000'))
+        self.assertEqual(untouched.current_price, Decimal('120.000000'))
+
+
+
+class PriceTickerTests(ProviderTestMixin, TestCase):
+
+    def run_ticks(self, ticks, **kwargs):
+        return PriceTicker(interval=5, sleep=lambda seconds: None, **kwargs).run(max_ticks=ticks)
+
+    def test_every_tick_moves_every_active_asset(self):
+        make_asset('AAA')
+        make_asset('BBB')
+        make_asset('OFF', is_active=False)
+        self.use_provider(FixedProvider({'AAA': 101.0, 'BBB': 102.0}))
+
+        stats = self.run_ticks(3)
+
+        # Freshly priced assets are not skipped on the next tick
+        self.assertEqual(stats.assets_updated, 6)
+
+    def test_only_stale_skips_fresh_prices(self):
+        make_asset('AAA')
+        self.use_provider(FixedProvider({'AAA': 101.0}))
+
+        stats = self.run_ticks(2, only_stale=True)
+
+        self.assertEqual(stats.assets_updated, 0)
+
+
+class PriceTapeTests(TestCase):
+
+    def setUp(self):
+        self.assets = [make_asset('AAA'), make_asset('BBB', '50.000000'), make_asset('CCC', '7.500000')]
+        handle, self.path = tempfile.mkstemp(suffix='.tape')
+        os.close(handle)
+        self.addCleanup(os.remove, self.path)
+
+    def prices(self):
+        return dict(Asset.objects.values_list('symbol', 'current_price'))
+
+    def test_replay_reproduces_recorded_prices(self):
+        opening = self.prices()
+        recorder = TapeRecorder(self.path, [a.symbol for a in self.assets], seed=1)
+        PriceFetcher.recorder = recorder
+        self.addCleanup(setattr, PriceFetcher, 'recorder', None)
+        PriceFetcher.seed(1)
+
+        recorded = []
+        for tick in range(6):
+            if tick % 2:
+                # Single-asset ticks leave the other tape columns NaN
+                PriceFetcher.update_asset_price(Asset.objects.get(symbol='BBB'))
+            else:
+                PriceFetcher.update_all_prices(only_stale=False)
+            recorded.append(self.prices())
+        recorder.close()
+        PriceFetcher.recorder = None
+
+        for symbol, price in opening.items():
+            Asset.objects.filter(symbol=symbol).update(current_price=price)
+        replayed = []
+        # A different seed: nothing on the tape may be re-simulated
+        replay(self.path, speed=0, seed=99, on_tick=lambda stats: replayed.append(self.prices()))
+
+        self.assertEqual(replayed, recorded)
+
+
+class CandleTests(TestCase):
+
+    def setUp(self):
+        self.asset = make_asset('AAA')
+        self.noon = datetime(2026, 3, 1, 12, 0, 30, tzinfo=dt_timezone.utc)
+
+    def tick(self, price, when):
+        self.asset.current_price = Decimal(price)
+        candles.update_candles([self.asset], when)
+
+    def candle(self, interval, when):
+        candle = PriceCandle.objects.get(
+            asset=self.asset, interval=interval, bucket_start=candles.bucket_start(when, interval),
+        )
+        return candle.open, candle.high, candle.low, candle.close, candle.tick_count
+
+    def test_ticks_merge_into_the_open_candle(self):
+        for price, seconds in (('100', 0), ('105', 5), ('95', 10), ('102', 15)):
+            self.tick(price, self.noon + timedelta(seconds=seconds))
+
+        for interval in candles.INTERVALS:
+            self.assertEqual(self.candle(interval, self.noon), (100.0, 105.0, 95.0, 102.0, 4))
+
+    def test_bucket_rollover(self):
+        self.tick('100', self.noon)
+        self.tick('110', self.noon + timedelta(minutes=1))
+
+        self.assertEqual(self.candle('1m', self.noon), (100.0, 100.0, 100.0, 100.0, 1))
+        self.assertEqual(self.candle('1m', self.noon + timedelta(minutes=1)), (110.0, 110.0, 110.0, 110.0, 1))
+        self.assertEqual(self.candle('5m', self.noon), (100.0, 110.0, 100.0, 110.0, 2))
+        self.assertEqual(PriceCandle.objects.filter(interval='1m').count(), 2)
+
+    def test_concurrent_tick_opening_the_same_bucket(self):
+        bulk_create = PriceCandle.objects.bulk_create
+
+        def other_tick_first(objs, **kwargs):
+            # Another tick opens these buckets between this tick's read and its insert
+            for candle in objs:
+                PriceCandle.objects.create(
+                    asset_id=candle.asset_id, interval=candle.interval, bucket_start=candle.bucket_start,
+                    open=90.0, high=90.0, low=90.0, close=90.0, tick_count=1,
+                )
+            return bulk_create(objs, **kwargs)
+
+        with mock.patch.object(PriceCandle.objects, 'bulk_create', side_effect=other_tick_first):
+            self.tick('100', self.noon)
+
+        for interval in candles.INTERVALS:
+            self.assertEqual(self.candle(interval, self.noon), (90.0, 100.0, 90.0, 100.0, 2))
+
+    def test_24h_stats_from_hourly_candles(self):
+        other = make_asset('BBB')
+        for hours, price in ((30, '50'), (20, '100'), (10, '130'), (1, '90'), (0, '120')):
+            self.tick(price, self.noon - timedelta(hours=hours))
+        candles.update_candles([other], self.noon)
+
+        stats = candles.get_24h_stats([self.asset.id], now=self.noon)
+
+        self.assertEqual(list(stats), [self.asset.id])
+        entry = stats[self.asset.id]
+        # The candle from 30 hours ago is outside the window
+        self.assertEqual((entry['open_24h'], entry['high_24h'], entry['low_24h']), (100.0, 130.0, 90.0))
+        self.assertEqual(entry['sparkline'], [100.0, 130.0, 90.0, 120.0])
+        self.assertAlmostEqual(entry['change_24h'], 20.0)
+        self.assertEqual(set(candles.get_24h_stats(now=self.noon)), {self.asset.id, other.id})
+
+
+class PriceSeriesTests(TestCase):
+
+    def setUp(self):
+        self.asset = make_asset('AAA')
+        self.now = timezone.now().replace(microsecond=0)
+        patcher = mock.patch.object(price_history, 'lttb', wraps=price_history.lttb)
+        self.lttb = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def add_ticks(self, count, every):
+        PriceTick.objects.bulk_create([
+            PriceTick(asset=self.asset, price=100.0 + i, timestamp=self.now - every * i) for i in range(count)
+        ])
+
+    def add_candles(self, interval, count, every):
+        PriceCandle.objects.bulk_create([
+            PriceCandle(
+                asset=self.asset, interval=interval, bucket_start=self.now - every * i,
+                open=1.0, high=1.0, low=1.0, close=float(i), tick_count=1,
+            )
+            for i in range(count)
+        ])
+
+    def rows_read(self):
+        (timestamps, _, _), _ = self.lttb.call_args
+        return len(timestamps)
+
+    def test_long_range_reads_hourly_candles_not_ticks(self):
+        self.add_ticks(2000, timedelta(minutes=20))
+        self.add_candles('1h', 24 * 30, timedelta(hours=1))
+        self.add_candles('5m', 100, timedelta(minutes=5))
+
+        with self.assertNumQueries(1):
+            timestamps, prices = price_history.get_price_series(self.asset, self.now - timedelta(days=30), self.now)
+
+        self.assertEqual(self.rows_read(), 24 * 30)
+        self.assertLessEqual(self.rows_read(), price_history.MAX_SOURCE_ROWS)
+        self.assertEqual(len(timestamps), price_history.DEFAULT_POINTS)
+        self.assertEqual((prices[0], prices[-1]), (24 * 30 - 1, 0))
+
+    def test_short_range_reads_ticks(self):
+        self.add_ticks(100, timedelta(seconds=30))
+        self.add_candles('1m', 60, timedelta(minutes=1))
+
+        timestamps, _ = price_history.get_price_series(self.asset, self.now - timedelta(hours=1), self.now)
+
+        self.assertEqual(self.rows_read(), 100)
+        self.assertEqual(timestamps[-1], self.now.timestamp())
+
+    def test_more_ticks_than_expected_fall_back_to_candles(self):
+        # A ticker running faster than PRICE_TICK_INTERVAL_SECONDS
+        self.add_ticks(80, timedelta(seconds=2))
+        self.add_candles('1m', 4, timedelta(minutes=1))
+
+        with mock.patch.object(price_history, 'MAX_SOURCE_ROWS', 50), self.assertNumQueries(2):
+            price_history.get_price_series(self.asset, self.now - timedelta(seconds=200), self.now)
+
+        self.assertEqual(self.rows_read(), 4)
+
+
+def quote(symbol, change, category='stock'):
+    return SimpleNamespace(symbol=symbol, category=category, change_percentage=Decimal(change))
+
+
+class MarketSummaryTests(SimpleTestCase):
+
+    def test_counts_averages_and_movers(self):
+        summary = MarketSummary(top_n=2)
+        summary.update([quote('A', '5'), quote('B', '-3'), quote('C', '10'), quote('X', '1', 'crypto')])
+
+        result = summary.as_dict()
+        self.assertEqual(set(result), {'all', 'stock', 'crypto'})
+        self.assertEqual((result['all']['count'], result['all']['avg_change']), (4, 3.25))
+        self.assertEqual((result['stock']['count'], result['stock']['avg_change']), (3, 4.0))
+        self.assertEqual((result['stock']['gainers'], result['stock']['losers']), (['C', 'A'], ['B', 'A']))
+        self.assertEqual((result['crypto']['gainers'], result['crypto']['losers']), (['X'], ['X']))
+
+    def test_update_replaces_an_assets_previous_change(self):
+        summary = MarketSummary()
+        summary.update([quote('A', '5'), quote('B', '-3')])
+        summary.update([quote('A', '-7')])
+        # Moving category takes the asset out of the old one
+        summary.update([quote('B', '2', 'forex')])
+
+        result = summary.as_dict()
+        self.assertEqual((result['all']['count'], result['all']['avg_change']), (2, -2.5))
+        self.assertEqual((result['stock']['count'], result['stock']['losers']), (1, ['A']))
+        self.assertEqual(result['forex']['gainers'], ['B'])
+
+    def test_remove(self):
+        summary = MarketSummary()
+        summary.update([quote('A', '5'), quote('X', '1', 'crypto')])
+
+        summary.remove('X')
+        summary.remove('missing')
+
+        result = summary.as_dict()
+        self.assertNotIn('crypto', result)
+        self.assertEqual((result['all']['count'], result['all']['avg_change'], result['all']['gainers']), (1, 5.0, ['A']))
+
+
+class PriceSnapshotTests(TestCase):
+
+    def setUp(self):
+        # Reader and writer share this process and its resource tracker registration
+        patcher = mock.patch.object(price_snapshot, 'resource_tracker')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.name = f"test_prices_{uuid.uuid4().hex[:8]}"
+        self.writer = PriceSnapshotWriter(name=self.name, capacity=16)
+        self.addCleanup(lambda: self.writer.close())
+        self.reader = reader = PriceSnapshotReader(name=self.name)
+        self.addCleanup(reader._detach)
+        previous, price_snapshot._reader = price_snapshot._reader, reader
+        self.addCleanup(setattr, price_snapshot, '_reader', previous)
+
+    def test_deactivated_assets_are_not_served(self):
+        kept = make_asset('AAA')
+        dropped = make_asset('BBB')
+        self.writer.publish(Asset.objects.all())
+        self.assertEqual(set(price_snapshot.get_latest_prices()), {'AAA', 'BBB'})
+
+        dropped.is_active = False
+        dropped.save()
+        # The next tick only carries active assets
+        self.writer([kept])
+
+        self.assertEqual(set(price_snapshot.get_latest_prices()), {'AAA'})
+        self.assertEqual(price_snapshot.price_version()[1], 1)
+        # Same answer as the database fallback
+        price_snapshot._reader = PriceSnapshotReader(name='test_prices_missing')
+        self.assertEqual(set(price_snapshot.get_latest_prices()), {'AAA'})
+
+    def test_reactivated_asset_is_served_again(self):
+        asset = make_asset('AAA')
+        self.writer.publish([asset], active=[])
+        self.assertEqual(price_snapshot.get_latest_prices(), {})
+
+        self.writer([asset])
+
+        self.assertEqual(set(price_snapshot.get_latest_prices()), {'AAA'})
+
+    def test_reader_gives_up_while_a_write_is_in_progress(self):
+        self.writer.publish([make_asset('AAA')])
+        self.writer.seq += 1
+        self.writer._write_header()
+
+        with self.assertLogs(price_snapshot.logger, 'WARNING'):
+            self.assertIsNone(self.reader.read())
+
+        self.writer.seq += 1
+        self.writer._write_header()
+        self.assertEqual(list(self.reader.read()['symbol']), [b'AAA'])
+
+    def test_reader_retries_a_torn_read(self):
+        asset = make_asset('AAA')
+        self.writer.publish([asset])
+        copies = []
+
+        def copy_out(count, layout, summary_length):
+            copies.append(self.reader.records[:count].copy())
+            if len(copies) == 1:
+                # A tick lands while the reader is copying
+                asset.current_price = Decimal('120.000000')
+                self.writer.publish([asset])
+            return copies[-1]
+
+        records = self.reader._consistent(copy_out)
+
+        self.assertEqual(len(copies), 2)
+        self.assertEqual(records['price'].tolist(), [120.0])
+
+    def test_reader_reattaches_to_a_replacement_segment(self):
+        self.writer.publish([make_asset('AAA')])
+        self.assertEqual(set(self.reader.prices()), {'AAA'})
+
+        # The ticker restarts: the old segment is retired and a new one published
+        self.writer.close()
+        self.writer = PriceSnapshotWriter(name=self.name, capacity=16)
+        self.writer.publish([make_asset('BBB')])
+
+        self.assertEqual(set(self.reader.prices()), {'BBB'})
+
+    def test_deactivated_assets_leave_the_summary(self):
+        for symbol, change in (('AAA', '5'), ('BBB', '-3'), ('CCC', '10'), ('DDD', '20')):
+            make_asset(symbol, change_percentage=Decimal(change))
+        make_asset('XXX', category='crypto', change_percentage=Decimal('1'))
+        Asset.objects.filter(symbol__in=['DDD', 'XXX']).update(is_active=False)
+
+        self.writer(Asset.objects.all())
+
+        summary = self.reader.summary()
+        self.assertEqual(set(summary), {'all', 'stock'})
+        self.assertEqual((summary['stock']['count'], summary['stock']['avg_change']), (3, 4.0))
+        self.assertEqual(summary['all']['gainers'], ['CCC', 'AAA', 'BBB'])
+
+    def test_assets_view_movers_and_counts(self):
+        Currency.objects.create(code='USD', name='US Dollar', symbol='$')
+        currencies.bump_version()
+        self.client.force_login(make_user('trader'))
+        for symbol, change in (('AAA', '5'), ('BBB', '-3'), ('CCC', '10'), ('DDD', '20')):
+            make_asset(symbol, change_percentage=Decimal(change))
+        make_asset('XXX', category='crypto', change_percentage=Decimal('1'))
+        self.writer(Asset.objects.all())
+        Asset.objects.filter(symbol='DDD').update(is_active=False)
+        self.writer(Asset.objects.filter(is_active=True))
+
+        context = self.client.get(reverse('core:assets')).context
+        counts = {cat['id']: (cat['count'], cat['avg_change']) for cat in context['categories']}
+        self.assertEqual(counts, {'all': (4, 3.25), 'crypto': (1, 1.0), 'forex': (0, 0), 'futures': (0, 0), 'stock': (3, 4.0)})
+        self.assertEqual([asset.symbol for asset in context['top_gainers']], ['CCC', 'AAA', 'XXX', 'BBB'])
+        self.assertEqual([asset.symbol for asset in context['top_losers']], ['BBB', 'XXX', 'AAA', 'CCC'])
+
+        context = self.client.get(reverse('core:assets'), {'category': 'stock'}).context
+        self.assertEqual([asset.symbol for asset in context['top_gainers']], ['CCC', 'AAA', 'BBB'])
+        self.assertEqual([asset.symbol for asset in context['top_losers']], ['BBB', 'AAA', 'CCC'])
+
+    def test_symbols_up_to_the_field_length_are_published(self):
+        longest = make_asset('A' * 20)
+        too_long = make_asset('\u00c9' * 11)
+
+        with self.assertLogs(price_snapshot.logger, 'WARNING'):
+            self.writer(Asset.objects.all())
+
+        self.assertEqual(set(price_snapshot.get_latest_prices()), {longest.symbol})
+        self.assertEqual(price_snapshot.price_version()[1], 1)
+        self.assertNotIn(too_long.symbol, self.writer.slots)
+
+    def published(self, asset, price, seconds):
+        """Publish a tick for asset that the database row has not seen"""
+        tick = Asset.objects.get(pk=asset.pk)
+        tick.previous_price, tick.current_price = tick.current_price, Decimal(price)
+        tick.change_percentage = (tick.current_price - tick.previous_price) / tick.previous_price * 100
+        tick.last_updated = asset.last_updated + timedelta(seconds=seconds)
+        self.writer.publish([tick])
+
+    def test_overlay_uses_newer_snapshot_prices(self):
+        fresh = make_asset('AAA')
+        older = make_asset('BBB')
+        unpublished = make_asset('CCC')
+        ticked_at = fresh.last_updated + timedelta(seconds=5)
+        self.published(fresh, '123.45', 5)
+        self.published(older, '50', -5)
+
+        with self.assertNumQueries(0):
+            rows = price_snapshot.overlay_latest_prices([fresh, older, unpublished])
+
+        self.assertEqual(
+            [(row.current_price, row.previous_price, row.change_percentage) for row in rows],
+            [(Decimal('123.450000'), Decimal('100.000000'), Decimal('23.45')),
+             (Decimal('100.000000'), Decimal('0.000000'), Decimal('0.00')),
+             (Decimal('100.000000'), Decimal('0.000000'), Decimal('0.00'))],
+        )
+        self.assertAlmostEqual(rows[0].last_updated.timestamp(), ticked_at.timestamp(), places=5)
+
+    def test_pages_render_snapshot_prices(self):
+        Currency.objects.create(code='USD', name='US Dollar', symbol='$')
+        currencies.bump_version()
+        self.client.force_login(make_user('trader'))
+        asset = make_asset('AAA')
+        make_asset('BBB')
+        self.published(asset, '123.45', 5)
+
+        pages = [
+            (reverse('core:home'), 'market_assets'),
+            (reverse('core:assets'), 'market_assets'),
+            (reverse('investments:asset_detail', args=[make_asset('CCC').pk]), 'similar_assets'),
+            (reverse('investments:asset_detail', args=[asset.pk]), 'asset'),
+        ]
+        for url, name in pages:
+            with self.subTest(url=url):
+                rows = self.client.get(url).context[name]
+                rows = rows if isinstance(rows, list) else [rows]
+                prices = {row.symbol: row.current_price for row in rows}
+                self.assertEqual(prices['AAA'], Decimal('123.450000'))
+
+
+def latest(price, change=0.0, updated=1767225600):
+    return {'price': price, 'change': change, 'updated': datetime.fromtimestamp(updated, tz=dt_timezone.utc)}
+
+
+class PriceApiTests(TestCase):
+
+    def setUp(self):
+        # No ticker publishing: prices come from the Asset table
+        previous, price_snapshot._reader = price_snapshot._reader, PriceSnapshotReader(name='test_prices_missing')
+        self.addCleanup(setattr, price_snapshot, '_reader', previous)
+        self.client.force_login(make_user('poller'))
+        self.url = reverse('price_api')
+        self.early = make_asset('AAA')
+        self.late = make_asset('BBB', '50.000000')
+        Asset.objects.filter(pk=self.early.pk).update(last_updated=datetime(2026, 1, 1, tzinfo=dt_timezone.utc))
+        Asset.objects.filter(pk=self.late.pk).update(last_updated=datetime(2026, 1, 2, tzinfo=dt_timezone.utc))
+
+    def test_full_response_and_304(self):
+        response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertTrue(data['full'])
+        self.assertEqual(data['seq'], price_snapshot.to_seq(datetime(2026, 1, 2, tzinfo=dt_timezone.utc).timestamp()))
+        self.assertEqual(data['prices'], {'AAA': [100.0, 0.0, 1767225600], 'BBB': [50.0, 0.0, 1767312000]})
+        self.assertEqual(response['ETag'], f'"{data["seq"]}-2"')
+
+        self.assertEqual(self.client.get(self.url, headers={'If-None-Match': response['ETag']}).status_code, 304)
+
+    def test_since_returns_only_changed_rows(self):
+        since = price_snapshot.to_seq(datetime(2026, 1, 1, 12, tzinfo=dt_timezone.utc).timestamp())
+
+        data = self.client.get(self.url, {'since': since}).json()
+
+        self.assertFalse(data['full'])
+        self.assertEqual(list(data['prices']), ['BBB'])
+
+    def test_malformed_since(self):
+        for since in ('yesterday', '1.5', str(10 ** 30)):
+            with self.subTest(since=since):
+                self.assertEqual(self.client.get(self.url, {'since': since}).status_code, 400)
+
+    def test_etag_changes_after_a_tick(self):
+        etag = self.client.get(self.url)['ETag']
+
+        self.early.update_price(Decimal('101'))
+
+        response = self.client.get(self.url, headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.json()['prices']['AAA'][0], 101.0)
+
+
+class PriceStreamTests(SimpleTestCase):
+
+    def setUp(self):
+        patcher = mock.patch('core.services.price_stream.get_latest_prices')
+        self.get_latest_prices = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.get_latest_prices.return_value = {}
+
+    def test_subscriber_coalesces_pending_ticks(self):
+        async def run():
+            subscriber = Subscriber()
+            subscriber.push({'AAA': [1.0, 0.0, 1]})
+            subscriber.push({'AAA': [2.0, 0.0, 2], 'BBB': [3.0, 0.0, 2]})
+            self.assertTrue(subscriber.ready.is_set())
+            self.assertEqual(subscriber.take(), {'AAA': [2.0, 0.0, 2], 'BBB': [3.0, 0.0, 2]})
+            self.assertFalse(subscriber.ready.is_set())
+            self.assertEqual(subscriber.take(), {})
+
+        asyncio.run(run())
+
+    def test_poll_sends_only_changed_symbols(self):
+        async def run():
+            prices = PriceBroadcaster()
+            self.get_latest_prices.return_value = {'AAA': latest(1.0), 'BBB': latest(2.0)}
+            self.assertEqual(set(await prices._poll()), {'AAA', 'BBB'})
+
+            self.get_latest_prices.return_value = {'AAA': latest(1.0), 'BBB': latest(2.5, 25.0)}
+            self.assertEqual(await prices._poll(), {'BBB': [2.5, 25.0, 1767225600]})
+            self.assertEqual(await prices._poll(), {})
+
+        asyncio.run(run())
+
+    @override_settings(PRICE_STREAM_MAX_CONNECTIONS=2, PRICE_STREAM_POLL_SECONDS=0.01)
+    def test_connection_cap(self):
+        async def run():
+            prices = PriceBroadcaster()
+            prices.latest = {'AAA': [1.0, 0.0, 1]}
+            first = prices.subscribe()
+            self.assertIsNotNone(prices.subscribe())
+            self.assertIsNone(prices.subscribe())
+            # A new connection starts from the latest prices
+            self.assertEqual(first.take(), {'AAA': [1.0, 0.0, 1]})
+
+            prices.unsubscribe(first)
+            self.assertIsNotNone(prices.subscribe())
+            prices.subscribers.clear()
+            await prices._task
+
+        asyncio.run(run())
+
+    @override_settings(PRICE_STREAM_HEARTBEAT_SECONDS=0.05, PRICE_STREAM_MAX_SECONDS=0.2)
+    def test_event_stream(self):
+        async def run():
+            subscriber = Subscriber()
+            broadcaster.subscribers.add(subscriber)
+            subscriber.push({'AAA': [1.0, 0.0, 1]})
+            subscriber.push({'AAA': [2.0, 0.0, 2]})
+
+            frames = [frame async for frame in event_stream(subscriber)]
+
+            self.assertEqual(frames[0], 'retry: 5000\n\n')
+            self.assertEqual(frames[1], 'event: prices\ndata: {"AAA":[2.0,0.0,2]}\n\n')
+            self.assertIn(': ping\n\n', frames[2:])
+            self.assertNotIn(subscriber, broadcaster.subscribers)
+
+        asyncio.run(run())
+
+
+class PriceStreamViewTests(TestCase):
+
+    def setUp(self):
+        self.user = make_user('viewer')
+        self.url = reverse('core:price_stream')
+
+    def test_wsgi_gets_501(self):
+        self.client.force_login(self.user)
+
+        self.assertEqual(self.client.get(self.url).status_code, 501)
+
+    async def test_asgi_requires_login(self):
+        response = await self.async_client.get(self.url)
+
+        self.assertEqual(response.status_code, 401)
+
+    @override_settings(PRICE_STREAM_MAX_CONNECTIONS=0)
+    async def test_asgi_over_the_cap_gets_503(self):
+        await self.async_client.aforce_login(self.user)
+
+        response = await self.async_client.get(self.url)
+
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '30')
+
+
+class StubPriceHandler(BaseHTTPRequestHandler):
+    """Prices every requested symbol at 100; the server sets status and delay"""
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        symbols = [s for s in parse_qs(urlparse(self.path).query).get('symbols', [''])[0].split(',') if s]
+        with self.server.lock:
+            self.server.batches.append(symbols)
+        time.sleep(self.server.delay)
+        if self.server.status == 200:
+            body = json.dumps({'prices': {symbol: 100.0 for symbol in symbols}}).encode()
+        else:
+            body = b'{"error": "unavailable"}'
+        self.send_response(self.server.status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Clients that timed out leave broken pipes behind; not interesting here
+        pass
+
+
+class StubServerMixin:
+
+    def start_stub(self, handler, status=200, delay=0.0):
+        server = StubServer(('127.0.0.1', 0), handler)
+        server.lock = threading.Lock()
+        server.batches = []
+        server.status = status
+        server.delay = delay
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        host, port = server.server_address
+        return server, f"http://{host}:{port}/"
+
+    def http_provider(self, url, **kwargs):
+        provider = HttpJsonProvider(url, **kwargs)
+        self.addCleanup(provider.close)
+        return provider
+
+
+class FakeClock:
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class CircuitBreakerTests(SimpleTestCase):
+
+    def test_opens_after_threshold(self):
+        breaker = CircuitBreaker(failure_threshold=2, reset_timeout=30, clock=FakeClock())
+        breaker.record_failure()
+        self.assertTrue(breaker.allow_request())
+        breaker.record_failure()
+        self.assertTrue(breaker.is_open)
+        self.assertFalse(breaker.allow_request())
+
+    def test_half_open_lets_one_trial_through(self):
+        clock = FakeClock()
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30, clock=clock)
+        breaker.record_failure()
+        clock.now += 30
+
+        self.assertTrue(breaker.allow_request())
+        self.assertFalse(breaker.allow_request())
+        self.assertFalse(breaker.allow_request())
+
+        breaker.record_success()
+        self.assertFalse(breaker.is_open)
+        self.assertTrue(breaker.allow_request())
+        self.assertTrue(breaker.allow_request())
+
+    def test_failed_trial_reopens(self):
+        clock = FakeClock()
+        breaker = CircuitBreaker(failure_threshold=3, reset_timeout=30, clock=clock)
+        for _ in range(3):
+            breaker.record_failure()
+        clock.now += 30
+        self.assertTrue(breaker.allow_request())
+
+        breaker.record_failure()
+        self.assertFalse(breaker.allow_request())
+        clock.now += 29
+        self.assertFalse(breaker.allow_request())
+        clock.now += 1
+        self.assertTrue(breaker.allow_request())
+
+
+class HttpJsonProviderTests(StubServerMixin, SimpleTestCase):
+
+    def fetch(self, provider, symbols):
+        return provider.fetch_prices(symbols, ['stock'] * len(symbols), np.ones(len(symbols)))
+
+    def test_batches_symbols(self):
+        server, url = self.start_stub(StubPriceHandler)
+        provider = self.http_provider(url, batch_size=2, max_workers=2)
+
+        prices = self.fetch(provider, ['A', 'B', 'C', 'D', 'E'])
+
+        np.testing.assert_array_equal(prices, [100.0] * 5)
+        self.assertEqual(sorted(server.batches), [['A', 'B'], ['C', 'D'], ['E']])
+
+    def test_timeout_leaves_batch_unpriced(self):
+        server, url = self.start_stub(StubPriceHandler, delay=1.0)
+        provider = self.http_provider(url, timeout=0.1)
+
+        started = time.monotonic()
+        with self.assertLogs('core.services.market_data', 'WARNING'):
+            prices = self.fetch(provider, ['A', 'B'])
+
+        self.assertLess(time.monotonic() - started, 0.9)
+        self.assertTrue(np.isnan(prices).all())
+        self.assertEqual(provider.breaker.failures, 1)
+
+    def test_breaker_stops_calling_failing_upstream(self):
+        server, url = self.start_stub(StubPriceHandler, status=503)
+        provider = self.http_provider(url, batch_size=1, max_workers=1, failure_threshold=2)
+
+        with self.assertLogs('core.services.market_data', 'WARNING') as logs:
+            prices = self.fetch(provider, ['A', 'B', 'C', 'D'])
+
+        self.assertEqual(len(logs.records), 2)
+        self.assertTrue(np.isnan(prices).all())
+        self.assertEqual(len(server.batches), 2)
+        self.assertTrue(provider.breaker.is_open)
+
+    def test_half_open_recovery(self):
+        server, url = self.start_stub(StubPriceHandler, status=503)
+        provider = self.http_provider(url, batch_size=1, max_workers=4, failure_threshold=1, reset_timeout=30)
+        clock = FakeClock()
+        provider.breaker.clock = clock
+        with self.assertLogs('core.services.market_data', 'WARNING'):
+            self.fetch(provider, ['A'])
+        self.assertTrue(provider.breaker.is_open)
+
+        # Upstream recovers; after the timeout a single (slow) trial goes out
+        server.status = 200
+        server.delay = 0.3
+        server.batches.clear()
+        clock.now += 30
+        prices = self.fetch(provider, ['A', 'B', 'C', 'D'])
+
+        self.assertEqual(len(server.batches), 1)
+        self.assertEqual(int((~np.isnan(prices)).sum()), 1)
+        self.assertFalse(provider.breaker.is_open)
+
+        server.delay = 0.0
+        prices = self.fetch(provider, ['A', 'B', 'C', 'D'])
+        np.testing.assert_array_equal(prices, [100.0] * 4)
+
+
+class QuoteFallbackTests(StubServerMixin, ProviderTestMixin, SimpleTestCase):
+
+    def test_unpriced_symbols_are_simulated(self):
+        server, url = self.start_stub(StubPriceHandler, status=500)
+        self.use_provider(self.http_provider(url, failure_threshold=1))
+
+        with self.assertLogs('core.services.market_data', 'WARNING'):
+            prices = PriceFetcher.quote(['BTC', 'AAPL'], ['crypto', 'stock'], np.array([65000.0, 190.0]))
+
+        self.assertTrue(np.isfinite(prices).all())
+        self.assertTrue((prices > 0).all())
+        # Simulated moves stay within a few percent of the current price
+        np.testing.assert_allclose(prices, [65000.0, 190.0], rtol=0.05)
+
+    def test_provider_prices_are_kept(self):
+        self.use_provider(FixedProvider({'AAPL': 200.0}))
+
+        prices = PriceFetcher.quote(['BTC', 'AAPL'], ['crypto', 'stock'], np.array([65000.0, 190.0]))
+
+        self.assertEqual(prices[1], 200.0)
+        self.assertGreater(prices[0], 0)
+
+
+class IdempotencyTests(TestCase):
+
+    def setUp(self):
+        self.user = make_user('payer')
+        self.factory = RequestFactory()
+        self.calls = 0
+        self.status = 302
+
+        @idempotent
+        def view(request):
+            self.calls += 1
+            response = HttpResponse(f"call {self.calls}", status=self.status)
+            if self.status == 302:
+                response['Location'] = '/wallet/'
+            return response
+
+        self.view = view
+
+    def post(self, key='k1', **data):
+        request = self.factory.post('/wallet/deposit/', {'amount': '10', **data}, HTTP_IDEMPOTENCY_KEY=key)
+        request.user = self.user
+        return self.view(request)
+
+    def test_retry_replays_stored_response(self):
+        first = self.post()
+        retry = self.post()
+
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(retry.status_code, 302)
+        self.assertEqual(retry['Location'], '/wallet/')
+        self.assertEqual(retry.content, first.content)
+        self.assertEqual(retry[REPLAYED_HEADER], 'true')
+
+    def test_key_reused_for_different_request_conflicts(self):
+        self.post()
+
+        self.assertEqual(self.post(amount='20').status_code, 422)
+        self.assertEqual(self.calls, 1)
+
+    def test_retry_while_in_progress_gets_409(self):
+        IdempotencyKey.objects.create(
+            user=self.user, key='k1', endpoint='/wallet/deposit/', fingerprint='x',
+            expires_at=timezone.now() + timedelta(days=1),
+        )
+
+        response = self.post()
+
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(self.calls, 0)
+
+    @override_settings(IDEMPOTENCY_CLAIM_TIMEOUT_SECONDS=60)
+    def test_abandoned_claim_is_taken_over_after_lease(self):
+        abandoned = IdempotencyKey.objects.create(
+            user=self.user, key='k1', endpoint='/wallet/deposit/', fingerprint='x',
+            claimed_at=timezone.now() - timedelta(seconds=61),
+            expires_at=timezone.now() + timedelta(days=1),
+        )
+
+        response = self.post()
+
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(self.calls, 1)
+        self.assertFalse(IdempotencyKey.objects.filter(pk=abandoned.pk).exists())
+        self.assertEqual(IdempotencyKey.objects.get(key='k1').status_code, 302)
+
+    def test_server_error_releases_key(self):
+        self.status = 500
+        self.post()
+        self.status = 302
+
+        self.assertEqual(self.post().status_code, 302)
+        self.assertEqual(self.calls, 2)
+
+    def test_expired_response_runs_again(self):
+        self.post()
+        IdempotencyKey.objects.update(expires_at=timezone.now())
+
+        self.post()
+
+        self.assertEqual(self.calls, 2)
+
+
+class BalanceTests(TestCase):
+
+    def setUp(self):
+        self.wallet = Wallet.objects.create(user=make_user('saver'), available_balance=Decimal('100.00'))
+
+    def balances(self):
+        self.wallet.refresh_from_db()
+        return self.wallet.available_balance, self.wallet.locked_balance, self.wallet.bonus_balance
+
+    def test_debit_lock_and_release(self):
+        balances.debit(self.wallet, '30', reference='D1')
+        balances.lock(self.wallet, '50', reference='L1')
+        self.assertEqual(self.balances(), (Decimal('20.00'), Decimal('50.00'), Decimal('0.00')))
+
+        balances.release(self.wallet, '50', '55.50', reference='R1')
+        self.assertEqual(self.balances(), (Decimal('75.50'), Decimal('0.00'), Decimal('0.00')))
+
+        # One balanced journal per change; only the debit left the platform
+        journals = LedgerEntry.objects.values('reference').annotate(total=Sum('amount'))
+        self.assertEqual({row['reference']: row['total'] for row in journals}, {'D1': 0, 'L1': 0, 'R1': 0})
+        self.assertEqual(
+            LedgerEntry.objects.get(reference='D1', account=LedgerEntry.EXTERNAL).amount, Decimal('30.00')
+        )
+
+    def test_insufficient_funds_change_nothing(self):
+        conflicts = balances.lock_stats.conflicts
+
+        with self.assertRaises(balances.InsufficientFunds):
+            balances.debit(self.wallet, '100.01')
+        with self.assertRaises(balances.InsufficientFunds):
+            balances.lock(self.wallet, '150')
+        with self.assertRaises(balances.InsufficientFunds):
+            # Both sides are checked: the bonus cannot cover its part
+            balances.adjust(self.wallet, available_balance=-10, bonus_balance=-10)
+
+        self.assertEqual(self.balances(), (Decimal('100.00'), Decimal('0.00'), Decimal('0.00')))
+        self.assertFalse(LedgerEntry.objects.exists())
+        self.assertEqual(balances.lock_stats.conflicts, conflicts + 3)
+
+    def test_condition_is_checked_against_the_row_not_the_instance(self):
+        stale = Wallet.objects.get(pk=self.wallet.pk)
+        Wallet.objects.filter(pk=self.wallet.pk).update(available_balance=Decimal('40.00'), currency='KES')
+
+        with self.assertRaises(balances.InsufficientFunds):
+            balances.debit(stale, '50')
+        balances.debit(stale, '40')
+
+        # Only the balance column was written, from the row's value
+        self.wallet.refresh_from_db()
+        self.assertEqual((self.wallet.available_balance, self.wallet.currency), (Decimal('0.00'), 'KES'))
+
+    def test_allow_negative_and_unknown_fields(self):
+        balances.release(self.wallet, '10', '0')
+        self.assertEqual(self.balances(), (Decimal('100.00'), Decimal('-10.00'), Decimal('0.00')))
+
+        with self.assertRaises(ValueError):
+            balances.adjust(self.wallet, bonus_claimed=1)
+
+    def test_welcome_bonus_is_claimed_once(self):
+        self.assertTrue(balances.claim_welcome_bonus(self.wallet))
+        self.assertFalse(balances.claim_welcome_bonus(self.wallet))
+
+        self.assertEqual(self.balances()[2], balances.WELCOME_BONUS)
+        self.assertEqual(LedgerEntry.objects.filter(reference=balances.welcome_bonus_reference(self.wallet.pk)).count(), 2)
+
+
+class LedgerTests(TestCase):
+
+    def setUp(self):
+        self.wallets = [Wallet.objects.create(user=make_user(f"holder{i}")) for i in range(3)]
+        for wallet in self.wallets:
+            balances.credit(wallet, '100')
+            balances.lock(wallet, '40')
+        balances.claim_welcome_bonus(self.wallets[0])
+        balances.release(self.wallets[1], '40', '44')
+
+    def projected(self, wallet):
+        wallet.refresh_from_db()
+        return {field: getattr(wallet, field) for field in ledger.BALANCE_FIELDS}
+
+    def test_journals_balance_and_replay_to_the_wallet_balances(self):
+        totals = LedgerEntry.objects.values('journal').annotate(total=Sum('amount')).values_list('total', flat=True)
+        self.assertEqual(set(totals), {0})
+
+        replayed = ledger.ledger_balances([wallet.pk for wallet in self.wallets])
+        for wallet in self.wallets:
+            self.assertEqual(replayed[wallet.pk][0], self.projected(wallet))
+
+    def test_checkpoints_only_wallets_with_new_postings(self):
+        result = ledger.checkpoint_wallets(batch_size=2)
+        self.assertEqual((result.wallets, result.checkpointed, result.mismatches), (3, 3, []))
+
+        balances.debit(self.wallets[2], '10')
+        result = ledger.checkpoint_wallets(batch_size=2)
+        self.assertEqual((result.wallets, result.checkpointed), (3, 1))
+
+        checkpoint = BalanceCheckpoint.objects.filter(wallet=self.wallets[2]).latest('last_entry_id')
+        self.assertEqual(checkpoint.available_balance, Decimal('50.00'))
+
+    def test_replay_starts_after_the_checkpoint(self):
+        wallet = self.wallets[0]
+        ledger.checkpoint_wallets(wallet_ids=[wallet.pk])
+        balances.debit(wallet, '5')
+        # Postings covered by the checkpoint are no longer read
+        checkpoint = BalanceCheckpoint.objects.get(wallet=wallet)
+        LedgerEntry.objects.filter(wallet=wallet, id__lte=checkpoint.last_entry_id).delete()
+
+        replayed, checkpoint_id, last_entry_id = ledger.ledger_balances([wallet.pk])[wallet.pk]
+
+        self.assertEqual(replayed, self.projected(wallet))
+        self.assertEqual(checkpoint_id, checkpoint.last_entry_id)
+        self.assertEqual(last_entry_id, LedgerEntry.objects.filter(wallet=wallet).latest('id').id)
+
+    def test_mismatch_is_reported_and_repaired(self):
+        wallet = self.wallets[1]
+        expected = self.projected(wallet)
+        Wallet.objects.filter(pk=wallet.pk).update(available_balance=Decimal('1000.00'))
+
+        result = ledger.checkpoint_wallets()
+        self.assertEqual(
+            [(wallet_id, ledger_side) for wallet_id, _, ledger_side in result.mismatches], [(wallet.pk, expected)]
+        )
+        self.assertEqual(self.projected(wallet)['available_balance'], Decimal('1000.00'))
+
+        result = ledger.checkpoint_wallets(repair=True)
+        self.assertEqual(len(result.mismatches), 1)
+        self.assertEqual(self.projected(wallet), expected)
+        self.assertEqual(ledger.checkpoint_wallets().mismatches, [])
+
+
+class UserContextTests(TestCase):
+
+    def setUp(self):
+        Currency.objects.create(code='USD', name='US Dollar', symbol='$')
+        Currency.objects.create(code='KES', name='Kenyan Shilling', symbol='KSh', exchange_rate=Decimal('160'))
+        currencies.bump_version()
+        user = make_user('dash')
+        Wallet.objects.create(user=user, currency='KES')
+        make_asset('AAA')
+        self.client.force_login(user)
+        # Warm the process-wide currency table
+        self.client.get(reverse('core:home'))
+
+    def test_dashboard_queries(self):
+        # Session, user, wallet, portfolio summary, recent transactions, featured assets
+        with self.assertNumQueries(6):
+            response = self.client.get(reverse('core:home'))
+
+        self.assertEqual(response.context['current_currency'].code, 'KES')
+
+    def test_one_wallet_query_per_page(self):
+        for name in ('core:home', 'core:wallet', 'core:assets', 'wallet:wallet_view', 'wallet:deposit'):
+            with self.subTest(page=name), CaptureQueriesContext(connection) as queries:
+                self.client.get(reverse(name))
+                wallet_queries = [query for query in queries if 'FROM "wallet_wallet"' in query['sql']]
+                self.assertEqual(len(wallet_queries), 1)
+                self.assertFalse([query for query in queries if 'core_currency' in query['sql']])
+
+
+KES = SimpleNamespace(code='KES', symbol='KSh', exchange_rate=Decimal('160'))
+USD = SimpleNamespace(code='USD', symbol='$', exchange_rate=Decimal('1'))
+
+
+class ConvertManyTests(SimpleTestCase):
+
+    def test_converts_each_amount_to_the_cent(self):
+        amounts = [Decimal('1.005'), 2, 2.5, '3', Decimal('0.0001')]
+
+        self.assertEqual(
+            convert_many(amounts, KES),
+            [Decimal('160.80'), Decimal('320.00'), Decimal('400.00'), Decimal('480.00'), Decimal('0.02')],
+        )
+        self.assertEqual(convert_many(amounts, KES), [convert_from_usd(amount, KES) for amount in amounts])
+
+    def test_base_currency_is_only_rounded(self):
+        self.assertEqual(convert_many([Decimal('1.006'), 7], USD), [Decimal('1.01'), Decimal('7.00')])
+
+    def test_numpy_arrays(self):
+        self.assertEqual(convert_many(np.array([1.5, 2.25]), KES), [Decimal('240.00'), Decimal('360.00')])
+
+    def test_missing_and_unparseable_amounts_are_zero(self):
+        self.assertEqual(convert_many([None, 'abc', 1], KES), [Decimal('0.00'), Decimal('0.00'), Decimal('160.00')])
+        self.assertEqual(convert_from_usd(None, KES), Decimal('0.00'))
+
+    def test_unusable_rate_converts_everything_to_zero(self):
+        broken = SimpleNamespace(code='KES', exchange_rate=None)
+
+        self.assertEqual(convert_many([1, 2], broken), [Decimal('0.00'), Decimal('0.00')])
+        self.assertEqual(convert_from_usd(1, broken), Decimal('0.00'))
+
+
+class MoneyFilterTests(SimpleTestCase):
+
+    def render(self, amount, currency):
+        return Template('{% load money %}{{ amount|money:currency }}').render(
+            Context({'amount': amount, 'currency': currency})
+        )
+
+    def test_renders_in_the_display_currency(self):
+        self.assertEqual(self.render(Decimal('2.5'), KES), '400.00')
+        self.assertEqual(self.render(Decimal('2.5'), USD), '2.50')
+
+    def test_missing_amount_renders_zero(self):
+        self.assertEqual(self.render(None, KES), '0.00')
+
+
+class DisplayCurrencyViewTests(TestCase):
+    """Pages render USD amounts in the wallet's currency without decorating the models"""
+
+    def setUp(self):
+        Currency.objects.create(code='USD', name='US Dollar', symbol='$')
+        Currency.objects.create(code='KES', name='Kenyan Shilling', symbol='KSh', exchange_rate=Decimal('160'))
+        currencies.bump_version()
+        self.user = make_user('shopper')
+        self.wallet = Wallet.objects.create(user=self.user, currency='KES')
+        self.asset = make_asset('AAA', price='2.500000', min_investment=Decimal('10.00'))
+        self.similar = make_asset('BBB', price='1.250000')
+        self.transaction = Transaction.objects.create(
+            user=self.user, wallet=self.wallet, transaction_type='deposit', payment_method='wallet',
+            amount=Decimal('12.34'), status='completed',
+        )
+        self.client.force_login(self.user)
+
+    def assertUndecorated(self, instances):
+        for instance in instances:
+            fields = {field.attname for field in instance._meta.concrete_fields}
+            self.assertFalse([name for name in vars(instance) if name.startswith('display_') and name not in fields])
+
+    def test_dashboard(self):
+        response = self.client.get(reverse('core:home'))
+
+        # Price and minimum investment of each featured asset, and recent activity
+        self.assertContains(response, 'KSh400.00')
+        self.assertContains(response, 'KSh1600.00')
+        self.assertContains(response, 'KSh1974.40')
+        self.assertUndecorated(response.context['market_assets'])
+        self.assertUndecorated(response.context['recent_transactions'])
+
+    def test_assets_page(self):
+        response = self.client.get(reverse('core:assets'))
+
+        self.assertContains(response, 'KSh400.00')
+        self.assertContains(response, 'KSh200.00')
+        self.assertContains(response, 'KSh1600.00')
+        self.assertUndecorated(response.context['market_assets'])
+
+    def test_asset_detail_similar_assets(self):
+        response = self.client.get(reverse('investments:asset_detail', args=[self.asset.id]))
+
+        self.assertContains(response, 'KSh200.00')
+        self.assertUndecorated(response.context['similar_assets'])
+
+    def test_wallet_rows_convert_at_the_rate_of_the_day(self):
+        ExchangeRate.objects.filter(currency__code='KES').update(effective_at=timezone.now() - timedelta(days=2))
+        ExchangeRate.objects.create(
+            currency=Currency.objects.get(code='KES'), rate=Decimal('100'), effective_at=timezone.now() - timedelta(days=1)
+        )
+        Transaction.objects.filter(pk=self.transaction.pk).update(created_at=timezone.now() - timedelta(days=1, hours=-1))
+        currencies.bump_version()
+
+        response = self.client.get(reverse('wallet:wallet_view'))
+
+        transaction, sign, amount = response.context['recent_activity'][0]
+        self.assertEqual((transaction.pk, sign, amount), (self.transaction.pk, '+', Decimal('1234.00')))
+        self.assertContains(response, '+KSh1234.00')
+        self.assertUndecorated([transaction])
+
+    def test_index_benchmark_rolls_back(self):
+        users = get_user_model().objects.count()
+        out = StringIO()
+
+        call_command('bench_index_render', '--renders', '2', stdout=out)
+
+        self.assertIn('in KES', out.getvalue())
+        self.assertRegex(out.getvalue(), r'converting: [\d.]+ms in [1-9]\d* calls per render')
+        self.assertEqual(get_user_model().objects.count(), users)
+
+
+class SeedCurrenciesTests(TestCase):
+
+    def test_fix_wallets_converts_through_the_ledger_once(self):
+        user = make_user('local')
+        wallet = Wallet.objects.create(
+            user=user, currency='KES', available_balance=Decimal('160000.00'), bonus_balance=Decimal('1600.00')
+        )
+
+        for _ in range(2):
+            call_command('seed_currencies', '--fix-wallets', stdout=StringIO())
+
+        wallet.refresh_from_db()
+        self.assertEqual(wallet.available_balance, Decimal('1000.00'))
+        self.assertEqual(wallet.bonus_balance, Decimal('10.00'))
+        # The ledger holds the conversion (from a zero opening balance here)
+        posted, _, _ = ledger.ledger_balances([wallet.pk])[wallet.pk]
+        self.assertEqual(posted['available_balance'], Decimal('-159000.00'))
+        self.assertEqual(posted['bonus_balance'], Decimal('-1590.00'))
+
+
+class RateAtTests(TestCase):
+
+    def setUp(self):
+        self.kes = Currency.objects.create(code='KES', name='Kenyan Shilling', symbol='KSh', exchange_rate=Decimal('160'))
+        ExchangeRate.objects.filter(currency=self.kes).delete()
+        for moment, rate in (('2026-01-10T00:00', '100'), ('2026-02-01T09:00', '120'), ('2026-02-01T15:00', '130')):
+            ExchangeRate.objects.create(currency=self.kes, rate=Decimal(rate), effective_at=self.at(moment))
+        currencies.bump_version()
+
+    def at(self, moment):
+        return datetime.fromisoformat(moment).replace(tzinfo=dt_timezone.utc)
+
+    def test_rate_in_effect_at_each_time(self):
+        times = ['2026-01-01T00:00', '2026-01-10T00:00', '2026-01-20T12:00',
+                 '2026-02-01T08:59', '2026-02-01T09:00', '2026-02-01T23:59', '2026-03-01T00:00']
+
+        rates = currencies.rates_at(self.kes, [self.at(moment) for moment in times] + [None])
+
+        # Before the first recorded rate that first rate applies; None is the current rate
+        self.assertEqual(rates, [Decimal(rate) for rate in ('100', '100', '100', '100', '120', '130', '130', '160')])
+
+    def test_loaded_days_are_reused(self):
+        when = [self.at('2026-02-01T10:00'), self.at('2026-02-01T16:00')]
+        currencies.rates_at(self.kes, when)
+
+        with self.assertNumQueries(0):
+            self.assertEqual(currencies.rates_at(self.kes, when), [Decimal('120'), Decimal('130')])
+            self.assertEqual(currencies.rate_at(self.kes, None), Decimal('160'))
+
+    def test_without_history_the_current_rate_applies(self):
+        ExchangeRate.objects.all().delete()
+        currencies.bump_version()
+
+        self.assertEqual(currencies.rate_at(self.kes, self.at('2026-01-01T00:00')), Decimal('160'))
+
+    def test_day_boundaries(self):
+        ExchangeRate.objects.create(currency=self.kes, rate=Decimal('140'), effective_at=self.at('2026-02-02T00:00'))
+        currencies.bump_version()
+        currencies.get_table()
+        times = [
+            self.at('2026-02-01T23:59:59.999999'),
+            self.at('2026-02-02T00:00'),
+            # Days are UTC: 02:30 in Nairobi is still 1 February
+            datetime.fromisoformat('2026-02-02T02:30+03:00'),
+            # No change that day: the rate carried in from the day before
+            self.at('2026-02-03T12:00'),
+        ]
+
+        # One range query over the days plus the rate in effect when they start
+        with self.assertNumQueries(2):
+            rates = currencies.rates_at(self.kes, times)
+
+        self.assertEqual(rates, [Decimal('130'), Decimal('140'), Decimal('130'), Decimal('140')])
+
+
+class CurrencyTableTests(TestCase):
+
+    def setUp(self):
+        Currency.objects.create(code='USD', name='US Dollar', symbol='$')
+        Currency.objects.create(code='KES', name='Kenyan Shilling', symbol='KSh', exchange_rate=Decimal('160'))
+        currencies.bump_version()
+
+    def worker_holding(self, table, checked_ago):
+        """Put this process in the state of another worker that loaded `table`"""
+        currencies._table = table
+        currencies._checked_at = time.monotonic() - checked_ago
+
+    @override_settings(CURRENCY_CACHE_CHECK_SECONDS=5)
+    def test_rate_change_reloads_other_workers(self):
+        table = currencies.get_table()
+        version = currencies.current_version()
+
+        kes = Currency.objects.get(code='KES')
+        kes.exchange_rate = Decimal('150')
+        with self.captureOnCommitCallbacks(execute=True):
+            kes.save()
+
+        self.assertNotEqual(currencies.current_version(), version)
+        # Within the check interval a worker keeps its copy without asking
+        self.worker_holding(table, checked_ago=1)
+        with self.assertNumQueries(0):
+            self.assertEqual(currencies.get_currency('KES').exchange_rate, Decimal('160'))
+        # After it, the version no longer matches and the table is reloaded
+        self.worker_holding(table, checked_ago=6)
+        self.assertEqual(currencies.get_currency('KES').exchange_rate, Decimal('150'))
+        self.assertEqual(currencies.get_table().version, currencies.current_version())
+
+    def test_unchanged_version_keeps_the_table(self):
+        table = currencies.get_table()
+        self.worker_holding(table, checked_ago=60)
+
+        with self.assertNumQueries(0):
+            self.assertIs(currencies.get_table(), table)
+
+    def test_version_lost_from_the_cache_reloads(self):
+        table = currencies.get_table()
+        cache.delete(currencies.VERSION_KEY)
+        self.worker_holding(table, checked_ago=60)
+
+        self.assertIsNot(currencies.get_table(), table)
+
+
+class BatchRecordingProvider(fx_rates.FxRateProvider):
+    name = 'recording'
+
+    def __init__(self, batch_size, delay=0.0, slow=()):
+        self.batch_size = batch_size
+        self.delay = delay
+        self.slow = slow
+        self.batches = []
+
+    def fetch_rates(self, codes):
+        self.batches.append(list(codes))
+        time.sleep(self.delay + (1 if set(codes) & set(self.slow) else 0))
+        return {code: fx_rates.STUB_RATES[code] for code in codes}
+
+
+class RefreshFxRatesTests(TestCase):
+    codes = ['EUR', 'GBP', 'KES', 'UGX']
+
+    def setUp(self):
+        Currency.objects.create(code='USD', name='US Dollar', symbol='$')
+        for code in self.codes:
+            Currency.objects.create(code=code, name=code, symbol=code, exchange_rate=Decimal('1'))
+        currencies.bump_version()
+
+    def test_stub_refresh_appends_history_and_bumps_version(self):
+        history = ExchangeRate.objects.count()
+        version = currencies.current_version()
+        out = StringIO()
+
+        fetch = fx_rates.HttpJsonRateProvider.fetch_rates
+        started = time.perf_counter()
+        with self.captureOnCommitCallbacks(execute=True), \
+                mock.patch.object(fx_rates.HttpJsonRateProvider, 'fetch_rates', autospec=True, side_effect=fetch) as spy:
+            call_command('refresh_fx_rates', '--stub', '--stub-delay', '0.3', stdout=out)
+        elapsed = time.perf_counter() - started
+
+        self.assertIn('Updated 4 currencies', out.getvalue())
+        self.assertEqual(ExchangeRate.objects.count(), history + len(self.codes))
+        for currency in Currency.objects.filter(code__in=self.codes):
+            latest = ExchangeRate.objects.filter(currency=currency).latest('effective_at', 'pk')
+            self.assertEqual(latest.rate, currency.exchange_rate)
+            stub_rate = fx_rates.STUB_RATES[currency.code]
+            self.assertAlmostEqual(float(currency.exchange_rate), stub_rate, delta=stub_rate * 0.011)
+        self.assertNotEqual(currencies.current_version(), version)
+        # One request per currency, concurrently: well under 4 x 0.3s
+        self.assertEqual(sorted(call.args[1] for call in spy.call_args_list), [[code] for code in self.codes])
+        self.assertLess(elapsed, 0.9)
+
+    def test_batches_are_fetched_concurrently(self):
+        provider = BatchRecordingProvider(batch_size=2, delay=0.3)
+
+        started = time.perf_counter()
+        [result] = fx_rates.fetch_rates([provider], self.codes, timeout=2)
+
+        self.assertLess(time.perf_counter() - started, 0.55)
+        self.assertEqual(sorted(provider.batches), [['EUR', 'GBP'], ['KES', 'UGX']])
+        self.assertEqual(sorted(result.rates), self.codes)
+        self.assertIsNone(result.error)
+
+    def test_timed_out_batch_keeps_the_finished_ones(self):
+        provider = BatchRecordingProvider(batch_size=2, slow=['KES'])
+
+        [result] = fx_rates.fetch_rates([provider], self.codes, timeout=0.3)
+
+        self.assertEqual(sorted(result.rates), ['EUR', 'GBP'])
+        self.assertEqual(result.error, 'timed out after 0.3s')
+
+
+class PortfolioSummaryTests(TestCase):
+
+    def setUp(self):
+        self.user = make_user('investor')
+        self.asset = make_asset('AAA')
+
+    def summary(self):
+        return PortfolioSummary.objects.get(user=self.user)
+
+    def test_first_write_builds_the_summary_once(self):
+        make_investment(self.user, self.asset)
+
+        summary = self.summary()
+        self.assertEqual(summary.active_count, 1)
+        self.assertEqual(summary.active_invested, Decimal('100.00'))
+        make_investment(self.user, self.asset, '50.00')
+        self.assertEqual(self.summary().active_invested, Decimal('150.00'))
+        self.assertEqual(rebuild_portfolio_summaries([self.user.pk]), 0)
+
+    def test_settlement_moves_investments_to_closed(self):
+        make_investment(self.user, self.asset)
+        make_investment(self.user, self.asset, '50.00')
+
+        settled = settle_chunk(timezone.now() + timedelta(hours=2), 100)
+
+        self.assertEqual(len(settled), 2)
+        summary = self.summary()
+        self.assertEqual((summary.active_count, summary.active_invested), (0, Decimal('0.00')))
+        self.assertEqual(summary.closed_invested, Decimal('150.00'))
+        profit = sum(Investment.objects.values_list('actual_profit_loss', flat=True))
+        self.assertEqual(summary.total_profit, profit)
+        # Nothing for a rebuild to repair
+        self.assertEqual(rebuild_portfolio_summaries([self.user.pk]), 0)
+
+    def test_summary_is_built_on_first_read(self):
+        make_investment(self.user, self.asset)
+        PortfolioSummary.objects.all().delete()
+
+        self.assertEqual(get_portfolio_summary(self.user).active_invested, Decimal('100.00'))
+
+
+class SettlementRerunTests(TestCase):
+
+    def setUp(self):
+        user = make_user('investor')
+        self.wallet = Wallet.objects.create(user=user, locked_balance=Decimal('100.00'))
+        self.investment = make_investment(user, make_asset('AAA'))
+        self.reference = settlement_reference(self.investment.pk)
+        self.later = timezone.now() + timedelta(hours=2)
+
+    def settled_state(self):
+        self.wallet.refresh_from_db()
+        return (
+            self.wallet.available_balance, self.wallet.locked_balance,
+            Transaction.objects.filter(reference=self.reference).count(),
+            LedgerEntry.objects.filter(reference=self.reference).count(),
+        )
+
+    def test_rerun_settles_nothing_again(self):
+        self.assertEqual(settle_investments(self.later), 1)
+        state = self.settled_state()
+        profit = Investment.objects.get(pk=self.investment.pk).actual_profit_loss
+        self.assertEqual(state[:3], (Decimal('100.00') + profit, Decimal('0.00'), 1))
+
+        self.assertEqual(settle_investments(self.later), 0)
+        self.assertEqual(settle_chunk(self.later, 10, ids=[self.investment.pk]), [])
+        # A stale instance still marked active loses to the settled row
+        self.investment.complete_investment()
+
+        self.assertEqual(self.settled_state(), state)
+
+    def test_reference_blocks_a_second_credit(self):
+        settle_investments(self.later)
+        state = self.settled_state()
+        # Settled once, then flipped back to active: the same PRF reference cannot be paid twice
+        Investment.objects.filter(pk=self.investment.pk).update(status='active')
+
+        with self.assertRaises(IntegrityError):
+            settle_chunk(self.later, 10)
+
+        self.assertEqual(self.settled_state(), state)
+        self.assertEqual(self.reference, f"PRF{self.investment.pk.hex.upper()}")
+
+
+class FakeSelector:
+    """Stands in for the scheduler's selector: a select() just moves the clock on"""
+
+    def __init__(self, clock, overshoot=0.0):
+        self.clock = clock
+        self.overshoot = overshoot
+        self.timeouts = []
+
+    def select(self, timeout=None):
+        self.timeouts.append(timeout)
+        self.clock.now += timeout + self.overshoot
+        return []
+
+    def close(self):
+        pass
+
+
+class MaturitySchedulerTests(TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.clock.now = timezone.now().timestamp()
+        self.scheduler = MaturityScheduler(
+            horizon=3600, reload_interval=600, address=('127.0.0.1', 0), clock=self.clock,
+        )
+        self.addCleanup(self.scheduler.close)
+        self.user = make_user('investor')
+        self.asset = make_asset('AAA')
+
+    def investment(self, seconds):
+        """An active investment maturing `seconds` after the clock's now"""
+        investment = make_investment(self.user, self.asset)
+        investment.end_time = datetime.fromtimestamp(self.clock.now + seconds, tz=dt_timezone.utc)
+        Investment.objects.filter(pk=investment.pk).update(end_time=investment.end_time)
+        return investment
+
+    def status(self, investment):
+        return Investment.objects.get(pk=investment.pk).status
+
+    def test_sleeps_until_the_next_maturity(self):
+        first = self.investment(30)
+        later = self.investment(90)
+        self.investment(7200)  # beyond the horizon
+        real_selector, self.scheduler.selector = self.scheduler.selector, FakeSelector(self.clock, overshoot=0.25)
+        real_selector.close()
+
+        stats = self.scheduler.run(max_batches=1)
+
+        self.assertEqual(self.scheduler.selector.timeouts, [30.0])
+        self.assertEqual((self.status(first), self.status(later)), ('completed', 'active'))
+        self.assertEqual([investment_id for _, investment_id in self.scheduler.heap], [later.pk])
+        self.assertEqual(stats.settled, 1)
+        self.assertAlmostEqual(stats.lags[0], 0.25, places=3)
+
+        self.scheduler.run(max_batches=2)
+        self.assertEqual(self.status(later), 'completed')
+        self.assertAlmostEqual(self.scheduler.selector.timeouts[-1], 60 - 0.25, places=3)
+
+    def test_notifications_are_picked_up(self):
+        self.scheduler.load()
+        investment = self.investment(30)
+        host, port = self.scheduler.socket.getsockname()
+
+        with override_settings(SETTLEMENT_NOTIFY_ADDRESS=(host, port)):
+            notify_maturity(investment.pk, investment.end_time)
+            notify_maturity(uuid.uuid4(), investment.end_time + timedelta(hours=2))
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sender:
+            sender.sendto(b'junk', (host, port))
+        time.sleep(0.05)
+        self.assertTrue(self.scheduler.selector.select(timeout=1))
+        self.scheduler._drain_notifications()
+
+        # Only the one within the horizon; the malformed datagram is ignored
+        self.assertEqual(self.scheduler.heap, [(investment.end_time.timestamp(), investment.pk)])
+
+    def test_cancelled_and_settled_ids_are_dropped(self):
+        due = self.investment(-5)
+        settled = self.investment(-5)
+        settle_chunk(timezone.now(), 10, ids=[settled.pk])
+        for investment_id in (due.pk, settled.pk, uuid.uuid4()):
+            self.scheduler.schedule(investment_id, self.clock.now - 5)
+
+        result = self.scheduler.settle(self.scheduler._pop_due(self.clock.now))
+
+        self.assertEqual(result, [due.pk])
+        self.assertEqual((self.scheduler.heap, self.scheduler.scheduled), ([], set()))
+        self.assertEqual(self.scheduler.stats.settled, 1)
+
+    def test_lag_stats(self):
+        for seconds in (-1, -2, -3, -10):
+            self.investment(seconds)
+        self.scheduler.load()
+        self.clock.now += 0.5
+
+        self.scheduler.settle(self.scheduler._pop_due(self.clock.now))
+
+        summary = self.scheduler.stats.summary()
+        self.assertEqual((summary['batches'], summary['failures'], summary['settled']), (1, 0, 4))
+        self.assertAlmostEqual(summary['lag']['p50'], 3.0, places=3)
+        self.assertAlmostEqual(summary['lag']['max'], 10.5, places=3)
+        self.assertIn('lag p50=3000.0ms', str(self.scheduler.stats))
+
+
+class MarkToMarketTests(TestCase):
+
+    def test_marks_open_investments(self):
+        user = make_user('investor')
+        asset = make_asset('AAA')
+        make_investment(user, asset, '100.00')
+        # Opened before entry prices were recorded: not marked
+        Investment.objects.create(
+            user=user, asset=asset, invested_amount=Decimal('40.00'), end_time=timezone.now() + timedelta(hours=1),
+        )
+        mark = MarkToMarket()
+
+        asset.update_price(Decimal('110.000000'))
+        mark([asset])
+
+        pnl = UnrealizedPnL.objects.get(user=user)
+        self.assertEqual((pnl.unrealized_pnl, pnl.market_value, pnl.open_positions),
+                         (Decimal('10.00'), Decimal('110.00'), 1))
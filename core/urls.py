@@ -12,6 +12,7 @@ urlpatterns = [
     path('assets/<uuid:asset_id>/', asset_detail, name='asset_detail'),
     path('profile/', views.profile, name='profile'),
     path('assets/', views.assets_view, name='assets'),
+    path('prices/stream/', views.price_stream, name='price_stream'),
     path('profile/', views.profile, name='profile'),
     path("switch-currency/", views.switch_currency, name="switch_currency"),
     path('number-carousel/', views.number_carousel_view, name='number_carousel'),
@@ -1,7 +1,8 @@
 # core/utils/currency.py
 from decimal import Decimal
-from core.models import Currency
-from wallet.models import Wallet
+from functools import lru_cache
+
+from core.services.currencies import rates_at
 
 BASE_CURRENCY = "USD"
 
@@ -9,48 +10,58 @@ def get_user_currency(request):
     """
     Get user's preferred currency.
     Priority: Wallet → Cookie → USD
+    Resolved once per request (see core.middleware.UserContext).
     """
-    code = BASE_CURRENCY  # Default fallback
-    
-    # For authenticated users
-    if request.user.is_authenticated:
-        try:
-            # Get wallet currency, not user.currency_preference
-            wallet = Wallet.objects.get(user=request.user)
-            code = wallet.currency or BASE_CURRENCY
-        except Wallet.DoesNotExist:
-            # If wallet doesn't exist yet, use cookie or default
-            code = request.COOKIES.get('currency', BASE_CURRENCY)
-        except AttributeError:
-            # Fallback to cookie
-            code = request.COOKIES.get('currency', BASE_CURRENCY)
-    else:
-        # For non-authenticated users, use cookie
-        code = request.COOKIES.get('currency', BASE_CURRENCY)
+    from core.middleware import get_user_context
     
-    # Get currency object
+    return get_user_context(request).currency
+
+def convert_from_usd(amount, currency, at=None):
+    """Convert USD amount to target currency (at the rate in effect at `at`, if given)"""
+    if at is not None:
+        return convert_many([amount], currency, [at])[0]
     try:
-        currency = Currency.objects.get(code=code, is_active=True)
-    except Currency.DoesNotExist:
-        # Fallback to USD
-        currency = Currency.objects.get(code=BASE_CURRENCY)
-    
-    return currency
+        rate = None if currency.code == BASE_CURRENCY else _rate(currency.exchange_rate)
+    except (TypeError, ValueError, AttributeError, ArithmeticError):
+        return ZERO
+    return _convert(amount, rate)
+
+CENT = Decimal("0.01")
+ZERO = Decimal("0.00")
+
+@lru_cache(maxsize=64)
+def _rate(exchange_rate):
+    return Decimal(str(exchange_rate))
 
-def convert_from_usd(amount, currency):
-    """Convert USD amount to target currency"""
+def _convert(amount, rate):
     if amount is None:
-        return Decimal("0.00")
-    
+        return ZERO
+    try:
+        value = amount if isinstance(amount, Decimal) else Decimal(str(amount))
+        if rate is not None:
+            value = value * rate
+        return value.quantize(CENT)
+    except (TypeError, ValueError, AttributeError, ArithmeticError):
+        return ZERO
+
+def convert_many(amounts, currency, at=None):
+    """
+    Convert USD amounts (a list, numpy array or any iterable) to the target
+    currency in one pass; the rate is parsed once, not per amount.
+    With `at`, a datetime per amount, each is converted at the rate in
+    effect at that time (see core.services.currencies.rates_at).
+    None and unparseable amounts come back as 0.00.
+    """
+    amounts = list(amounts)
     try:
-        amount_decimal = Decimal(str(amount))
-        rate_decimal = Decimal(str(currency.exchange_rate))
-        
         # If currency is USD, no conversion needed
-        if currency.code == "USD":
-            return amount_decimal.quantize(Decimal("0.01"))
-        
-        # Convert USD to target currency
-        return (amount_decimal * rate_decimal).quantize(Decimal("0.01"))
-    except (TypeError, ValueError, AttributeError):
-        return Decimal("0.00")
\ No newline at end of file
+        if currency.code == BASE_CURRENCY:
+            rates = [None] * len(amounts)
+        elif at is None:
+            rates = [_rate(currency.exchange_rate)] * len(amounts)
+        else:
+            rates = [_rate(rate) for rate in rates_at(currency, at)]
+    except (TypeError, ValueError, AttributeError, ArithmeticError):
+        return [ZERO for _ in amounts]
+    
+    return [_convert(amount, rate) for amount, rate in zip(amounts, rates)]
@@ -1,15 +1,25 @@
-from datetime import datetime, timedelta
+from datetime import datetime
 from decimal import Decimal
-from django.http import JsonResponse
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404, redirect, render
 from django.contrib.auth.decorators import login_required
+from django.views.decorators.http import condition
+from django.db import transaction as db_transaction
 from django.db.models import Sum
 from assets.models import Asset
 from core.forms import ContactForm
-from core.models import Currency, Investment
-from core.services.price_fetcher import PriceFetcher
-from core.utils.currency import convert_from_usd, get_user_currency
-from wallet.models import Wallet, Transaction
+from core.services import balances, currencies
+from core.services.candles import get_24h_stats, sparkline_points
+from core.services.market_summary import get_market_summary
+from core.services.portfolio import get_portfolio_summary
+from core.services.price_snapshot import (
+    count_stale, from_seq, get_latest_prices, overlay_latest_prices, price_version,
+)
+from core.services.price_stream import broadcaster, event_stream
+from core.utils.currency import convert_many, get_user_currency
+from wallet.models import Transaction
 from django.contrib import messages
 from pyexpat.errors import messages as pyexpat_messages 
 
@@ -18,59 +28,28 @@ from pyexpat.errors import messages as pyexpat_messages
 def switch_currency(request):
     if request.method == "POST":
         code = request.POST.get("currency")
-        try:
-            currency = Currency.objects.get(code=code, is_active=True)
-            
+        currency = currencies.get_currency(code)
+        if currency is not None:
             # Update user's wallet currency preference
-            wallet = Wallet.objects.get(user=request.user)
+            wallet = request.user_context.wallet
             wallet.currency = currency.code
-            wallet.save()
+            wallet.save(update_fields=['currency'])
             
             # Set cookie for consistency
             response = redirect(request.META.get("HTTP_REFERER", "/"))
             response.set_cookie('currency', currency.code, max_age=30*24*60*60)
             return response
-            
-        except Currency.DoesNotExist:
-            # If currency doesn't exist, redirect without changes
-            pass
+        # If currency doesn't exist, redirect without changes
     
     return redirect(request.META.get("HTTP_REFERER", "/"))
 
-def get_currency_context(user):
-    """Get currency context for a user"""
-    try:
-        wallet = Wallet.objects.get(user=user)
-        currency_code = wallet.currency or "USD"
-    except Wallet.DoesNotExist:
-        currency_code = "USD"
-    
-    current_currency = Currency.objects.filter(code=currency_code, is_active=True).first()
-    if not current_currency:
-        current_currency = Currency.objects.filter(is_active=True).first()
-
-    currency_code = current_currency.code
-    currency_symbol = current_currency.symbol  # FIX: Get symbol from currency object
-
-    return wallet, currency_code, currency_symbol
-
-
 @login_required
 def index(request):
     """Main dashboard with assets preview"""
-    # Get or create wallet
-    wallet, created = Wallet.objects.get_or_create(
-        user=request.user,
-        defaults={
-            'available_balance': Decimal('0.00'),  # Give some starting balance
-            'locked_balance': Decimal('0.00'),
-            'bonus_balance': Decimal('0.00'),
-            'bonus_claimed': Decimal('0.00'),
-            'currency': 'USD'
-        }
-    )
+    # Get or create wallet (resolved once per request, see core.middleware)
+    wallet = request.user_context.wallet
     
-    if created:
+    if request.user_context.wallet_created:
         messages.info(request, 'Welcome! Your wallet has been created')
     
     currency = get_user_currency(request)
@@ -78,42 +57,32 @@ def index(request):
     # =========================
     # WALLET CONVERSION (USD → selected currency)
     # =========================
-    wallet_data = {
-        'available': convert_from_usd(wallet.available_balance, currency),
-        'locked': convert_from_usd(wallet.locked_balance, currency),
-        'bonus': convert_from_usd(wallet.bonus_balance, currency),
-        'total': convert_from_usd(wallet.total_balance(), currency),
-    }
+    wallet_data = dict(zip(
+        ('available', 'locked', 'bonus', 'total'),
+        convert_many([
+            wallet.available_balance,
+            wallet.locked_balance,
+            wallet.bonus_balance,
+            wallet.total_balance(),
+        ], currency),
+    ))
     
 
     # =========================
     # INVESTMENTS
     # =========================
-    active_investments = Investment.objects.filter(
-        user=request.user,
-        status='active'
-    )
-    
-    completed_investments = Investment.objects.filter(
-        user=request.user
-    ).exclude(status='active')
+    # Totals are maintained per user on every investment write
+    portfolio = get_portfolio_summary(request.user)
     
     # =========================
     # PnL CALCULATION (USD → currency)
     # =========================
-    total_profit_usd = completed_investments.filter(
-        profit_loss__gt=0
-    ).aggregate(total=Sum('profit_loss'))['total'] or Decimal('0')
-    
-    total_loss_usd = completed_investments.filter(
-        profit_loss__lt=0
-    ).aggregate(total=Sum('profit_loss'))['total'] or Decimal('0')
+    total_profit_usd = portfolio.total_profit
+    total_loss_usd = portfolio.total_loss
     
     net_pl_usd = total_profit_usd + total_loss_usd
     
-    invested_total_usd = completed_investments.aggregate(
-        total=Sum('invested_amount')
-    )['total'] or Decimal('0')
+    invested_total_usd = portfolio.closed_invested
     
     net_pl_percentage = (
         (net_pl_usd / invested_total_usd) * 100
@@ -123,13 +92,14 @@ def index(request):
     # =========================
     # CONVERT PnL TO USER'S CURRENCY
     # =========================
+    total_profit, total_loss, net_pl = convert_many([total_profit_usd, total_loss_usd, net_pl_usd], currency)
     investment_stats = {
-        'total_profit': convert_from_usd(total_profit_usd, currency),
-        'total_loss': convert_from_usd(total_loss_usd, currency),
-        'net_pl': convert_from_usd(net_pl_usd, currency),
+        'total_profit': total_profit,
+        'total_loss': total_loss,
+        'net_pl': net_pl,
         'net_pl_percentage': round(net_pl_percentage, 2),
         'progress_width': min(abs(net_pl_percentage), 100),
-        'active_investments': active_investments.count(),
+        'active_investments': portfolio.active_count,
     }
     
     # =========================
@@ -139,28 +109,18 @@ def index(request):
         user=request.user
     ).order_by('-created_at')[:5]
     
-    # Convert transaction amounts for display
-    for transaction in recent_transactions:
-        # Store both the original amount and converted amount
-        transaction.original_amount = transaction.amount  # USD amount
-        transaction.display_amount = convert_from_usd(transaction.amount, currency)  # Converted amount
-        transaction.display_currency_symbol = currency.symbol
+    # Amounts stay in USD; home.html converts them with the |money filter
     
     # =========================
     # MARKET ASSETS FOR DASHBOARD (4-6 featured assets)
     # =========================
     from assets.models import Asset
     
-    # Get top 6 active assets (mix of categories)
-    market_assets = Asset.objects.filter(is_active=True).order_by('?')[:8]
+    # Get top 6 active assets (mix of categories), priced from the ticker's snapshot
+    market_assets = overlay_latest_prices(Asset.objects.filter(is_active=True).order_by('?')[:8])
     
-    # Add display prices in user's currency
+    # Prices stay in USD; invest_widget.html converts them with the |money filter
     for asset in market_assets:
-        asset.display_price = convert_from_usd(asset.current_price, currency)
-        asset.display_min_investment = convert_from_usd(asset.min_investment, currency)
-        asset.display_max_investment = convert_from_usd(asset.max_investment, currency)
-        asset.last_updated_str = asset.last_updated.strftime("%H:%M:%S") if asset.last_updated else "Never"
-        
         # Add investment hours options with expected returns
         asset.ALLOWED_HOURS = [
             {'hours': 1, 'label': '1 hour', 'return_rate': asset.return_rate_1h},
@@ -171,18 +131,6 @@ def index(request):
         ]
         asset.duration_hours_default = 3
     
-    # Calculate example returns for minimum investment
-        example_investment = asset.min_investment
-        asset.example_returns = {}
-        for duration in asset.ALLOWED_HOURS:
-            profit = asset.calculate_profit(example_investment, duration['hours'])
-            asset.example_returns[duration['hours']] = {
-                'profit_usd': profit,
-                'profit_display': convert_from_usd(profit, currency),
-                'total_usd': example_investment + profit,
-                'total_display': convert_from_usd(example_investment + profit, currency),
-            }
-            
     # =========================
     # INVESTMENT FORM
     # =========================
@@ -214,14 +162,12 @@ def index(request):
     context = {
         'wallet': wallet_data,
         'investment_stats': investment_stats,
-        'active_investments': active_investments,
-        'completed_investments': completed_investments,
         'recent_transactions': recent_transactions,
         'market_assets': market_assets,
         'investment_form': investment_form,
         'currency_symbol': currency.symbol,
         'currency_code': currency.code,
-        'available_currencies': Currency.objects.filter(is_active=True),
+        'available_currencies': request.user_context.available_currencies,
         'current_currency': currency,
     }
     
@@ -247,59 +193,40 @@ def profile(request):
 @login_required
 def home(request):
     """Main dashboard"""
-    # FIX: Get or create wallet instead of just getting it
-    wallet, created = Wallet.objects.get_or_create(
-        user=request.user,
-        defaults={
-            'available_balance': Decimal('0.00'),
-            'locked_balance': Decimal('0.00'),
-            'bonus_balance': Decimal('0.00'),
-            'bonus_claimed': Decimal('0.00'),
-            'currency': 'USD'
-        }
-    )
+    # Get or create wallet
+    wallet = request.user_context.wallet
     
     currency = get_user_currency(request)
     
     # =========================
     # WALLET CONVERSION (USD → selected currency)
     # =========================
-    wallet_data = {
-        'available': convert_from_usd(wallet.available_balance, currency),
-        'locked': convert_from_usd(wallet.locked_balance, currency),
-        'bonus': convert_from_usd(wallet.bonus_balance, currency),
-        'total': convert_from_usd(wallet.total_balance(), currency),
-    }
+    wallet_data = dict(zip(
+        ('available', 'locked', 'bonus', 'total'),
+        convert_many([
+            wallet.available_balance,
+            wallet.locked_balance,
+            wallet.bonus_balance,
+            wallet.total_balance(),
+        ], currency),
+    ))
     
 
     # =========================
     # INVESTMENTS
     # =========================
-    active_investments = Investment.objects.filter(
-        user=request.user,
-        status='active'
-    )
-    
-    completed_investments = Investment.objects.filter(
-        user=request.user
-    ).exclude(status='active')
+    # Totals are maintained per user on every investment write
+    portfolio = get_portfolio_summary(request.user)
     
     # =========================
     # PnL CALCULATION (USD → currency)
     # =========================
-    total_profit_usd = completed_investments.filter(
-        profit_loss__gt=0
-    ).aggregate(total=Sum('profit_loss'))['total'] or Decimal('0')
-    
-    total_loss_usd = completed_investments.filter(
-        profit_loss__lt=0
-    ).aggregate(total=Sum('profit_loss'))['total'] or Decimal('0')
+    total_profit_usd = portfolio.total_profit
+    total_loss_usd = portfolio.total_loss
     
     net_pl_usd = total_profit_usd + total_loss_usd
     
-    invested_total_usd = completed_investments.aggregate(
-        total=Sum('invested_amount')
-    )['total'] or Decimal('0')
+    invested_total_usd = portfolio.closed_invested
     
     net_pl_percentage = (
         (net_pl_usd / invested_total_usd) * 100
@@ -309,13 +236,14 @@ def home(request):
     # =========================
     # CONVERT PnL TO USER'S CURRENCY
     # =========================
+    total_profit, total_loss, net_pl = convert_many([total_profit_usd, total_loss_usd, net_pl_usd], currency)
     investment_stats = {
-        'total_profit': convert_from_usd(total_profit_usd, currency),  # Converted!
-        'total_loss': convert_from_usd(total_loss_usd, currency),      # Converted!
-        'net_pl': convert_from_usd(net_pl_usd, currency),              # Converted!
+        'total_profit': total_profit,
+        'total_loss': total_loss,
+        'net_pl': net_pl,
         'net_pl_percentage': round(net_pl_percentage, 2),
         'progress_width': min(abs(net_pl_percentage), 100),
-        'active_investments': active_investments.count(),
+        'active_investments': portfolio.active_count,
     }
     
     # =========================
@@ -325,20 +253,15 @@ def home(request):
         user=request.user
     ).order_by('-created_at')[:5]
     
-    # Convert transaction amounts if needed
-    for transaction in recent_transactions:
-        if hasattr(transaction, 'amount'):
-            transaction.display_amount = convert_from_usd(transaction.amount, currency)
+    # Amounts stay in USD; home.html converts them with the |money filter
     
     context = {
         'wallet': wallet_data,  # ← This contains CONVERTED values
         'investment_stats': investment_stats,  # ← This contains CONVERTED values
-        'active_investments': active_investments,
-        'completed_investments': completed_investments,
         'recent_transactions': recent_transactions,
         'currency_symbol': currency.symbol,
         'currency_code': currency.code,
-        'available_currencies': Currency.objects.filter(is_active=True),
+        'available_currencies': request.user_context.available_currencies,
         'current_currency': currency,
     }
     
@@ -347,17 +270,8 @@ def home(request):
     
 @login_required
 def wallet(request):
-    # FIX: Get or create wallet
-    user_wallet, created = Wallet.objects.get_or_create(
-        user=request.user,
-        defaults={
-            'available_balance': Decimal('0.00'),
-            'locked_balance': Decimal('0.00'),
-            'bonus_balance': Decimal('0.00'),
-            'bonus_claimed': Decimal('0.00'),
-            'currency': 'USD'
-        }
-    )
+    # Get or create wallet
+    user_wallet = request.user_context.wallet
     
     currency = get_user_currency(request)
     
@@ -365,41 +279,31 @@ def wallet(request):
     # WALLET CONVERSION (USD → selected currency)
     # =========================
     # Use the SAME field names as in your dashboard view
-    wallet_data = {
-        'available': convert_from_usd(user_wallet.available_balance, currency),
-        'locked': convert_from_usd(user_wallet.locked_balance, currency),
-        'bonus': convert_from_usd(user_wallet.bonus_balance, currency),
-        'total': convert_from_usd(user_wallet.total_balance(), currency),
-    }
+    wallet_data = dict(zip(
+        ('available', 'locked', 'bonus', 'total'),
+        convert_many([
+            user_wallet.available_balance,
+            user_wallet.locked_balance,
+            user_wallet.bonus_balance,
+            user_wallet.total_balance(),
+        ], currency),
+    ))
     
     # =========================
     # INVESTMENTS
     # =========================
-    active_investments = Investment.objects.filter(
-        user=request.user,
-        status='active'
-    )
-    
-    completed_investments = Investment.objects.filter(
-        user=request.user
-    ).exclude(status='active')
+    # Totals are maintained per user on every investment write
+    portfolio = get_portfolio_summary(request.user)
     
     # =========================
     # PnL CALCULATION (USD → currency)
     # =========================
-    total_profit_usd = completed_investments.filter(
-        profit_loss__gt=0
-    ).aggregate(total=Sum('profit_loss'))['total'] or Decimal('0')
-    
-    total_loss_usd = completed_investments.filter(
-        profit_loss__lt=0
-    ).aggregate(total=Sum('profit_loss'))['total'] or Decimal('0')
+    total_profit_usd = portfolio.total_profit
+    total_loss_usd = portfolio.total_loss
     
     net_pl_usd = total_profit_usd + total_loss_usd
     
-    invested_total_usd = completed_investments.aggregate(
-        total=Sum('invested_amount')
-    )['total'] or Decimal('0')
+    invested_total_usd = portfolio.closed_invested
     
     net_pl_percentage = (
         (net_pl_usd / invested_total_usd) * 100
@@ -409,13 +313,14 @@ def wallet(request):
     # =========================
     # CONVERT PnL TO USER'S CURRENCY
     # =========================
+    total_profit, total_loss, net_pl = convert_many([total_profit_usd, total_loss_usd, net_pl_usd], currency)
     investment_stats = {
-        'total_profit': convert_from_usd(total_profit_usd, currency),
-        'total_loss': convert_from_usd(total_loss_usd, currency),
-        'net_pl': convert_from_usd(net_pl_usd, currency),
+        'total_profit': total_profit,
+        'total_loss': total_loss,
+        'net_pl': net_pl,
         'net_pl_percentage': round(net_pl_percentage, 2),
         'progress_width': min(abs(net_pl_percentage), 100),
-        'active_investments': active_investments.count(),
+        'active_investments': portfolio.active_count,
     }
     
     # =========================
@@ -425,11 +330,6 @@ def wallet(request):
         user=request.user
     ).order_by('-created_at')[:10]  # Show more transactions on wallet page
     
-    # Convert transaction amounts
-    for transaction in recent_transactions:
-        if hasattr(transaction, 'amount'):
-            transaction.display_amount = convert_from_usd(transaction.amount, currency)
-    
     # =========================
     # CONTEXT (Use consistent naming with dashboard)
     # =========================
@@ -437,12 +337,10 @@ def wallet(request):
         'wallet': wallet_data,  # Same key as dashboard for consistency
         'wallet_model': user_wallet,  # The actual model instance
         'investment_stats': investment_stats,
-        'active_investments': active_investments,
-        'completed_investments': completed_investments,
         'recent_transactions': recent_transactions,
         'currency_symbol': currency.symbol,
         'currency_code': currency.code,
-        'available_currencies': Currency.objects.filter(is_active=True),
+        'available_currencies': request.user_context.available_currencies,
         'current_currency': currency,
     }
 
@@ -450,102 +348,81 @@ def wallet(request):
 
 @login_required
 def assets_view(request):
-    """Main assets page with manual price updates"""
-    
-    # FIX: Get or create wallet
-    wallet, created = Wallet.objects.get_or_create(
-        user=request.user,
-        defaults={
-            'available_balance': Decimal('0.00'),
-            'locked_balance': Decimal('0.00'),
-            'bonus_balance': Decimal('0.00'),
-            'bonus_claimed': Decimal('0.00'),
-            'currency': 'USD'
-        }
-    )
+    """Main assets page (read-only; prices come from the price ticker)"""
     
-    currency = get_user_currency(request)
+    # Get or create wallet
+    wallet = request.user_context.wallet
     
-    # Check if we should update prices
-    refresh = request.GET.get('refresh', 'false').lower() == 'true'
-    update_all = request.GET.get('update_all', 'false').lower() == 'true'
+    currency = get_user_currency(request)
     
-    if update_all:
-        # Update all prices
-        updated_count = PriceFetcher.update_all_prices()
-        messages.success(request, f'Updated prices for {updated_count} assets')
-        return redirect('core:assets')
+    # Prices are moved by the `run_price_ticker` daemon; this view only reads
     
     # =========================
     # WALLET SUMMARY
     # =========================
-    wallet_balance = convert_from_usd(wallet.available_balance, currency)
-    wallet_equity = convert_from_usd(wallet.locked_balance, currency)
-    
-    user_investments = Investment.objects.filter(user=request.user)
-    
-    total_invested_usd = user_investments.aggregate(
-        total=Sum('invested_amount')
-    )['total'] or Decimal('0')
-    total_invested = convert_from_usd(total_invested_usd, currency)
-    
-    total_profit_loss_usd = user_investments.aggregate(
-        total=Sum('profit_loss')
-    )['total'] or Decimal('0')
-    total_profit_loss = convert_from_usd(total_profit_loss_usd, currency)
+    portfolio = get_portfolio_summary(request.user)
+    wallet_balance, wallet_equity, total_invested, total_profit_loss = convert_many([
+        wallet.available_balance,
+        wallet.locked_balance,
+        portfolio.total_invested,
+        portfolio.total_profit_loss,
+    ], currency)
     
     # =========================
-    # GET ASSETS WITH OPTIONAL UPDATE
+    # GET ASSETS
     # =========================
     
-    # Update stale prices (older than 5 minutes)
-    stale_assets = Asset.objects.filter(
-        is_active=True,
-        last_updated__lt=datetime.now() - timedelta(minutes=5)  # FIXED: Use timedelta directly
-    )[:10]  # Update max 10 at a time
-    
-    if stale_assets.exists() and refresh:
-        for asset in stale_assets:
-            PriceFetcher.update_asset_price(asset)
-        messages.info(request, f'Refreshed {len(stale_assets)} stale prices')
-    
     # Get all active assets
     market_assets = Asset.objects.filter(is_active=True).order_by('display_order', 'name')
     
-    # Add display prices in user's currency
-    for asset in market_assets:
-        asset.display_price = convert_from_usd(asset.current_price, currency)
-        asset.display_min_investment = convert_from_usd(asset.min_investment, currency)
-        asset.display_max_investment = convert_from_usd(asset.max_investment, currency)
-        asset.last_updated_str = asset.last_updated.strftime("%H:%M:%S") if asset.last_updated else "Never"
-    
     # =========================
     # CATEGORY FILTERS
     # =========================
+    # Filter first so only the shown assets are priced and decorated
     category = request.GET.get('category', 'all')
     if category != 'all':
         market_assets = market_assets.filter(category=category)
     
-    # Group by category for the category filter
+    # Latest prices from the ticker's shared-memory snapshot
+    market_assets = overlay_latest_prices(market_assets)
+    
+    # 24h stats for every asset from one read of hourly candles
+    market_stats = get_24h_stats()
+    
+    # Prices stay in USD; assets.html converts them with the |money filter
+    for asset in market_assets:
+        asset.last_updated_str = asset.last_updated.strftime("%H:%M:%S") if asset.last_updated else "Never"
+        
+        stats = market_stats.get(asset.id)
+        if stats:
+            asset.change_24h = round(stats['change_24h'], 2)
+            asset.high_24h = stats['high_24h']
+            asset.low_24h = stats['low_24h']
+            asset.sparkline_points = sparkline_points(stats['sparkline'])
+    
+    # Counts and movers come from the summary the price ticker maintains
+    market_summary = get_market_summary()
+    
     categories = [
-        {'id': 'all', 'name': 'All Assets', 'count': Asset.objects.filter(is_active=True).count()},
-        {'id': 'crypto', 'name': 'Cryptocurrency', 'count': Asset.objects.filter(category='crypto', is_active=True).count()},
-        {'id': 'forex', 'name': 'Forex', 'count': Asset.objects.filter(category='forex', is_active=True).count()},
-        {'id': 'futures', 'name': 'Futures', 'count': Asset.objects.filter(category='futures', is_active=True).count()},
-        {'id': 'stock', 'name': 'Stocks', 'count': Asset.objects.filter(category='stock', is_active=True).count()},
+        {'id': 'all', 'name': 'All Assets'},
+        {'id': 'crypto', 'name': 'Cryptocurrency'},
+        {'id': 'forex', 'name': 'Forex'},
+        {'id': 'futures', 'name': 'Futures'},
+        {'id': 'stock', 'name': 'Stocks'},
     ]
+    for cat in categories:
+        cat_summary = market_summary.get(cat['id'], {})
+        cat['count'] = cat_summary.get('count', 0)
+        cat['avg_change'] = cat_summary.get('avg_change', 0)
     
     # =========================
     # TOP GAINERS & LOSERS
     # =========================
-    sorted_assets = sorted(
-        market_assets,
-        key=lambda x: x.change_percentage,
-        reverse=True
-    )
+    assets_by_symbol = {asset.symbol: asset for asset in market_assets}
+    selected_summary = market_summary.get(category, {})
     
-    top_gainers = sorted_assets[:5]
-    top_losers = sorted_assets[-5:]
+    top_gainers = [assets_by_symbol[s] for s in selected_summary.get('gainers', []) if s in assets_by_symbol]
+    top_losers = [assets_by_symbol[s] for s in selected_summary.get('losers', []) if s in assets_by_symbol]
     
     # =========================
     # EDUCATIONAL TIPS
@@ -553,7 +430,7 @@ def assets_view(request):
     educational_tips = [
         {
             'title': 'Click Refresh for Latest Prices',
-            'content': 'Prices update automatically every 5 minutes, or click refresh for immediate updates.'
+            'content': 'Prices update automatically in the background; refresh the page to see the latest values.'
         },
         {
             'title': 'Filter by Asset Type',
@@ -569,6 +446,11 @@ def assets_view(request):
         }
     ]
     
+    # Read from the ticker's shared-memory snapshot when it is running
+    stale_count = count_stale(Asset.stale_cutoff())
+    if stale_count is None:
+        stale_count = Asset.objects.filter(is_active=True, last_updated__lt=Asset.stale_cutoff()).count()
+    
     context = {
         # Wallet Summary
         'wallet_balance': wallet_balance,
@@ -590,17 +472,86 @@ def assets_view(request):
         'currency_symbol': currency.symbol,
         'currency_code': currency.code,
         'current_currency': currency,
-        'available_currencies': Currency.objects.filter(is_active=True),
+        'available_currencies': request.user_context.available_currencies,
         
         # Refresh info
         'last_refresh': datetime.now().strftime("%H:%M:%S"),
-        'stale_count': stale_assets.count(),
+        'stale_count': stale_count,
     }
     
     return render(request, 'assets.html', context)
 
 
 
+def _request_price_version(request):
+    # Cached on the request so the ETag check and the view read it once
+    if not hasattr(request, '_price_version'):
+        request._price_version = price_version()
+    return request._price_version
+
+
+def _price_etag(request):
+    seq, count = _request_price_version(request)
+    return f"{seq}-{count}"
+
+
+@login_required
+@condition(etag_func=_price_etag)
+def price_api(request):
+    """
+    Compact JSON prices (USD) for polling clients.
+    Send If-None-Match to get a 304 while nothing has ticked, and
+    ?since=<seq> from the previous response to get only changed assets.
+    Rows are [price, change_percentage, updated_epoch].
+    """
+    since = request.GET.get('since')
+    if since is not None:
+        try:
+            since = from_seq(int(since))
+        except (ValueError, OverflowError, OSError):
+            return JsonResponse({'error': 'since must be a seq from a previous response'}, status=400)
+    
+    seq, _ = _request_price_version(request)
+    prices = get_latest_prices(since=since)
+    return JsonResponse({
+        'seq': seq,
+        'currency': 'USD',
+        'full': since is None,
+        'prices': {
+            symbol: [
+                round(latest['price'], 6),
+                round(latest['change'], 2),
+                int(latest['updated'].timestamp()) if latest['updated'] else 0,
+            ]
+            for symbol, latest in prices.items()
+        },
+    })
+
+
+async def price_stream(request):
+    """
+    Server-Sent Events stream of price changes for the assets page.
+    Needs an ASGI server (uvicorn pesaprime_v1.asgi:application).
+    """
+    if not isinstance(request, ASGIRequest):
+        return HttpResponse('Live prices require the ASGI server', status=501)
+    
+    is_authenticated = await sync_to_async(lambda: request.user.is_authenticated)()
+    if not is_authenticated:
+        return HttpResponse(status=401)
+    
+    subscriber = broadcaster.subscribe()
+    if subscriber is None:
+        response = HttpResponse('Too many live price connections', status=503)
+        response['Retry-After'] = '30'
+        return response
+    
+    response = StreamingHttpResponse(event_stream(subscriber), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
 @login_required
 def bonus_list(request):
     user = request.user
@@ -609,27 +560,10 @@ def bonus_list(request):
     currency = get_user_currency(request)
     
     # Get wallet
-    try:
-        wallet = Wallet.objects.get(user=user)
-    except Wallet.DoesNotExist:
-        wallet = Wallet.objects.create(
-            user=user,
-            available_balance=Decimal('0.00'),
-            locked_balance=Decimal('0.00'),
-            bonus_balance=Decimal('0.00'),
-            bonus_claimed=Decimal('0.00'),
-            currency='USD'
-        )
+    wallet = request.user_context.wallet
     
     # Get investments - FIXED: Use the actual model name
-    investments = Investment.objects.filter(user=user, status='active')
-    
-    total_invested = investments.aggregate(
-        total=Sum('invested_amount')
-    )['total'] or Decimal('0.00')
-    
-    # Convert total invested to user's currency
-    converted_total_invested = convert_from_usd(total_invested, currency)
+    total_invested = get_portfolio_summary(user).active_invested
     
     # Get available bonuses - FIXED: Check if Bonus model exists
     try:
@@ -648,21 +582,22 @@ def bonus_list(request):
         available_bonuses = []
         total_bonuses = Decimal('0.00')
     
-    # Convert bonuses for display
+    # Convert bonuses and totals to user's currency, in one pass
+    available_bonuses = list(available_bonuses)
+    *bonus_amounts, converted_total_bonuses, converted_wallet_balance, converted_total_invested = convert_many(
+        [b.amount for b in available_bonuses] + [total_bonuses, wallet.available_balance, total_invested],
+        currency,
+    )
     converted_available = []
-    for b in available_bonuses:
+    for b, amount in zip(available_bonuses, bonus_amounts):
         converted_available.append({
             'id': b.id,
             'title': b.title,
-            'amount': convert_from_usd(b.amount, currency),
+            'amount': amount,
             'description': b.description,
             'bonus_type': b.get_bonus_type_display(),
         })
     
-    # Convert totals
-    converted_total_bonuses = convert_from_usd(total_bonuses, currency)
-    converted_wallet_balance = convert_from_usd(wallet.available_balance, currency)
-    
     # Calculate available balance
     wallet_balance = converted_wallet_balance - converted_total_invested
     
@@ -676,24 +611,24 @@ def bonus_list(request):
             
             bonus = Bonus.objects.get(id=bonus_id, user=user, is_claimed=False)
             
-            # Add bonus to wallet (in USD)
-            wallet.available_balance += bonus.amount
-            wallet.save()
-            
-            # Create transaction record
-            Transaction.objects.create(
-                user=user,
-                wallet=wallet,
-                transaction_type='bonus',
-                payment_method='system',
-                amount=bonus.amount,
-                status='completed',
-                description=f"Claimed bonus: {bonus.title}"
-            )
-            
-            # Mark bonus as claimed
-            bonus.is_claimed = True
-            bonus.save()
+            with db_transaction.atomic():
+                # Mark bonus as claimed; a concurrent claim of the same bonus matches nothing
+                if not Bonus.objects.filter(id=bonus.id, is_claimed=False).update(is_claimed=True):
+                    raise Bonus.DoesNotExist("Bonus already claimed")
+                
+                # Create transaction record
+                record = Transaction.objects.create(
+                    user=user,
+                    wallet=wallet,
+                    transaction_type='bonus',
+                    payment_method='system',
+                    amount=bonus.amount,
+                    status='completed',
+                    description=f"Claimed bonus: {bonus.title}"
+                )
+                
+                # Add bonus to wallet (in USD)
+                balances.credit(wallet, bonus.amount, reference=record.reference)
             
             messages.success(request, f'Bonus "{bonus.title}" claimed successfully!')
             return redirect('core:bonus_list')
@@ -721,14 +656,10 @@ def number_carousel_view(request):
     import random
     numbers = []
     
-    # Generate amounts in USD first, then convert to user's currency
-    for _ in range(20):
-        # Generate amount in USD
-        amount_usd = random.randint(50, 1000)  # USD amounts
-        
-        # Convert to user's currency
-        amount_converted = convert_from_usd(amount_usd, currency)
-        
+    # Generate amounts in USD first, then convert to user's currency in one pass
+    amounts_usd = [random.randint(50, 1000) for _ in range(20)]  # USD amounts
+    
+    for amount_usd, amount_converted in zip(amounts_usd, convert_many(amounts_usd, currency)):
         numbers.append({
             'phone': f"+254 7{random.randint(10, 99)} xxx {random.randint(10, 99)}",
             'profit': random.choice([25, 22, -3, -43, 50, 75, -15, -30, 10, 35, -5, 60, -2, -28, 2, 90, -45, 20, -10, 45, 5, -20, 30]),
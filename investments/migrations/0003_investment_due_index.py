@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('investments', '0002_delete_asset_remove_investment_profit_loss_and_more'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='investment',
+            index=models.Index(fields=['status', 'end_time'], name='investments_due_idx'),
+        ),
+    ]
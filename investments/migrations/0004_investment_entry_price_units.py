@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:39
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('assets', '0004_pricecandle'),
+        ('investments', '0003_investment_due_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='investment',
+            name='entry_price',
+            field=models.DecimalField(blank=True, decimal_places=6, max_digits=20, null=True),
+        ),
+        migrations.AddField(
+            model_name='investment',
+            name='units',
+            field=models.DecimalField(blank=True, decimal_places=10, max_digits=30, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='investment',
+            index=models.Index(fields=['updated_at'], name='investments_updated_idx'),
+        ),
+    ]
@@ -20,6 +20,10 @@ class Investment(models.Model):
     asset = models.ForeignKey('assets.Asset', on_delete=models.CASCADE)
     
     invested_amount = models.DecimalField(max_digits=20, decimal_places=2)
+    # Asset price when opened and invested_amount / entry_price, for
+    # mark-to-market; null on investments opened before they were recorded
+    entry_price = models.DecimalField(max_digits=20, decimal_places=6, null=True, blank=True)
+    units = models.DecimalField(max_digits=30, decimal_places=10, null=True, blank=True)
     duration_hours = models.PositiveIntegerField(default=3)
     
     # Time tracking
@@ -38,6 +42,12 @@ class Investment(models.Model):
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # settle_investments: status='active' AND end_time <= now
+            models.Index(fields=['status', 'end_time'], name='investments_due_idx'),
+            # Mark-to-market reloads positions when MAX(updated_at) moves
+            models.Index(fields=['updated_at'], name='investments_updated_idx'),
+        ]
     
     def __str__(self):
         return f"{self.user.username} - {self.asset.name} - {self.invested_amount}"
@@ -82,33 +92,53 @@ class Investment(models.Model):
         
         # Base profit based on expected return
         base_profit = self.expected_profit
+        previous_profit_loss = self.actual_profit_loss
         
         # Add some randomness (±20%)
         random_factor = Decimal(str(random.uniform(0.8, 1.2)))
-        self.actual_profit_loss = base_profit * random_factor
-        
-        self.status = 'completed'
+        self.actual_profit_loss = (base_profit * random_factor).quantize(Decimal('0.01'))
         self.completed_at = timezone.now()
-        self.save()
-        
-        # Update user's wallet
-        wallet = self.user.wallet
-        total_amount = self.invested_amount + self.actual_profit_loss
         
-        wallet.locked_balance -= self.invested_amount
-        wallet.available_balance += total_amount
-        wallet.save()
-        
-        # Create transaction record
+        from django.db import transaction
+        from core.services import balances
+        from core.services.portfolio import record_change
+        from core.services.settlement import settlement_reference
         from wallet.models import Transaction
-        Transaction.objects.create(
-            user=self.user,
-            wallet=wallet,
-            transaction_type='profit',
-            payment_method='system',
-            amount=self.actual_profit_loss,
-            status='completed',
-            description=f"Profit from {self.asset.name} investment"
-        )
+        
+        with transaction.atomic():
+            # Only one of concurrent completions (or the settlement batch) wins
+            completed = Investment.objects.filter(pk=self.pk, status='active').update(
+                status='completed',
+                actual_profit_loss=self.actual_profit_loss,
+                completed_at=self.completed_at,
+                updated_at=self.completed_at,
+            )
+            if not completed:
+                return
+            self.status = 'completed'
+            # The UPDATE sends no signals
+            record_change(
+                (self.user_id, 'active', self.invested_amount, previous_profit_loss),
+                (self.user_id, 'completed', self.invested_amount, self.actual_profit_loss),
+            )
+            
+            # Create transaction record
+            wallet = self.user.wallet
+            record = Transaction.objects.create(
+                user=self.user,
+                wallet=wallet,
+                transaction_type='profit',
+                payment_method='system',
+                amount=self.actual_profit_loss,
+                status='completed',
+                reference=settlement_reference(self.pk),
+                description=f"Profit from {self.asset.name} investment"
+            )
+            
+            # Update user's wallet
+            balances.release(
+                wallet, self.invested_amount, self.invested_amount + self.actual_profit_loss,
+                reference=record.reference,
+            )
         
         return self.actual_profit_loss
\ No newline at end of file
@@ -1,3 +1,89 @@
-from django.test import TestCase
+from datetime import datetime, timedelta
+from decimal import Decimal
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone as dj_timezone
+
+from assets.models import Asset
+from core.models import Currency
+from core.services.currencies import bump_version
+from core.services.mark_to_market import MarkToMarket
+from core.services.settlement import settle_chunk
+from investments.models import Investment
+from wallet.models import Wallet
+
+
+@override_settings(TIME_ZONE='Africa/Nairobi')
+class AssetPriceHistoryTests(TestCase):
+
+    def setUp(self):
+        Currency.objects.create(code='USD', name='US Dollar', symbol='$')
+        # Signals bump the table version on commit, which a TestCase never reaches
+        bump_version()
+        user = get_user_model().objects.create_user(username='trader', email='trader@example.com', phone='1', password='x')
+        self.client.force_login(user)
+        asset = Asset.objects.create(name='AAA', symbol='AAA', category='stock', current_price=Decimal('100'))
+        self.url = reverse('investments:asset_price_history', args=[asset.id])
+
+    def bounds(self, **params):
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, 200, response.content)
+        data = response.json()
+        return datetime.fromisoformat(data['start']), datetime.fromisoformat(data['end'])
+
+    def test_naive_bounds_are_in_the_current_timezone(self):
+        start, end = self.bounds(start='2026-01-01T00:00:00', end='2026-01-02T00:00:00')
+
+        self.assertEqual(start.utcoffset(), timedelta(hours=3))
+        self.assertEqual(end - start, timedelta(days=1))
+
+    def test_end_without_start(self):
+        start, end = self.bounds(end='2026-01-08T00:00:00+00:00', range='7d')
+
+        self.assertEqual(end, datetime.fromisoformat('2026-01-08T00:00:00+00:00'))
+        self.assertEqual(end - start, timedelta(days=7))
+
+    def test_start_without_end_runs_to_now(self):
+        before = dj_timezone.now()
+        start, end = self.bounds(start='2026-01-01T00:00:00+00:00')
+
+        self.assertEqual(start, datetime.fromisoformat('2026-01-01T00:00:00+00:00'))
+        self.assertGreaterEqual(end, before)
+
+    def test_invalid_bounds(self):
+        for params in ({'start': 'yesterday'}, {'end': '2026-13-01T00:00:00'},
+                       {'start': '2026-01-02T00:00:00', 'end': '2026-01-01T00:00:00'}):
+            with self.subTest(params=params):
+                self.assertEqual(self.client.get(self.url, params).status_code, 400)
+
+
+class PortfolioApiTests(TestCase):
+
+    def setUp(self):
+        Currency.objects.create(code='USD', name='US Dollar', symbol='$')
+        bump_version()
+        self.user = get_user_model().objects.create_user(username='trader', email='trader@example.com', phone='1', password='x')
+        Wallet.objects.create(user=self.user, available_balance=Decimal('1000.00'))
+        self.client.force_login(self.user)
+        self.asset = Asset.objects.create(name='AAA', symbol='AAA', category='stock', current_price=Decimal('100'))
+
+    def test_apis_follow_investments_opened_through_invest_asset(self):
+        response = self.client.post(
+            reverse('investments:invest_asset', args=[self.asset.id]), {'amount': '100', 'duration_hours': '1'}
+        )
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(Investment.objects.get().units, Decimal('1'))
+
+        self.asset.update_price(Decimal('110'))
+        MarkToMarket()([self.asset])
+        pnl = self.client.get(reverse('investments:pnl_api')).json()
+        self.assertEqual((pnl['total_invested'], pnl['current_value'], pnl['pnl']), (100.0, 110.0, 10.0))
+
+        settle_chunk(dj_timezone.now() + timedelta(hours=2), 10)
+        stats = self.client.get(reverse('investments:investment_stats_api')).json()
+        profit = float(Investment.objects.get().actual_profit_loss)
+        self.assertEqual(stats['active_investments'], 0)
+        self.assertEqual(stats['total_profit'], profit)
+        self.assertEqual(self.client.get(reverse('investments:pnl_api')).json()['total_invested'], 0.0)
@@ -5,8 +5,11 @@ app_name = 'investments'
 
 urlpatterns = [
     path('assets/<uuid:asset_id>/', views.asset_detail, name='asset_detail'),
+    path('assets/<uuid:asset_id>/history/', views.asset_price_history, name='asset_price_history'),
     path('asset/<uuid:asset_id>/invest/', views.invest_asset, name='invest_asset'),  # UUID
     path('active/', views.active_investments, name='active_investments'),
     path('history/', views.investment_history, name='history'),
     path('withdraw/<uuid:investment_id>/', views.withdraw_investment, name='withdraw'),  # Also UUID
+    path('api/pnl/', views.pnl_api, name='pnl_api'),
+    path('api/stats/', views.investment_stats_api, name='investment_stats_api'),
 ]
\ No newline at end of file
@@ -1,41 +1,48 @@
-from datetime import datetime,timedelta, timezone
-import random
+from datetime import datetime,timedelta
+from datetime import timezone as dt_timezone
+import hashlib
+import json
+from django.http import JsonResponse
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
+from django.views.decorators.http import condition
 from django.contrib import messages
+from django.db import transaction as db_transaction
 from django.db.models import Sum
+from django.utils import timezone
 from decimal import Decimal
 
 from assets.models import Asset
-from wallet.models import Transaction, Wallet
-from core.utils.currency import get_user_currency, convert_from_usd
+from wallet.models import Transaction
+from core.models import UnrealizedPnL
+from core.services import balances
+from core.services.candles import get_24h_stats
+from core.services.idempotency import idempotent
+from core.services.maturity import notify_maturity
+from core.services.portfolio import get_portfolio_summary, record_change
+from core.services.settlement import settlement_reference
+from core.services.price_history import DEFAULT_POINTS, RANGES, get_price_series
+from core.services.price_snapshot import overlay_latest_prices
+from core.utils.currency import get_user_currency, convert_from_usd, convert_many
 from .models import Investment
 
+# Points rendered inline on the asset detail chart
+PERFORMANCE_CHART_POINTS = 60
+
 @login_required
 def asset_detail(request, asset_id):  # asset_id is UUID
     """View asset details for potential investment"""
-    import random
-    from decimal import Decimal
-    from django.utils import timezone
     
     asset = get_object_or_404(Asset, id=asset_id)
+    # Latest price from the ticker's shared-memory snapshot
+    overlay_latest_prices([asset])
     currency = get_user_currency(request)
     
     # Get user's wallet for balance display
-    try:
-        wallet = Wallet.objects.get(user=request.user)
-        wallet_balance_display = convert_from_usd(wallet.available_balance, currency)
-    except Wallet.DoesNotExist:
-        wallet_balance_display = Decimal('0.00')
+    wallet_balance_display = convert_from_usd(request.user_context.wallet.available_balance, currency)
     
-    # Convert prices to user's currency
-    current_price = getattr(asset, 'current_price', Decimal('100.00'))
+    # Prices stay in USD; asset_detail.html converts them with the |money filter
     min_investment = getattr(asset, 'min_investment', Decimal('10.00'))
-    max_investment = getattr(asset, 'max_investment', Decimal('10000.00'))
-    
-    asset.display_price = convert_from_usd(current_price, currency)
-    asset.display_min_investment = convert_from_usd(min_investment, currency)
-    asset.display_max_investment = convert_from_usd(max_investment, currency)
     
     # Get allowed durations and calculate expected returns
     # Use default durations if none specified
@@ -90,41 +97,49 @@ def asset_detail(request, asset_id):  # asset_id is UUID
         
         option['example_profit'] = {
             'usd': profit_usd,
-            'display': convert_from_usd(profit_usd, currency),
             'total_usd': min_investment + profit_usd,
-            'total_display': convert_from_usd(min_investment + profit_usd, currency),
         }
     
-    # Get asset performance history (simulated)
+    # Converted in one pass
+    examples = [option['example_profit'] for option in duration_options]
+    displays = convert_many([e['usd'] for e in examples] + [e['total_usd'] for e in examples], currency)
+    for example, display, total_display in zip(examples, displays, displays[len(examples):]):
+        example['display'] = display
+        example['total_display'] = total_display
+    
+    # Get asset performance history from recorded ticks
+    timestamps, prices = get_price_series(
+        asset,
+        start=timezone.now() - RANGES['30d'],
+        points=PERFORMANCE_CHART_POINTS,
+    )
     performance_history = []
-    for i in range(30, 0, -1):
-        # Simulate price fluctuations (convert float to Decimal)
-        base_price = current_price
-        fluctuation = Decimal(str(random.uniform(-0.05, 0.05)))  # Convert float to Decimal
-        simulated_price = base_price * (Decimal('1') + fluctuation)
-        
+    previous = None
+    for ts, price, display_price in zip(timestamps, prices, convert_many(prices, currency)):
         performance_history.append({
-            'date': timezone.now() - timezone.timedelta(days=i),
-            'price': convert_from_usd(simulated_price, currency),
-            'change': float(fluctuation * Decimal('100'))  # Convert to float for template
+            'date': datetime.fromtimestamp(ts, tz=dt_timezone.utc),
+            'price': display_price,
+            'change': ((price - previous) / previous * 100) if previous else 0.0,
         })
+        previous = price
+    
+    # 24h change and range from hourly candles
+    market_stats = get_24h_stats([asset.id]).get(asset.id)
+    if market_stats:
+        high_24h, low_24h = convert_many([market_stats['high_24h'], market_stats['low_24h']], currency)
+        market_stats = {
+            'change_24h': round(market_stats['change_24h'], 2),
+            'high_24h': high_24h,
+            'low_24h': low_24h,
+        }
     
     # Get similar assets
     similar_assets = Asset.objects.filter(
         category=asset.category,
         is_active=True
     ).exclude(id=asset.id).order_by('?')[:4]
-    
-    # Convert prices for similar assets
-    for similar_asset in similar_assets:
-        similar_asset.display_price = convert_from_usd(
-            getattr(similar_asset, 'current_price', Decimal('100.00')),
-            currency
-        )
-        similar_asset.display_min_investment = convert_from_usd(
-            getattr(similar_asset, 'min_investment', Decimal('10.00')),
-            currency
-        )
+    # Priced from the snapshot; converted in the template with |money
+    similar_assets = overlay_latest_prices(similar_assets)
     
     context = {
         'asset': asset,
@@ -133,6 +148,7 @@ def asset_detail(request, asset_id):  # asset_id is UUID
         'wallet_balance': wallet_balance_display,
         'duration_options': duration_options,
         'performance_history': performance_history,
+        'market_stats': market_stats,
         'similar_assets': similar_assets,
         'default_duration': 3,  # Default selection
     }
@@ -141,8 +157,69 @@ def asset_detail(request, asset_id):  # asset_id is UUID
 
 
 @login_required
+def asset_price_history(request, asset_id):
+    """
+    JSON price series for charts, downsampled server-side.
+    Query params: range (1h/24h/7d/30d), start/end (ISO 8601, naive times
+    are in TIME_ZONE), points. A missing end is now; a missing start is
+    `range` before the end.
+    """
+    from django.utils.dateparse import parse_datetime
+    
+    asset = get_object_or_404(Asset, id=asset_id)
+    currency = get_user_currency(request)
+    
+    try:
+        points = int(request.GET.get('points', DEFAULT_POINTS))
+    except ValueError:
+        return JsonResponse({'error': 'points must be an integer'}, status=400)
+    
+    range_key = request.GET.get('range', '30d')
+    if range_key not in RANGES:
+        return JsonResponse({'error': f"range must be one of: {', '.join(RANGES)}"}, status=400)
+    
+    # Each bound applies on its own
+    bounds = {}
+    for name in ('start', 'end'):
+        if name not in request.GET:
+            continue
+        try:
+            value = parse_datetime(request.GET[name])
+        except ValueError:
+            value = None
+        if value is None:
+            return JsonResponse({'error': 'start/end must be ISO 8601 datetimes'}, status=400)
+        if timezone.is_naive(value):
+            value = timezone.make_aware(value)
+        bounds[name] = value
+    
+    end = bounds.get('end') or timezone.now()
+    start = bounds.get('start') or end - RANGES[range_key]
+    if start >= end:
+        return JsonResponse({'error': 'start must be before end'}, status=400)
+    
+    timestamps, prices = get_price_series(asset, start, end, points)
+    
+    # Convert the whole series to the user's currency in one pass
+    prices = prices * float(currency.exchange_rate)
+    
+    return JsonResponse({
+        'symbol': asset.symbol,
+        'currency': currency.code,
+        'start': start.isoformat(),
+        'end': end.isoformat(),
+        'points': [
+            [int(ts * 1000), round(price, 6)]
+            for ts, price in zip(timestamps.tolist(), prices.tolist())
+        ],
+    })
+
+
+@login_required
+@idempotent
 def invest_asset(request, asset_id):
     """Invest in a specific asset with duration"""
+    
     if request.method == 'POST':
         asset = get_object_or_404(Asset, id=asset_id)
         currency = get_user_currency(request)
@@ -157,7 +234,7 @@ def invest_asset(request, asset_id):
                 return redirect('investments:asset_detail', asset_id=asset_id)
             
             # Get user's wallet
-            wallet = Wallet.objects.get(user=request.user)
+            wallet = request.user_context.wallet
             
             # Convert amount from user's currency to USD for storage
             amount_usd = amount_display / currency.exchange_rate
@@ -169,40 +246,43 @@ def invest_asset(request, asset_id):
                 messages.error(request, f'Minimum investment is {currency.symbol}{min_investment_display:.2f}')
                 return redirect('investments:asset_detail', asset_id=asset_id)
             
-            # Check if user has enough balance (compare USD to USD)
-            if wallet.available_balance >= amount_usd:
-                # Create investment with duration
-                investment = Investment.objects.create(
-                    user=request.user,
-                    asset=asset,
-                    invested_amount=amount_usd,
-                    duration_hours=duration_hours,
-                    status='active',
-                    end_time=datetime.now() + timedelta(hours=duration_hours)
-                )
-                
-                # Update wallet
-                wallet.available_balance -= amount_usd
-                wallet.locked_balance += amount_usd
-                wallet.save()
-                
-                # Create transaction record
-                Transaction.objects.create(
-                    user=request.user,
-                    wallet=wallet,
-                    transaction_type='investment',
-                    payment_method='wallet',
-                    amount=-amount_usd,  # Negative for investment
-                    status='completed',
-                    description=f"Invested in {asset.name} for {duration_hours} hours"
-                )
-                
-                messages.success(request, f'Successfully invested {currency.symbol}{amount_display:.2f} in {asset.name} for {duration_hours} hours')
-                return redirect('core:assets')
-            else:
+            try:
+                with db_transaction.atomic():
+                    # Create investment with duration
+                    investment = Investment.objects.create(
+                        user=request.user,
+                        asset=asset,
+                        invested_amount=amount_usd,
+                        entry_price=asset.current_price,
+                        units=amount_usd / asset.current_price if asset.current_price else None,
+                        duration_hours=duration_hours,
+                        status='active',
+                        end_time=timezone.now() + timedelta(hours=duration_hours)
+                    )
+                    
+                    # Create transaction record
+                    record = Transaction.objects.create(
+                        user=request.user,
+                        wallet=wallet,
+                        transaction_type='investment',
+                        payment_method='wallet',
+                        amount=-amount_usd,  # Negative for investment
+                        status='completed',
+                        description=f"Invested in {asset.name} for {duration_hours} hours"
+                    )
+                    
+                    # Lock the funds last (only if the balance covers them);
+                    # the wallet row stays locked until commit
+                    balances.lock(wallet, amount_usd, reference=record.reference)
+                    db_transaction.on_commit(lambda: notify_maturity(investment.id, investment.end_time))
+            except balances.InsufficientFunds:
                 # Show helpful error message with both currencies
+                wallet.refresh_from_db(fields=['available_balance'])
                 available_display = convert_from_usd(wallet.available_balance, currency)
                 messages.error(request, f'Insufficient balance. You have {currency.symbol}{available_display:.2f} available, trying to invest {currency.symbol}{amount_display:.2f}')
+            else:
+                messages.success(request, f'Successfully invested {currency.symbol}{amount_display:.2f} in {asset.name} for {duration_hours} hours')
+                return redirect('core:assets')
                 
         except (ValueError, TypeError) as e:
             messages.error(request, f'Invalid amount specified: {str(e)}')
@@ -214,6 +294,7 @@ def invest_asset(request, asset_id):
 @login_required
 def withdraw_investment(request, investment_id):  # investment_id is UUID
     """Withdraw from an investment"""
+    
     investment = get_object_or_404(Investment, id=investment_id, user=request.user)
     
     if investment.status != 'active':
@@ -221,20 +302,29 @@ def withdraw_investment(request, investment_id):  # investment_id is UUID
         return redirect('investments:active_investments')
     
     # Get user's wallet
-    wallet = Wallet.objects.get(user=request.user)
+    wallet = request.user_context.wallet
     currency = get_user_currency(request)
     
     # Calculate total to withdraw (invested amount + profit)
-    total_withdraw_usd = investment.invested_amount + investment.profit_loss
+    total_withdraw_usd = investment.invested_amount + investment.actual_profit_loss
     
-    # Update investment status
-    investment.status = 'completed'
-    investment.save()
-    
-    # Update wallet
-    wallet.locked_balance -= investment.invested_amount
-    wallet.balance += total_withdraw_usd
-    wallet.save()
+    with db_transaction.atomic():
+        # Update investment status; a concurrent withdraw or settlement matches nothing
+        if not Investment.objects.filter(pk=investment.pk, status='active').update(
+            status='completed', completed_at=timezone.now(), updated_at=timezone.now(),
+        ):
+            messages.error(request, 'This investment is not active')
+            return redirect('investments:active_investments')
+        record_change(
+            (investment.user_id, 'active', investment.invested_amount, investment.actual_profit_loss),
+            (investment.user_id, 'completed', investment.invested_amount, investment.actual_profit_loss),
+        )
+        
+        # Update wallet
+        balances.release(
+            wallet, investment.invested_amount, total_withdraw_usd,
+            reference=settlement_reference(investment.id),
+        )
     
     total_withdraw_display = convert_from_usd(total_withdraw_usd, currency)
     messages.success(request, f'Successfully withdrew {currency.symbol}{total_withdraw_display:.2f}')
@@ -252,14 +342,11 @@ def active_investments(request):
     
     currency = get_user_currency(request)
     
-    # Convert amounts for display
-    for investment in investments:
-        investment.display_invested = convert_from_usd(investment.invested_amount, currency)
-        investment.display_profit = convert_from_usd(investment.profit_loss, currency)
-    
+    # Amounts stay in USD; the template converts them with the |money filter
     context = {
         'investments': investments,
         'currency_symbol': currency.symbol,
+        'current_currency': currency,
     }
     
     return render(request, 'investments/active.html', context)
@@ -273,14 +360,97 @@ def investment_history(request):
     
     currency = get_user_currency(request)
     
-    # Convert amounts for display
-    for investment in investments:
-        investment.display_invested = convert_from_usd(investment.invested_amount, currency)
-        investment.display_profit = convert_from_usd(investment.profit_loss, currency)
+    # Convert amounts for display at the rates of the day: invested at the
+    # start, profit when settled
+    invested = convert_many(
+        [investment.invested_amount for investment in investments],
+        currency,
+        at=[investment.start_time for investment in investments],
+    )
+    profits = convert_many(
+        [investment.actual_profit_loss for investment in investments],
+        currency,
+        at=[investment.completed_at or investment.end_time for investment in investments],
+    )
     
     context = {
         'investments': investments,
+        # (investment, invested, profit) rows, converted
+        'investment_rows': list(zip(investments, invested, profits)),
         'currency_symbol': currency.symbol,
     }
     
-    return render(request, 'investments/history.html', context)
\ No newline at end of file
+    return render(request, 'investments/history.html', context)
+
+# =========================
+# POLLING APIS (dashboard live stats)
+# =========================
+def _cached_payload(request, build):
+    # The ETag check and the view share one build per request
+    if not hasattr(request, '_poll_payload'):
+        request._poll_payload = build(request)
+    return request._poll_payload
+
+
+def _payload_etag(build):
+    def etag(request, *args, **kwargs):
+        payload = json.dumps(_cached_payload(request, build), sort_keys=True)
+        return hashlib.md5(payload.encode()).hexdigest()
+    return etag
+
+
+def _poll_response(request, build):
+    response = JsonResponse(_cached_payload(request, build))
+    # Let the browser keep the body and revalidate with If-None-Match
+    response['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+def _display(amount, currency):
+    return float(convert_from_usd(amount, currency))
+
+
+def _pnl_payload(request):
+    currency = get_user_currency(request)
+    portfolio = get_portfolio_summary(request.user)
+    unrealized = UnrealizedPnL.objects.filter(user=request.user).first() or UnrealizedPnL()
+    return {
+        'currency': currency.code,
+        'total_invested': _display(portfolio.active_invested, currency),
+        'current_value': _display(unrealized.market_value, currency),
+        'pnl': _display(unrealized.unrealized_pnl, currency),
+    }
+
+
+def _investment_stats_payload(request):
+    currency = get_user_currency(request)
+    portfolio = get_portfolio_summary(request.user)
+    
+    net_pl = portfolio.total_profit + portfolio.total_loss
+    net_pl_percentage = (
+        net_pl / portfolio.closed_invested * 100
+        if portfolio.closed_invested > 0 else Decimal('0')
+    )
+    return {
+        'currency': currency.code,
+        'total_profit': _display(portfolio.total_profit, currency),
+        'total_loss': _display(portfolio.total_loss, currency),
+        'net_pl': _display(net_pl, currency),
+        'net_pl_percentage': float(round(net_pl_percentage, 2)),
+        'progress_width': float(min(abs(net_pl_percentage), 100)),
+        'active_investments': portfolio.active_count,
+    }
+
+
+@login_required
+@condition(etag_func=_payload_etag(_pnl_payload))
+def pnl_api(request):
+    """Open positions: invested, marked-to-market value and unrealized P&L"""
+    return _poll_response(request, _pnl_payload)
+
+
+@login_required
+@condition(etag_func=_payload_etag(_investment_stats_payload))
+def investment_stats_api(request):
+    """Closed positions: realized profit/loss totals, as shown on the dashboard"""
+    return _poll_response(request, _investment_stats_payload)
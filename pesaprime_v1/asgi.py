@@ -3,6 +3,10 @@ ASGI config for pesaprime_v1 project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Serve it with an ASGI server (e.g. ``uvicorn pesaprime_v1.asgi:application``)
+for the live price stream at ``core:price_stream``; under WSGI that endpoint
+answers 501 and pages fall back to manual refresh.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 """
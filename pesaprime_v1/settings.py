@@ -62,6 +62,7 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'core.middleware.UserContextMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -142,6 +143,73 @@ USE_TZ = True
 
 STATIC_URL = 'static/'
 
+# Market data
+# Cadence of `run_price_ticker` and the age after which a price is stale
+# (Asset.needs_update, `run_price_ticker --only-stale`)
+PRICE_TICK_INTERVAL_SECONDS = 5
+PRICE_STALE_AFTER_SECONDS = 300
+
+# Where prices come from (see core.services.market_data). Example HTTP source:
+# MARKET_DATA_PROVIDER = {
+#     'BACKEND': 'core.services.market_data.HttpJsonProvider',
+#     'OPTIONS': {'url': 'https://prices.example.com/v1/quotes', 'timeout': 2.0},
+# }
+MARKET_DATA_PROVIDER = {
+    'BACKEND': 'core.services.market_data.SimulatedProvider',
+    'OPTIONS': {},
+}
+
+# Shared-memory segment the ticker publishes latest prices to (one per host)
+PRICE_SNAPSHOT_NAME = 'pesaprime_prices'
+PRICE_SNAPSHOT_CAPACITY = 10000
+
+# Live price stream (SSE, ASGI only): per-worker connection cap and timings
+PRICE_STREAM_MAX_CONNECTIONS = 500
+PRICE_STREAM_POLL_SECONDS = 1.0
+PRICE_STREAM_HEARTBEAT_SECONDS = 15
+PRICE_STREAM_MAX_SECONDS = 300
+
+# Raw PriceTick rows older than this are removed by `prune_price_ticks`
+PRICE_TICK_RETENTION_DAYS = 30
+
+# Investments
+# Matured investments settled per transaction by `settle_investments`
+SETTLEMENT_CHUNK_SIZE = 1000
+
+# `run_settlement_scheduler`: UDP address invest_asset notifies about new
+# investments, how far ahead maturities are loaded and how often to reload
+SETTLEMENT_NOTIFY_ADDRESS = ('127.0.0.1', 8799)
+SETTLEMENT_HORIZON_SECONDS = 3600
+SETTLEMENT_RELOAD_SECONDS = 60
+
+# Wallet
+# Balance updates that wait longer than this for the wallet row lock are logged
+WALLET_LOCK_WARN_SECONDS = 0.25
+
+# How long a keyed invest/deposit/withdraw POST is replayed to retries;
+# expired keys are removed by `prune_idempotency_keys`
+IDEMPOTENCY_KEY_TTL_SECONDS = 24 * 60 * 60
+# A key whose request never finished (worker killed mid-request) can be
+# claimed again after this long
+IDEMPOTENCY_CLAIM_TIMEOUT_SECONDS = 5 * 60
+
+# Currencies
+# How often each worker checks whether its in-memory currency table is stale
+# (see core.services.currencies; needs a shared CACHES backend across workers)
+CURRENCY_CACHE_CHECK_SECONDS = 5
+
+# Where `refresh_fx_rates` gets rates (see core.services.fx_rates); every
+# provider is asked concurrently, batch_size currencies per request, and for
+# each currency the first provider with a rate wins. Example:
+# FX_RATE_PROVIDERS = [
+#     {
+#         'BACKEND': 'core.services.fx_rates.HttpJsonRateProvider',
+#         'OPTIONS': {'url': 'https://rates.example.com/v1/latest', 'timeout': 2.0, 'batch_size': 20},
+#     },
+# ]
+FX_RATE_PROVIDERS = []
+FX_RATE_TIMEOUT_SECONDS = 5
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -2,11 +2,12 @@ from django import views
 from django.contrib import admin
 from django.urls import path, include
 from django.contrib.auth import views as auth_views
-from core.views import index
+from core.views import index, price_api
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('', index, name='home'),
+    path('api/prices/', price_api, name='price_api'),
     path('core/', include('core.urls', namespace='core')),
     path('wallet/', include('wallet.urls', namespace='wallet')),
     path('investments/', include('investments.urls', namespace='investments')),
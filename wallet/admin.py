@@ -5,3 +5,5 @@ from .models import Wallet
 class WalletAdmin(admin.ModelAdmin):
     list_display = ('user', 'available_balance', 'bonus_balance', 'bonus_claimed')
     search_fields = ('user__username',)
+    # Balances are a projection of the ledger; change them through core.services.balances
+    readonly_fields = ('available_balance', 'locked_balance', 'bonus_balance')
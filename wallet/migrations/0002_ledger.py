@@ -0,0 +1,66 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:09
+
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+
+
+def opening_checkpoints(apps, schema_editor):
+    """Existing balances become each wallet's opening checkpoint (before entry 1)"""
+    Wallet = apps.get_model('wallet', 'Wallet')
+    BalanceCheckpoint = apps.get_model('wallet', 'BalanceCheckpoint')
+
+    wallets = Wallet.objects.exclude(available_balance=0, locked_balance=0, bonus_balance=0)
+    batch = []
+    for wallet_id, available, locked, bonus in wallets.values_list(
+        'id', 'available_balance', 'locked_balance', 'bonus_balance'
+    ).iterator(chunk_size=2000):
+        batch.append(BalanceCheckpoint(
+            wallet_id=wallet_id, last_entry_id=0,
+            available_balance=available, locked_balance=locked, bonus_balance=bonus,
+        ))
+        if len(batch) >= 2000:
+            BalanceCheckpoint.objects.bulk_create(batch)
+            batch = []
+    BalanceCheckpoint.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wallet', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BalanceCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('last_entry_id', models.BigIntegerField()),
+                ('available_balance', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('locked_balance', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('bonus_balance', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('wallet', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='balance_checkpoints', to='wallet.wallet')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('wallet', 'last_entry_id'), name='wallet_checkpoint_unique')],
+            },
+        ),
+        migrations.CreateModel(
+            name='LedgerEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('account', models.CharField(choices=[('available', 'Available'), ('locked', 'Locked'), ('bonus', 'Bonus'), ('external', 'External')], max_length=10)),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=14)),
+                ('journal', models.UUIDField(default=uuid.uuid4)),
+                ('reference', models.CharField(blank=True, db_index=True, max_length=120)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('wallet', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ledger_entries', to='wallet.wallet')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['wallet', 'id'], name='wallet_ledger_replay_idx')],
+            },
+        ),
+        migrations.RunPython(opening_checkpoints, migrations.RunPython.noop),
+    ]
@@ -82,6 +82,10 @@ class Transaction(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # History pages: user = X ORDER BY created_at DESC, id DESC
+            models.Index(fields=['user', 'created_at', 'id'], name='wallet_tx_user_history_idx'),
+        ]
 
     def __str__(self):
         return f"{self.transaction_type} | {self.amount} | {self.status}"
@@ -89,4 +93,66 @@ class Transaction(models.Model):
     def save(self, *args, **kwargs):
         if not self.reference:
             self.reference = f"TX{uuid.uuid4().hex[:8].upper()}"
-        super().save(*args, **kwargs)
\ No newline at end of file
+        super().save(*args, **kwargs)
+
+class LedgerEntry(models.Model):
+    """
+    One posting of the append-only double-entry ledger. The postings of a
+    journal sum to zero; money entering or leaving the platform is posted
+    against the wallet's external account. Wallet balances are the sums
+    of their account postings.
+    """
+    AVAILABLE = 'available'
+    LOCKED = 'locked'
+    BONUS = 'bonus'
+    EXTERNAL = 'external'
+
+    ACCOUNT_CHOICES = [
+        (AVAILABLE, 'Available'),
+        (LOCKED, 'Locked'),
+        (BONUS, 'Bonus'),
+        (EXTERNAL, 'External'),
+    ]
+
+    wallet = models.ForeignKey(Wallet, on_delete=models.CASCADE, related_name='ledger_entries')
+    account = models.CharField(max_length=10, choices=ACCOUNT_CHOICES)
+    # Positive credits the account, negative debits it
+    amount = models.DecimalField(max_digits=14, decimal_places=2)
+    journal = models.UUIDField(default=uuid.uuid4)
+    reference = models.CharField(max_length=120, blank=True, db_index=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            # Replay after a checkpoint: wallet = X AND id > N
+            models.Index(fields=['wallet', 'id'], name='wallet_ledger_replay_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.wallet_id} {self.account} {self.amount}"
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            raise ValueError("Ledger entries are append-only")
+        super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        raise ValueError("Ledger entries are append-only")
+
+
+class BalanceCheckpoint(models.Model):
+    """Wallet balances as of ledger entry `last_entry_id`; replay starts after it"""
+    wallet = models.ForeignKey(Wallet, on_delete=models.CASCADE, related_name='balance_checkpoints')
+    last_entry_id = models.BigIntegerField()
+    available_balance = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    locked_balance = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    bonus_balance = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['wallet', 'last_entry_id'], name='wallet_checkpoint_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.wallet_id} @ {self.last_entry_id}"
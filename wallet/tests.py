@@ -1,3 +1,178 @@
+from datetime import datetime, timezone
+from decimal import Decimal
+import csv
+import io
+
+from django.contrib.auth import get_user_model
 from django.test import TestCase
+from django.urls import reverse
+
+from core.models import Currency, ExchangeRate
+from core.services.currencies import bump_version
+from core.services.statements import statement_csv, statement_parquet
+from wallet.models import Transaction, Wallet
+
+
+def make_user(username, **kwargs):
+    return get_user_model().objects.create_user(
+        username=username, email=f"{username}@example.com", phone=username, password='x', **kwargs
+    )
+
+
+def at(month, day=1):
+    return datetime(2026, month, day, tzinfo=timezone.utc)
+
+
+class StatementExportTests(TestCase):
+
+    def setUp(self):
+        Currency.objects.create(code='USD', name='US Dollar', symbol='$')
+        self.kes = Currency.objects.create(code='KES', name='Kenyan Shilling', symbol='KSh', exchange_rate=Decimal('160'))
+        ExchangeRate.objects.create(currency=self.kes, rate=Decimal('100'), effective_at=at(1))
+        ExchangeRate.objects.create(currency=self.kes, rate=Decimal('150'), effective_at=at(3))
+        # Signals bump the table version on commit, which a TestCase never reaches
+        bump_version()
+
+        self.user = make_user('saver')
+        self.wallet = Wallet.objects.create(user=self.user, currency='KES')
+        self.client.force_login(self.user)
+        self.url = reverse('wallet:statement_export')
+
+    def add_transactions(self, *dates):
+        for i, when in enumerate(dates):
+            transaction = Transaction.objects.create(
+                user=self.user, wallet=self.wallet, amount=Decimal('10.00') + i, description=f"tx {i}"
+            )
+            Transaction.objects.filter(pk=transaction.pk).update(created_at=when)
+
+    def get(self, **params):
+        response = self.client.get(self.url, {'start': '2026-01-01', 'end': '2026-12-31', **params})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return response, b''.join(response.streaming_content)
+
+    def test_csv_converts_at_each_rows_rate(self):
+        self.add_transactions(at(2), at(4))
+
+        response, content = self.get(format='csv')
+
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        rows = list(csv.DictReader(io.StringIO(content.decode())))
+        self.assertEqual(
+            [(row['amount_usd'], row['amount'], row['currency']) for row in rows],
+            [('10.00', '1000.00', 'KES'), ('11.00', '1650.00', 'KES')],
+        )
+
+    def test_parquet_converts_at_each_rows_rate(self):
+        import pyarrow.parquet as pq
+
+        self.add_transactions(at(2), at(4))
+
+        response, content = self.get(format='parquet')
+
+        table = pq.read_table(io.BytesIO(content))
+        self.assertEqual(table.column('amount_usd').to_pylist(), [Decimal('10.00'), Decimal('11.00')])
+        self.assertEqual(table.column('amount').to_pylist(), [Decimal('1000.00'), Decimal('1650.00')])
+        self.assertEqual(table.column('date').to_pylist(), [at(2), at(4)])
+
+    def test_chunk_boundaries(self):
+        import pyarrow.parquet as pq
+
+        self.add_transactions(*(at(2, day) for day in range(1, 6)))
+        args = ('transactions', self.user, at(1), at(12), self.kes)
+
+        whole = ''.join(statement_csv(*args))
+        for size in (1, 2, 5, 6):
+            with self.subTest(chunk_size=size):
+                self.assertEqual(''.join(statement_csv(*args, chunk_size=size)), whole)
+
+        parquet = pq.ParquetFile(io.BytesIO(b''.join(statement_parquet(*args, chunk_size=2))))
+        self.assertEqual(parquet.metadata.num_row_groups, 3)
+        self.assertEqual(parquet.read().column('amount_usd').to_pylist(), [Decimal(f"{n}.00") for n in range(10, 15)])
+
+    def test_rows_outside_range_are_left_out(self):
+        self.add_transactions(at(2), at(4))
+
+        _, content = self.get(start='2026-03-01', end='2026-04-01')
+
+        rows = list(csv.DictReader(io.StringIO(content.decode())))
+        self.assertEqual([row['amount_usd'] for row in rows], ['11.00'])
+
+    def test_user_param(self):
+        other = make_user('other')
+
+        self.assertEqual(self.client.get(self.url, {'user': 'abc'}).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {'user': other.pk}).status_code, 403)
+
+        self.user.is_staff = True
+        self.user.save()
+        self.assertEqual(self.client.get(self.url, {'user': 'abc'}).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {'user': other.pk + 100}).status_code, 404)
+        self.assertEqual(self.client.get(self.url, {'user': other.pk}).status_code, 200)
+
+
+class TransactionHistoryApiTests(TestCase):
+
+    def setUp(self):
+        Currency.objects.create(code='USD', name='US Dollar', symbol='$')
+        bump_version()
+
+        self.user = make_user('saver')
+        self.wallet = Wallet.objects.create(user=self.user)
+        self.client.force_login(self.user)
+        self.url = reverse('wallet:transaction_history_api')
+
+        # Three transactions per timestamp, so pages split rows with equal created_at
+        rows = []
+        for i in range(60):
+            transaction = Transaction.objects.create(
+                user=self.user, wallet=self.wallet, amount=Decimal('1.00') + i,
+                transaction_type=Transaction.DEPOSIT if i % 2 else Transaction.WITHDRAWAL,
+            )
+            Transaction.objects.filter(pk=transaction.pk).update(created_at=at(1, 1 + i // 3))
+            rows.append((at(1, 1 + i // 3), transaction.pk))
+        # Newest first, ties broken by id
+        self.expected = [pk for _, pk in sorted(rows, reverse=True)]
+
+        other = make_user('other')
+        Transaction.objects.create(user=other, wallet=Wallet.objects.create(user=other), amount=Decimal('5.00'))
+
+    def pages(self, **params):
+        ids, sizes, cursor = [], [], None
+        while True:
+            response = self.client.get(self.url, {**params, **({'cursor': cursor} if cursor else {})})
+            self.assertEqual(response.status_code, 200)
+            data = response.json()
+            ids += [row['id'] for row in data['results']]
+            sizes.append(len(data['results']))
+            cursor = data['next']
+            if cursor is None:
+                return ids, sizes
+
+    def test_pages_walk_the_history_once_in_order(self):
+        ids, sizes = self.pages()
+
+        self.assertEqual(sizes, [25, 25, 10])
+        self.assertEqual(ids, self.expected)
+
+    def test_limit_and_filters(self):
+        ids, sizes = self.pages(limit=7, type=Transaction.DEPOSIT)
+
+        self.assertEqual(sizes, [7, 7, 7, 7, 2])
+        deposits = set(
+            Transaction.objects.filter(user=self.user, transaction_type=Transaction.DEPOSIT).values_list('pk', flat=True)
+        )
+        self.assertEqual(ids, [pk for pk in self.expected if pk in deposits])
+
+    def test_new_rows_do_not_shift_later_pages(self):
+        first = self.client.get(self.url).json()
+        Transaction.objects.create(user=self.user, wallet=self.wallet, amount=Decimal('99.00'))
+
+        second = self.client.get(self.url, {'cursor': first['next']}).json()
+
+        self.assertEqual([row['id'] for row in second['results']], self.expected[25:50])
 
-# Create your tests here.
+    def test_bad_params(self):
+        for params in ({'cursor': 'not-a-cursor'}, {'limit': 'x'}, {'limit': 0}, {'type': 'gift'}, {'status': 'lost'}):
+            with self.subTest(**params):
+                self.assertEqual(self.client.get(self.url, params).status_code, 400)
@@ -1,5 +1,8 @@
 from django.urls import path
-from .views import deposit, wallet_view, withdraw, claim_bonus
+from .views import (
+    deposit, wallet_view, withdraw, claim_bonus, transaction_history_api,
+    statement_export,
+)
 
 app_name = 'wallet'   # ✅ THIS IS REQUIRED
 
@@ -8,4 +11,6 @@ urlpatterns = [
     path('deposit/', deposit, name='deposit'),
     path('withdraw/', withdraw, name='withdraw'),
     path('claim-bonus/', claim_bonus, name='claim_bonus'),
+    path('api/transactions/', transaction_history_api, name='transaction_history_api'),
+    path('statement/', statement_export, name='statement_export'),
 ]
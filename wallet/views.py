@@ -1,42 +1,46 @@
+import base64
+import binascii
+from datetime import datetime, time, timedelta
+from datetime import timezone as dt_timezone
 from decimal import Decimal
+from django.contrib.auth import get_user_model
+from django.http import JsonResponse, StreamingHttpResponse
 from django.shortcuts import render, redirect
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
+from django.db import transaction as db_transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
 
 from .models import Transaction, Wallet
-from core.utils.currency import convert_from_usd, get_user_currency
+from core.services import balances, currencies
+from core.services.idempotency import idempotent
+from core.services.statements import FORMATS, STATEMENTS, statement_csv, statement_parquet
+from core.utils.currency import BASE_CURRENCY, convert_from_usd, convert_many, get_user_currency
 from wallet.forms import DepositForm, WithdrawalForm
 
-# Helper function to get or create wallet
-def get_user_wallet(user):
-    """Get or create wallet for user"""
-    wallet, created = Wallet.objects.get_or_create(
-        user=user,
-        defaults={
-            'available_balance': Decimal('0.00'),
-            'locked_balance': Decimal('0.00'),
-            'bonus_balance': Decimal('0.00'),
-            'bonus_claimed': Decimal('0.00'),
-            'currency': 'USD'
-        }
-    )
-    return wallet
+HISTORY_PAGE_SIZE = 25
+HISTORY_MAX_PAGE_SIZE = 100
 
 @login_required
 def wallet_view(request):
     """Main wallet dashboard"""
-    wallet = get_user_wallet(request.user)
+    wallet = request.user_context.wallet
     currency = get_user_currency(request)
 
     
     # Convert wallet balances to user's currency
-    wallet_data = {
-        'available': convert_from_usd(wallet.available_balance, currency),
-        'locked': convert_from_usd(wallet.locked_balance, currency),
-        'bonus': convert_from_usd(wallet.bonus_balance, currency),
-        'total': convert_from_usd(wallet.total_balance(), currency),
-        'bonus_claimed': wallet.bonus_claimed,
-    }
+    wallet_data = dict(zip(
+        ('available', 'locked', 'bonus', 'total'),
+        convert_many([
+            wallet.available_balance,
+            wallet.locked_balance,
+            wallet.bonus_balance,
+            wallet.total_balance(),
+        ], currency),
+    ))
+    wallet_data['bonus_claimed'] = wallet.bonus_claimed
     
     # Get transactions
     recent_deposits = Transaction.objects.filter(
@@ -53,22 +57,18 @@ def wallet_view(request):
         user=request.user
     ).order_by('-created_at')[:10]
     
-    # Convert transaction amounts for display
-    def convert_transaction_amounts(transactions):
-        for transaction in transactions:
-            # transaction.amount is in USD, convert to user's currency
-            transaction.display_amount = convert_from_usd(abs(transaction.amount), currency)
-            
-            # Add sign
-            if transaction.transaction_type in ['deposit', 'profit', 'bonus']:
-                transaction.display_sign = '+'
-            else:
-                transaction.display_sign = '-'
-        return transactions
-    
-    recent_deposits = convert_transaction_amounts(recent_deposits)
-    recent_withdrawals = convert_transaction_amounts(recent_withdrawals)
-    recent_activity = convert_transaction_amounts(recent_activity)
+    # Convert transaction amounts for display: (transaction, sign, amount) rows
+    def transaction_rows(transactions):
+        # transaction.amount is in USD, convert at the rate of the day it was made
+        display_amounts = convert_many(
+            [abs(transaction.amount) for transaction in transactions],
+            currency,
+            at=[transaction.created_at for transaction in transactions],
+        )
+        return [
+            (transaction, '+' if transaction.transaction_type in ['deposit', 'profit', 'bonus'] else '-', display_amount)
+            for transaction, display_amount in zip(transactions, display_amounts)
+        ]
     
     # Handle quick actions
     if request.method == 'POST':
@@ -82,19 +82,18 @@ def wallet_view(request):
             # User enters amount in their currency, convert to USD for storage
             amount_usd = amount / currency.exchange_rate
             
-            wallet.available_balance += amount_usd
-            wallet.save()
-            
-            # Create transaction
-            Transaction.objects.create(
-                user=request.user,
-                wallet=wallet,
-                transaction_type='deposit',
-                payment_method='wallet',
-                amount=amount_usd,  # Store in USD
-                status='completed',
-                description=f"Quick deposit of {currency.symbol}{amount:.2f}"
-            )
+            with db_transaction.atomic():
+                # Create transaction
+                record = Transaction.objects.create(
+                    user=request.user,
+                    wallet=wallet,
+                    transaction_type='deposit',
+                    payment_method='wallet',
+                    amount=amount_usd,  # Store in USD
+                    status='completed',
+                    description=f"Quick deposit of {currency.symbol}{amount:.2f}"
+                )
+                balances.credit(wallet, amount_usd, reference=record.reference)
             
             messages.success(request, f"Deposited {currency.symbol}{amount:.2f} successfully!")
             return redirect('wallet:wallet_view')  # Redirect to self
@@ -103,34 +102,34 @@ def wallet_view(request):
             # User enters amount in their currency, convert to USD for check
             amount_usd = amount / currency.exchange_rate
             
-            if wallet.available_balance >= amount_usd:
-                wallet.available_balance -= amount_usd
-                wallet.save()
-                
-                # Create transaction
-                Transaction.objects.create(
-                    user=request.user,
-                    wallet=wallet,
-                    transaction_type='withdrawal',
-                    payment_method='wallet',
-                    amount=-amount_usd,  # Negative for withdrawal
-                    status='completed',
-                    description=f"Quick withdrawal of {currency.symbol}{amount:.2f}"
-                )
-                
+            try:
+                with db_transaction.atomic():
+                    # Create transaction
+                    record = Transaction.objects.create(
+                        user=request.user,
+                        wallet=wallet,
+                        transaction_type='withdrawal',
+                        payment_method='wallet',
+                        amount=-amount_usd,  # Negative for withdrawal
+                        status='completed',
+                        description=f"Quick withdrawal of {currency.symbol}{amount:.2f}"
+                    )
+                    # Debits only if the balance still covers it
+                    balances.debit(wallet, amount_usd, reference=record.reference)
+            except balances.InsufficientFunds:
+                messages.error(request, "Insufficient balance")
+            else:
                 messages.success(request, f"Withdrew {currency.symbol}{amount:.2f} successfully!")
                 return redirect('wallet:wallet_view')
-            else:
-                messages.error(request, "Insufficient balance")
         else:
             messages.error(request, "Invalid action")
     
     context = {
         'wallet': wallet_data,
         'wallet_obj': wallet,
-        'recent_deposits': recent_deposits,
-        'recent_withdrawals': recent_withdrawals,
-        'recent_activity': recent_activity,
+        'recent_deposits': transaction_rows(recent_deposits),
+        'recent_withdrawals': transaction_rows(recent_withdrawals),
+        'recent_activity': transaction_rows(recent_activity),
         'recent_transactions': recent_activity,
         'currency': currency,
         'currency_symbol': currency.symbol,
@@ -140,9 +139,10 @@ def wallet_view(request):
     return render(request, 'wallet.html', context)
 
 @login_required
+@idempotent
 def deposit(request):
     """Deposit page with form"""
-    wallet = get_user_wallet(request.user)
+    wallet = request.user_context.wallet
     currency = get_user_currency(request)
     
     form = DepositForm(currency=currency)
@@ -157,20 +157,19 @@ def deposit(request):
             # Convert to USD for storage
             amount_usd = amount_display / currency.exchange_rate
             
-            # Update wallet
-            wallet.available_balance += amount_usd
-            wallet.save()
-            
-            # Create transaction
-            Transaction.objects.create(
-                user=request.user,
-                wallet=wallet,
-                transaction_type='deposit',
-                payment_method=payment_method,
-                amount=amount_usd,
-                status='completed',
-                description=f"Deposit of {currency.symbol}{amount_display:.2f} via {payment_method}"
-            )
+            with db_transaction.atomic():
+                # Create transaction
+                record = Transaction.objects.create(
+                    user=request.user,
+                    wallet=wallet,
+                    transaction_type='deposit',
+                    payment_method=payment_method,
+                    amount=amount_usd,
+                    status='completed',
+                    description=f"Deposit of {currency.symbol}{amount_display:.2f} via {payment_method}"
+                )
+                # Update wallet last: its row lock is held until commit
+                balances.credit(wallet, amount_usd, reference=record.reference)
             
             messages.success(request, f"Deposit of {currency.symbol}{amount_display:.2f} successful!")
             return redirect('wallet:wallet_view')  # Change to your actual URL
@@ -185,9 +184,10 @@ def deposit(request):
     return render(request, 'deposit.html', context)
 
 @login_required
+@idempotent
 def withdraw(request):
     """Withdraw page with form"""
-    wallet = get_user_wallet(request.user)
+    wallet = request.user_context.wallet
     currency = get_user_currency(request)
     
     # Get recent withdrawals
@@ -223,28 +223,28 @@ def withdraw(request):
             # Convert to USD for storage
             amount_usd = amount_display / currency.exchange_rate
             
-            if 0 < amount_usd <= wallet.available_balance:
-                wallet.available_balance -= amount_usd
-                wallet.save()
-                
-                Transaction.objects.create(
-                    user=request.user,
-                    wallet=wallet,
-                    transaction_type='withdrawal',
-                    payment_method=payment_method,
-                    amount=-amount_usd,
-                    status='pending',
-                    description=f"Withdrawal of {currency.symbol}{amount_display:.2f} via {payment_method}"
-                )
-                
+            try:
+                if amount_usd <= 0:
+                    raise balances.InsufficientFunds(amount_usd)
+                with db_transaction.atomic():
+                    record = Transaction.objects.create(
+                        user=request.user,
+                        wallet=wallet,
+                        transaction_type='withdrawal',
+                        payment_method=payment_method,
+                        amount=-amount_usd,
+                        status='pending',
+                        description=f"Withdrawal of {currency.symbol}{amount_display:.2f} via {payment_method}"
+                    )
+                    balances.debit(wallet, amount_usd, reference=record.reference)
+            except balances.InsufficientFunds:
+                messages.error(request, "Insufficient balance")
+            else:
                 messages.success(request, f"Withdrawal request of {currency.symbol}{amount_display:.2f} submitted!")
                 return redirect('wallet:wallet_view')  # Change to your actual URL
-            else:
-                messages.error(request, "Insufficient balance")
     
-    # Convert withdrawals for display
-    for w in withdrawals:
-        w.display_amount = convert_from_usd(abs(w.amount), currency)
+    # Convert withdrawals for display, at the rate of the day they were made
+    display_amounts = convert_many([abs(w.amount) for w in withdrawals], currency, at=[w.created_at for w in withdrawals])
     
     context = {
         'form': form,
@@ -254,33 +254,193 @@ def withdraw(request):
         'current_currency': currency,
         'available_balance': wallet_balance_display,
         'quick_amounts': quick_amounts,
-        'withdrawals': withdrawals,
+        # (withdrawal, amount) rows, converted
+        'withdrawals': list(zip(withdrawals, display_amounts)),
     }
     
     return render(request, 'withdraw.html', context)
 
 @login_required
 def claim_bonus(request):
-    wallet = get_user_wallet(request.user)
+    wallet = request.user_context.wallet
     
-    if not wallet.bonus_claimed:
-        wallet.bonus_balance += Decimal('500.00')
-        wallet.bonus_claimed = True
-        wallet.save()
-        
-        # Create bonus transaction
-        Transaction.objects.create(
-            user=request.user,
-            wallet=wallet,
-            transaction_type='bonus',
-            payment_method='system',
-            amount=Decimal('500.00'),
-            status='completed',
-            description="Welcome bonus claimed"
-        )
-        
+    # Flips bonus_claimed and credits in one UPDATE, so a double submit pays once
+    with db_transaction.atomic():
+        claimed = balances.claim_welcome_bonus(wallet)
+        if claimed:
+            # Create bonus transaction
+            Transaction.objects.create(
+                user=request.user,
+                wallet=wallet,
+                transaction_type='bonus',
+                payment_method='system',
+                amount=balances.WELCOME_BONUS,
+                status='completed',
+                reference=balances.welcome_bonus_reference(wallet.pk),
+                description="Welcome bonus claimed"
+            )
+    
+    if claimed:
         messages.success(request, "Bonus claimed successfully!")
     else:
         messages.warning(request, "Bonus already claimed")
     
-    return redirect('wallet:wallet_view')  # Change to your actual URL
\ No newline at end of file
+    return redirect('wallet:wallet_view')  # Change to your actual URL
+
+
+def _encode_cursor(transaction):
+    raw = f"{transaction.created_at.isoformat()}|{transaction.pk}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def _decode_cursor(cursor):
+    """(created_at, id) of the last row of the previous page, or None if malformed"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        created_at, pk = raw.rsplit('|', 1)
+        created_at = parse_datetime(created_at)
+        return (created_at, int(pk)) if created_at else None
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        return None
+
+
+@login_required
+def transaction_history_api(request):
+    """
+    Full transaction history, newest first, in keyset-paginated pages.
+    Query params: type, status, limit, cursor (the `next` value of the
+    previous page). Each page is one index range scan on
+    (user, created_at, id), however deep it is.
+    """
+    currency = get_user_currency(request)
+    
+    try:
+        limit = min(int(request.GET.get('limit', HISTORY_PAGE_SIZE)), HISTORY_MAX_PAGE_SIZE)
+    except ValueError:
+        return JsonResponse({'error': 'limit must be an integer'}, status=400)
+    if limit < 1:
+        return JsonResponse({'error': 'limit must be positive'}, status=400)
+    
+    transactions = Transaction.objects.filter(user=request.user)
+    
+    transaction_type = request.GET.get('type')
+    if transaction_type:
+        if transaction_type not in dict(Transaction.TRANSACTION_TYPE_CHOICES):
+            return JsonResponse({'error': f"type must be one of: {', '.join(dict(Transaction.TRANSACTION_TYPE_CHOICES))}"}, status=400)
+        transactions = transactions.filter(transaction_type=transaction_type)
+    
+    status = request.GET.get('status')
+    if status:
+        if status not in dict(Transaction.STATUS_CHOICES):
+            return JsonResponse({'error': f"status must be one of: {', '.join(dict(Transaction.STATUS_CHOICES))}"}, status=400)
+        transactions = transactions.filter(status=status)
+    
+    cursor = request.GET.get('cursor')
+    if cursor:
+        position = _decode_cursor(cursor)
+        if position is None:
+            return JsonResponse({'error': 'invalid cursor'}, status=400)
+        created_at, pk = position
+        # Rows strictly after the cursor in (created_at, id) descending order
+        transactions = transactions.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=pk))
+    
+    # One extra row tells whether another page exists
+    page = list(transactions.order_by('-created_at', '-id')[:limit + 1])
+    has_more = len(page) > limit
+    page = page[:limit]
+    
+    # Amounts converted at the rate in effect when each transaction was made
+    display_amounts = convert_many(
+        [transaction.amount for transaction in page], currency, at=[transaction.created_at for transaction in page],
+    )
+    
+    return JsonResponse({
+        'currency': currency.code,
+        'results': [
+            {
+                'id': transaction.pk,
+                'reference': transaction.reference,
+                'type': transaction.transaction_type,
+                'payment_method': transaction.payment_method,
+                'status': transaction.status,
+                'amount': float(transaction.amount),
+                'display_amount': float(display_amount),
+                'description': transaction.description,
+                'created_at': transaction.created_at.isoformat(),
+            }
+            for transaction, display_amount in zip(page, display_amounts)
+        ],
+        'next': _encode_cursor(page[-1]) if has_more else None,
+    })
+
+
+def _statement_bound(value, end=False):
+    """ISO date or datetime -> aware datetime; a bare end date covers that whole day"""
+    # Date first: parse_datetime also reads a bare date, as midnight
+    day = parse_date(value)
+    if day is not None:
+        moment = datetime.combine(day + timedelta(days=1) if end else day, time.min)
+    else:
+        moment = parse_datetime(value)
+        if moment is None:
+            return None
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
+
+
+@login_required
+def statement_export(request):
+    """
+    Download a transaction or investment statement, streamed.
+    Query params: kind (transactions/investments), format (csv/parquet),
+    start, end (ISO dates or datetimes), and for staff, user (id).
+    """
+    kind = request.GET.get('kind', 'transactions')
+    if kind not in STATEMENTS:
+        return JsonResponse({'error': f"kind must be one of: {', '.join(STATEMENTS)}"}, status=400)
+    export_format = request.GET.get('format', 'csv')
+    if export_format not in FORMATS:
+        return JsonResponse({'error': f"format must be one of: {', '.join(FORMATS)}"}, status=400)
+    
+    try:
+        start = _statement_bound(request.GET['start']) if 'start' in request.GET else datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+        end = _statement_bound(request.GET['end'], end=True) if 'end' in request.GET else timezone.now()
+    except ValueError:
+        start = end = None
+    if start is None or end is None:
+        return JsonResponse({'error': 'start/end must be ISO 8601 dates or datetimes'}, status=400)
+    
+    user = request.user
+    currency = get_user_currency(request)
+    user_id = request.GET.get('user')
+    if user_id is not None:
+        try:
+            user_id = int(user_id)
+        except ValueError:
+            return JsonResponse({'error': 'user must be a user id'}, status=400)
+    if user_id is not None and user_id != request.user.pk:
+        # Staff export statements of other users, in that user's currency
+        if not request.user.is_staff:
+            return JsonResponse({'error': 'Not allowed'}, status=403)
+        user = get_user_model().objects.filter(pk=user_id).first()
+        if user is None:
+            return JsonResponse({'error': 'No such user'}, status=404)
+        code = Wallet.objects.filter(user=user).values_list('currency', flat=True).first() or BASE_CURRENCY
+        currency = currencies.get_currency(code) or currencies.get_currency(BASE_CURRENCY, active_only=False)
+    
+    if export_format == 'parquet':
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            return JsonResponse({'error': 'Parquet export is not available on this server'}, status=501)
+        content = statement_parquet(kind, user, start, end, currency)
+        content_type = 'application/vnd.apache.parquet'
+    else:
+        content = statement_csv(kind, user, start, end, currency)
+        content_type = 'text/csv'
+    
+    filename = f"statement-{kind}-{user.pk}-{start:%Y%m%d}-{end:%Y%m%d}.{export_format}"
+    response = StreamingHttpResponse(content, content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response